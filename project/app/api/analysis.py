@@ -1,233 +1,415 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from typing import List, Optional
-from app.services.ai_client import call_ollama_api, chunk_text, CHUNK_SIZE_CHARS
+import asyncio
+from itertools import chain, islice
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from typing import Iterator, List, Optional
+from app.api.documents import DOCUMENT_EXTENSIONS, load_document, store_upload
+from app.services.ai_client import ChatPrompt, MapReducePlan, chunk_text, run_map_reduce, CHUNK_SIZE_CHARS, CHUNK_TOKENS
+from app.services.local_extraction import (
+    EXTRACTION_MODES,
+    HYBRID_CANDIDATES,
+    KEYWORDS_TOP_K,
+    entities_label_prompt,
+    find_entities,
+    keywords_rerank_prompt,
+    rank_keywords,
+    top_entities,
+)
+from app.services.chunker import CHUNK_OVERLAP_TOKENS, iter_chunks_by_tokens
+from app.services.metrics import span
+from app.services.multi_analysis import merge_entities, normalize_analyses, render_markdown, run_multi_analysis
+from app.services.retrieval import RETRIEVAL_TOP_K, index_cache
+from app.services.similarity import COMPARE_DIRECT_MAX, COMPARE_EXPLAIN_PAIRS, compare_documents, explanation_prompt
+from app.services.request_context import current_context
+from app.services.streaming import stream_map_reduce, streaming_response
+from app.services.text_stream import iter_blocks, iter_decoded, iter_sources, read_text
 
 router = APIRouter()
 
-def get_text(text: Optional[str], file: Optional[UploadFile]) -> str:
+async def get_text(text: Optional[str], file: Optional[UploadFile], doc_id: Optional[str] = None) -> str:
+    if doc_id:
+        return (await load_document(doc_id)).text
     if text:
         return text
     if file:
-        return file.file.read().decode("utf-8", errors="ignore")
+        return read_text(file.file)
     return ""
 
 
-def _call_over_chunks(text: str, per_chunk_prompt_fn, combine_prompt_fn: Optional[call_ollama_api.__class__] = None):
+def _chunk_plan(text: str, per_chunk_prompt_fn, combine_prompt_fn=None) -> MapReducePlan:
     """
-    Helper: divide `text` en chunks y llama a `per_chunk_prompt_fn(chunk)` para cada uno.
+    Helper: plan map/reduce para `text`.
     - per_chunk_prompt_fn: función(chunk) -> prompt_str
-    - combine_prompt_fn: función(list_of_responses) -> final_markdown (si se pasa, recibe lista de respuestas y debe devolver string);
-      si no se pasa, concatena respuestas y devuelve la unión.
-    Devuelve un string Markdown.
+    - combine_prompt_fn: función(list_of_responses) -> prompt_str de la llamada final
+      (y de los niveles intermedios del reduce jerárquico);
+      si no se pasa, se concatenan las respuestas parciales.
+    Si el texto es pequeño, una sola llamada con `per_chunk_prompt_fn(text)`.
     """
-    if not text or text.strip() == "":
-        return ""
-
-    chunks = chunk_text(text)
-    partials = []
+    if len(text) <= CHUNK_SIZE_CHARS:
+        return MapReducePlan([], lambda _: per_chunk_prompt_fn(text))
 
-    for chunk in chunks:
-        prompt = per_chunk_prompt_fn(chunk)
-        try:
-            resp = call_ollama_api(prompt)
-        except Exception:
-            # un retry simple
-            resp = call_ollama_api(prompt)
-        partials.append(resp.strip())
+    prompts = [per_chunk_prompt_fn(chunk) for chunk in chunk_text(text)]
+    return MapReducePlan(prompts, combine_prompt_fn)
 
-    if combine_prompt_fn:
-        return combine_prompt_fn(partials)
 
-    # Default: unir parciales y devolverlos como un solo bloque Markdown
-    return "\n\n".join(partials)
+async def _stream_plan(blocks: Iterator[str], per_chunk_prompt_fn, combine_prompt_fn=None) -> MapReducePlan:
+    """
+    Como `_chunk_plan`, pero para texto que llega en bloques (subidas grandes): los chunks
+    se cortan y pasan al map stage a medida que se lee, sin unir todo el texto en memoria.
+    """
+    chunks = iter_chunks_by_tokens(blocks, CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS)
+    # con un solo chunk, una sola llamada (como en `_chunk_plan`)
+    head = await asyncio.to_thread(lambda: list(islice(chunks, 2)))
+    if len(head) < 2:
+        text = head[0] if head else ""
+        return MapReducePlan([], lambda _: per_chunk_prompt_fn(text))
+    prompts = (per_chunk_prompt_fn(chunk) for chunk in chain(head, chunks))
+    return MapReducePlan([], combine_prompt_fn, prompt_stream=prompts)
+
+
+def _check_mode(mode: Optional[str], stream: bool) -> str:
+    mode = (mode or "llm").lower()
+    if mode not in EXTRACTION_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(EXTRACTION_MODES)}")
+    if mode == "fast" and stream:
+        raise HTTPException(status_code=400, detail="Fast mode does not support stream")
+    return mode
+
+
+def _result_response(markdown: str, extra: dict) -> dict:
+    """
+    `{"result": markdown, "stats": {...}, **extra}` (más `timings` con `?timings=1`).
+    """
+    ctx = current_context()
+    response = {"result": markdown, "partial": ctx.partial, "stats": ctx.stats.as_dict(), **extra}
+    if ctx.include_timings:
+        response["timings"] = ctx.timings_report()
+    return response
+
+
+async def _run_plan(
+    request: Request,
+    plan: MapReducePlan,
+    max_concurrency: Optional[int],
+    stream: bool,
+    extra: Optional[dict] = None,
+):
+    """
+    Ejecuta el plan (map stage en paralelo + reduce) y devuelve `{"result": markdown, "stats": {...}}`
+    (más `timings` con `?timings=1`), o una respuesta en streaming con progreso por chunk
+    y tokens si `stream=True`.
+    `extra` se añade a la respuesta (o al evento final del streaming).
+    """
+    extra = extra or {}
+    if stream:
+        events = stream_map_reduce(plan, max_concurrency=max_concurrency, done_fields=lambda _: extra)
+        return streaming_response(request, events)
+    markdown = await run_map_reduce(plan, max_concurrency=max_concurrency)
+    return _result_response(markdown, extra)
 
 @router.post("/extract-keywords")
-async def extract_keywords(text: Optional[str] = Form(None), file: Optional[UploadFile] = File(None)):
+async def extract_keywords(
+    request: Request,
+    text: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),
+    max_concurrency: Optional[int] = Form(None),
+    stream: bool = Form(False),
+    mode: Optional[str] = Form("llm"),  # fast (sin LLM) | hybrid (el LLM re-ordena los candidatos) | llm
+):
     """
-    Extrae palabras clave usando LLM (Groq API).
+    Extrae palabras clave usando LLM (Groq API), o localmente con `mode=fast|hybrid`.
     """
-    input_text = get_text(text, file)
+    mode = _check_mode(mode, stream)
+    input_text = await get_text(text, file, doc_id)
+
+    if mode != "llm":
+        # motor estadístico local (n-gramas puntuados con NumPy), fuera del event loop
+        with span("keywords_local"):
+            limit = KEYWORDS_TOP_K if mode == "fast" else HYBRID_CANDIDATES
+            keywords = await asyncio.to_thread(rank_keywords, input_text, limit)
+        if mode == "fast":
+            return _result_response(render_markdown("keywords", [k["keyword"] for k in keywords]),
+                                   {"mode": mode, "keywords": keywords})
+        prompt = keywords_rerank_prompt(input_text, keywords)
+        plan = MapReducePlan([], lambda _: prompt)
+        return await _run_plan(request, plan, max_concurrency, stream, extra={"mode": mode, "candidates": keywords})
 
     def per_chunk_prompt(chunk):
-        return (
+        return ChatPrompt(
             "Extrae las palabras clave más importantes del siguiente texto. "
-            "Devuelve el resultado en formato Markdown, como una lista de bullets (una palabra o frase por bullet).\n\n"
-            f"Texto:\n{chunk}\n\nPalabras clave:"
+            "Devuelve el resultado en formato Markdown, como una lista de bullets (una palabra o frase por bullet).",
+            f"Texto:\n{chunk}\n\nPalabras clave:",
         )
 
     def combine(partials: List[str]) -> str:
         # pedimos al LLM que combine y deduplice las listas parciales
         joined = "\n\n".join(partials)
-        prompt = (
+        return ChatPrompt(
             "Combina y deduplica las siguientes listas de palabras clave. "
-            "Devuelve el resultado en formato Markdown, como una lista de bullets única y ordenada por relevancia.\n\n"
-            f"Listas parciales:\n{joined}\n\nLista única de palabras clave:"
+            "Devuelve el resultado en formato Markdown, como una lista de bullets única y ordenada por relevancia.",
+            f"Listas parciales:\n{joined}\n\nLista única de palabras clave:",
         )
-        return call_ollama_api(prompt)
 
     # Si texto es pequeño, un solo llamado; si no, usar chunking + combinación
-    if len(input_text) <= CHUNK_SIZE_CHARS:
-        prompt = per_chunk_prompt(input_text)
-        markdown = call_ollama_api(prompt)
-    else:
-        markdown = _call_over_chunks(input_text, per_chunk_prompt, combine)
-
-    return {"result": markdown}
+    return await _run_plan(request, _chunk_plan(input_text, per_chunk_prompt, combine), max_concurrency, stream)
 
-async def extract_entities(text: Optional[str] = Form(None), file: Optional[UploadFile] = File(None)):
+@router.post("/extract-entities")
+async def extract_entities(
+    request: Request,
+    text: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),
+    max_concurrency: Optional[int] = Form(None),
+    stream: bool = Form(False),
+    mode: Optional[str] = Form("llm"),  # fast (reglas + gazetteer) | hybrid (el LLM etiqueta los candidatos) | llm
+):
     """
     Extrae entidades nombradas usando LLM (Groq API). Maneja textos grandes por chunks.
+    Con `mode=fast|hybrid` se extraen localmente con reglas y un gazetteer.
     """
-    input_text = get_text(text, file)
+    mode = _check_mode(mode, stream)
+    input_text = await get_text(text, file, doc_id)
+
+    if mode != "llm":
+        with span("entities_local"):
+            entities = await asyncio.to_thread(find_entities, input_text, mode == "hybrid")
+        if mode == "fast":
+            return _result_response(render_markdown("entities", merge_entities([entities])),
+                                   {"mode": mode, "entities": entities})
+        candidates = top_entities(entities, HYBRID_CANDIDATES)
+        prompt = entities_label_prompt(candidates)
+        plan = MapReducePlan([], lambda _: prompt)
+        return await _run_plan(request, plan, max_concurrency, stream, extra={"mode": mode, "candidates": candidates})
 
     def per_chunk_prompt(chunk):
-        return (
+        return ChatPrompt(
             "Extrae las entidades nombradas (Personas, Organizaciones, Lugares, Fechas) del siguiente texto. "
-            "Devuelve el resultado en formato Markdown con bullets ' - Nombre (Tipo)'.\n\n"
-            f"Texto:\n{chunk}\n\nEntidades:"
+            "Devuelve el resultado en formato Markdown con bullets ' - Nombre (Tipo)'.",
+            f"Texto:\n{chunk}\n\nEntidades:",
         )
 
     def combine(partials: List[str]) -> str:
         joined = "\n\n".join(partials)
-        prompt = (
+        return ChatPrompt(
             "Combina y deduplica las siguientes listas parciales de entidades y organiza por tipo. "
-            "Devuelve el resultado en formato Markdown con bullets.\n\n"
-            f"Listas parciales:\n{joined}\n\nEntidades combinadas:"
+            "Devuelve el resultado en formato Markdown con bullets.",
+            f"Listas parciales:\n{joined}\n\nEntidades combinadas:",
         )
-        return call_ollama_api(prompt)
-
-    if len(input_text) <= CHUNK_SIZE_CHARS:
-        markdown = call_ollama_api(per_chunk_prompt(input_text))
-    else:
-        markdown = _call_over_chunks(input_text, per_chunk_prompt, combine)
 
-    return {"result": markdown}
+    return await _run_plan(request, _chunk_plan(input_text, per_chunk_prompt, combine), max_concurrency, stream)
 
 @router.post("/compare-texts")
-async def compare_texts(texts: List[str] = Form(...)):
+async def compare_texts(
+    request: Request,
+    texts: Optional[List[str]] = Form(None),
+    doc_ids: Optional[List[str]] = Form(None),  # documentos del almacén, comparados tras `texts`
+    max_concurrency: Optional[int] = Form(None),
+    stream: bool = Form(False),
+):
     """
-    Compara dos o más textos y devuelve similitud/diferencias usando LLM.
+    Compara dos o más textos y devuelve similitud/diferencias usando LLM, junto con
+    `similarity`: matriz N×N (coseno TF-IDF), Jaccard MinHash, casi duplicados y clusters.
     """
+    texts = list(texts or [])
+    for doc_id in doc_ids or []:
+        texts.append((await load_document(doc_id)).text)
+    if not texts:
+        raise HTTPException(status_code=400, detail="Provide texts or doc_ids")
+    # Etapa local: matriz de similitud, casi duplicados y clusters (vectorizada, fuera del event loop)
+    with span("similarity"):
+        report = await asyncio.to_thread(compare_documents, texts, COMPARE_EXPLAIN_PAIRS)
+    if len(texts) > COMPARE_DIRECT_MAX:
+        # con muchos textos el LLM solo explica las parejas y grupos seleccionados: una llamada
+        prompt = explanation_prompt(texts, report, CHUNK_TOKENS)
+        plan = MapReducePlan([], lambda _: prompt)
+        return await _run_plan(request, plan, max_concurrency, stream, extra={"similarity": report})
+
     markdown_instruction = "Devuelve el resultado en formato de documento Markdown, bien organizado y visualmente atractivo."
-    # Si algún texto es muy grande, hacemos un paso de resumen por texto antes de comparar
-    safe_texts = []
-    for t in texts:
+    # Si algún texto es muy grande, hacemos un paso de resumen por texto antes de comparar;
+    # los chunks de todos los textos van juntos al map stage
+    sum_prompts = []
+    owners = []  # índice del texto al que pertenece cada prompt
+    for i, t in enumerate(texts):
         if len(t) <= CHUNK_SIZE_CHARS:
-            safe_texts.append(t)
-        else:
-            parts = []
-            for c in chunk_text(t):
-                sum_prompt = (
-                    "Resume el siguiente texto en 2-3 oraciones manteniendo puntos clave. Devuelve solo el resumen.\n\n"
-                    f"Texto:\n{c}\n\nResumen:"
-                )
-                parts.append(call_ollama_api(sum_prompt).strip())
-            safe_texts.append("\n\n".join(parts))
-
-    prompt_safe = (
-        f"Compara los siguientes textos y analiza similitudes y diferencias. {markdown_instruction}\n\n"
-        + "\n\n".join([f"Texto {i+1}:\n{text}" for i, text in enumerate(safe_texts)])
-        + "\n\nResumen de comparación:"
-    )
-    markdown = call_ollama_api(prompt_safe)
-    return {"result": markdown}
+            continue
+        for c in chunk_text(t):
+            sum_prompts.append(ChatPrompt(
+                "Resume el siguiente texto en 2-3 oraciones manteniendo puntos clave. Devuelve solo el resumen.",
+                f"Texto:\n{c}\n\nResumen:",
+            ))
+            owners.append(i)
+
+    def compare_prompt(parts: List[str]) -> str:
+        safe_texts = list(texts)
+        summarized = {}
+        for owner, part in zip(owners, parts):
+            summarized.setdefault(owner, []).append(part)
+        for owner, owner_parts in summarized.items():
+            safe_texts[owner] = "\n\n".join(owner_parts)
+        return ChatPrompt(
+            f"Compara los siguientes textos y analiza similitudes y diferencias. {markdown_instruction}",
+            "\n\n".join([f"Texto {i+1}:\n{text}" for i, text in enumerate(safe_texts)])
+            + "\n\nResumen de comparación:",
+        )
+
+    # las parciales de textos distintos no se fusionan entre sí
+    plan = MapReducePlan(sum_prompts, compare_prompt, tree_reduce=False)
+    return await _run_plan(request, plan, max_concurrency, stream, extra={"similarity": report})
 
 @router.post("/question")
 async def question_answer(
+    request: Request,
     text: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
-    question: str = Form(...)
+    doc_id: Optional[str] = Form(None),
+    question: str = Form(...),
+    max_concurrency: Optional[int] = Form(None),
+    stream: bool = Form(False),
+    top_k: Optional[int] = Form(None),  # pasajes recuperados para documentos grandes
 ):
     """
     Responde preguntas sobre el contenido de un documento o texto usando LLM.
     """
-    input_text = get_text(text, file)
+    input_text = await get_text(text, file, doc_id)
     markdown_instruction = "Devuelve el resultado en formato de documento Markdown, bien organizado y visualmente atractivo."
 
     # Si el texto es pequeño, respondemos directamente
     if len(input_text) <= CHUNK_SIZE_CHARS:
-        prompt = (
-            f"Responde la siguiente pregunta sobre el texto proporcionado. {markdown_instruction}\n\n"
-            f"Texto:\n{input_text}\n\nPregunta: {question}\n\nRespuesta:"
-        )
-        markdown = call_ollama_api(prompt)
-        return {"result": markdown}
-
-    # Si es grande, primero resumimos por chunks y luego respondemos
-    summaries = []
-    for c in chunk_text(input_text):
-        sum_prompt = (
-            "Resume el siguiente fragmento en 2-3 oraciones, enfocándote en ideas que podrían ayudar a responder una pregunta sobre el documento. Devuelve solo el resumen.\n\n"
-            f"Texto:\n{c}\n\nResumen:"
+        prompt = ChatPrompt(
+            f"Responde la siguiente pregunta sobre el texto proporcionado. {markdown_instruction}",
+            f"Texto:\n{input_text}\n\nPregunta: {question}\n\nRespuesta:",
         )
-        summaries.append(call_ollama_api(sum_prompt).strip())
-
-    combined_summary = "\n\n".join(summaries)
-    final_prompt = (
-        f"Usando el siguiente resumen combinado del documento, responde la pregunta solicitada. {markdown_instruction}\n\n"
-        f"Resumen combinado:\n{combined_summary}\n\nPregunta: {question}\n\nRespuesta:"
+        return await _run_plan(request, MapReducePlan([], lambda _: prompt), max_concurrency, stream)
+
+    # Si es grande, recuperamos los pasajes relevantes del índice del documento
+    # (guardado al subirlo; para texto suelto, construido una vez y cacheado por hash)
+    # y respondemos con una sola llamada
+    document = current_context().document
+    with span("retrieval"):
+        if document is not None and document.text == input_text:
+            doc_hash, index = await asyncio.to_thread(index_cache.for_document, document)
+        else:
+            doc_hash, index = await asyncio.to_thread(index_cache.get_or_build, input_text)
+        passages = index.context_for(question, max_tokens=CHUNK_TOKENS, top_k=top_k or RETRIEVAL_TOP_K)
+    context = "\n\n---\n\n".join(index.passages[i] for i, _ in passages)
+    prompt = ChatPrompt(
+        "Responde la siguiente pregunta usando únicamente los fragmentos del documento proporcionados. "
+        f"Si la respuesta no está en los fragmentos, indícalo. {markdown_instruction}",
+        f"Fragmentos del documento:\n{context}\n\nPregunta: {question}\n\nRespuesta:",
     )
-    markdown = call_ollama_api(final_prompt)
-    return {"result": markdown}
+    sources = {
+        "doc_hash": doc_hash,
+        "sources": [{"passage": i, "score": round(score, 4)} for i, score in passages],
+    }
+    return await _run_plan(request, MapReducePlan([], lambda _: prompt), max_concurrency, stream, extra=sources)
 
 @router.post("/topic-modeling")
-async def topic_modeling(text: Optional[str] = Form(None), files: Optional[List[UploadFile]] = File(None)):
+async def topic_modeling(
+    request: Request,
+    text: Optional[str] = Form(None),
+    files: Optional[List[UploadFile]] = File(None),
+    doc_ids: Optional[List[str]] = Form(None),
+    max_concurrency: Optional[int] = Form(None),
+    stream: bool = Form(False),
+):
     """
     Agrupa temas en texto largo o múltiples documentos usando LLM.
     """
     markdown_instruction = "Devuelve el resultado en formato de documento Markdown, bien organizado y visualmente atractivo."
-    all_texts = []
+    # los archivos se decodifican por bloques al trocearlos, sin unir todos los textos
+    sources = []
     if text:
-        all_texts.append(text)
-    if files:
-        for file in files:
-            content = await file.read()
-            all_texts.append(content.decode("utf-8", errors="ignore"))
-    joined_text = "\n\n".join(all_texts)
+        sources.append(iter_blocks(text))
+    for file in files or []:
+        sources.append(iter_decoded(file.file))
+    for doc_id in doc_ids or []:
+        sources.append(iter_blocks((await load_document(doc_id)).text))
 
     def per_chunk_prompt(chunk):
-        return (
-            "Detecta los temas principales en el siguiente texto y devuelve una lista ordenada de temas con 2-3 bullets de apoyo por tema. Devuelve resultado en Markdown.\n\n"
-            f"Texto:\n{chunk}\n\nTemas:"
+        return ChatPrompt(
+            "Detecta los temas principales en el siguiente texto y devuelve una lista ordenada de temas con 2-3 bullets de apoyo por tema. Devuelve resultado en Markdown.",
+            f"Texto:\n{chunk}\n\nTemas:",
         )
 
     def combine(partials: List[str]) -> str:
         joined = "\n\n".join(partials)
-        prompt = (
-            "Fusiona y sintetiza las listas parciales de temas en una lista final de temas principales, deduplicando y agregando 1-2 bullets explicativos por tema. Devuelve Markdown.\n\n"
-            f"Listas parciales:\n{joined}\n\nTemas finales:"
+        return ChatPrompt(
+            "Fusiona y sintetiza las listas parciales de temas en una lista final de temas principales, deduplicando y agregando 1-2 bullets explicativos por tema. Devuelve Markdown.",
+            f"Listas parciales:\n{joined}\n\nTemas finales:",
         )
-        return call_ollama_api(prompt)
-
-    if len(joined_text) <= CHUNK_SIZE_CHARS:
-        markdown = call_ollama_api(per_chunk_prompt(joined_text))
-    else:
-        markdown = _call_over_chunks(joined_text, per_chunk_prompt, combine)
 
-    return {"result": markdown}
+    plan = await _stream_plan(iter_sources(sources), per_chunk_prompt, combine)
+    return await _run_plan(request, plan, max_concurrency, stream)
 
 @router.post("/text-to-bullets")
-async def text_to_bullets(text: str = Form(...)):
+async def text_to_bullets(
+    request: Request,
+    text: Optional[str] = Form(None),
+    doc_id: Optional[str] = Form(None),
+    max_concurrency: Optional[int] = Form(None),
+    stream: bool = Form(False),
+):
     """
     Resume texto largo en bullets usando LLM.
     """
+    text = await get_text(text, None, doc_id)
+    if not text:
+        raise HTTPException(status_code=400, detail="Provide text or doc_id")
     markdown_instruction = "Devuelve el resultado en formato de documento Markdown, bien organizado y visualmente atractivo."
     def per_chunk_prompt(chunk):
-        return (
-            f"Resume el siguiente texto en bullets claros y concisos. {markdown_instruction}\n\nTexto:\n{chunk}\n\nBullets:"
+        return ChatPrompt(
+            f"Resume el siguiente texto en bullets claros y concisos. {markdown_instruction}",
+            f"Texto:\n{chunk}\n\nBullets:",
         )
 
     def combine(partials: List[str]) -> str:
         joined = "\n\n".join(partials)
-        prompt = (
-            "Combina las siguientes listas parciales de bullets en una única lista concisa de máximo 12 bullets, ordenados por importancia. Devuelve Markdown.\n\n"
-            f"Listas parciales:\n{joined}\n\nBullets combinados:"
+        return ChatPrompt(
+            "Combina las siguientes listas parciales de bullets en una única lista concisa de máximo 12 bullets, ordenados por importancia. Devuelve Markdown.",
+            f"Listas parciales:\n{joined}\n\nBullets combinados:",
         )
-        return call_ollama_api(prompt)
 
-    if len(text) <= CHUNK_SIZE_CHARS:
-        markdown = call_ollama_api(per_chunk_prompt(text))
-    else:
-        markdown = _call_over_chunks(text, per_chunk_prompt, combine)
+    return await _run_plan(request, _chunk_plan(text, per_chunk_prompt, combine), max_concurrency, stream)
 
-    return {"result": markdown}
+
+@router.post("/analyze")
+async def analyze(
+    request: Request,
+    text: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),
+    analyses: Optional[List[str]] = Form(None),  # summary, keywords, entities, topics (por defecto todos)
+    summary_type: Optional[str] = Form("general"),
+    max_tokens: Optional[int] = Form(1024),
+    max_concurrency: Optional[int] = Form(None),
+):
+    """
+    Varios análisis del mismo documento en una sola pasada: se extrae y trocea una vez
+    y cada chunk recibe un único prompt JSON con todos los campos pedidos.
+    Devuelve `{"results": {análisis: markdown}, "data": {análisis: estructurado}, "stats": {...}}`.
+    """
+    try:
+        names = normalize_analyses(analyses)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    extra = {}
+    if not doc_id and not text and file is not None and (file.filename or "").lower().endswith(DOCUMENT_EXTENSIONS):
+        # el archivo queda en el almacén: la respuesta lleva su doc_id
+        document, extracted = await store_upload(file)
+        doc_id = extra["doc_id"] = document.doc_id
+        if extracted:
+            extra["extraction"] = document.extraction
+    input_text = await get_text(text, file, doc_id)
+    if not input_text.strip():
+        raise HTTPException(status_code=422, detail="No text provided")
+
+    result = await run_multi_analysis(
+        input_text, names, summary_type=summary_type or "general",
+        max_tokens=max_tokens or 1024, max_concurrency=max_concurrency,
+    )
+    ctx = current_context()
+    response = {**result, "partial": ctx.partial, "stats": ctx.stats.as_dict(), **extra}
+    if ctx.include_timings:
+        response["timings"] = ctx.timings_report()
+    return response
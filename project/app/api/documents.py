@@ -0,0 +1,114 @@
+# app/api/documents.py
+import asyncio
+import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from typing import Optional, Tuple
+from app.services.document_store import StoredDocument, document_store, text_document_id, valid_document_id
+from app.services.extractor import content_hash, extract_document
+from app.services.ai_client import CHUNK_SIZE_CHARS
+from app.services.request_context import current_context
+from app.services.retrieval import INDEX_ARTIFACT, build_index
+from app.utils.upload_limit import MAX_UPLOAD_BYTES
+
+router = APIRouter()
+
+DOCUMENT_EXTENSIONS = (".pdf", ".docx", ".txt", ".md")
+
+
+async def load_document(doc_id: str, attach: bool = True) -> StoredDocument:
+    """
+    Documento del almacén (404 si no existe o expiró). Con `attach` queda asociado
+    al request para que el chunking de su texto se reutilice.
+    """
+    document = await document_store.aget(doc_id) if valid_document_id(doc_id) else None
+    if document is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+    if attach:
+        current_context().document = document
+    return document
+
+
+async def store_upload(file: UploadFile) -> Tuple[StoredDocument, bool]:
+    """
+    Guarda un archivo subido en el almacén. El doc_id es el hash del contenido: si el
+    mismo archivo ya se subió, se devuelve sin volver a extraerlo.
+    Devuelve (documento, True si se extrajo ahora).
+    """
+    filename = file.filename or "document.txt"
+    ext = os.path.splitext(filename.lower())[1]
+    if ext not in DOCUMENT_EXTENSIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only .pdf, .docx, .txt and .md supported")
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+
+    doc_id = await asyncio.to_thread(content_hash, file.file)
+    document = await document_store.aget(doc_id)
+    if document is not None:
+        current_context().document = document
+        return document, False
+
+    artifacts = {}
+    if ext in (".pdf", ".docx"):
+        extraction = await extract_document(file.file, ext)
+        text, report = extraction.text, extraction.report()
+        if len(extraction.pages) > 1:
+            # límites de página, para detectar cabeceras y pies repetidos (precompress)
+            artifacts["page_offsets"] = extraction.page_offsets()
+    else:
+        text, report = file.file.read().decode("utf-8", errors="ignore"), None
+    if not text or text.strip() == "":
+        raise HTTPException(status_code=422, detail="No text could be extracted from the document")
+
+    artifacts.update(await index_artifacts(text))
+    document = await document_store.aput(doc_id, text, filename, report, artifacts)
+    current_context().document = document
+    return document, True
+
+
+async def index_artifacts(text: str) -> dict:
+    """
+    Índice de recuperación (BM25 + vectores) construido al guardar el documento, para
+    que la primera pregunta no pague la indexación. Los textos que caben en un chunk
+    no lo necesitan: /api/question los envía enteros.
+    """
+    if len(text) <= CHUNK_SIZE_CHARS:
+        return {}
+    index = await asyncio.to_thread(build_index, text)
+    return {INDEX_ARTIFACT: index.to_artifact()}
+
+
+@router.post("/documents", status_code=status.HTTP_201_CREATED)
+async def upload_document(
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    filename: Optional[str] = Form(None),
+):
+    """
+    Sube un documento (PDF, DOCX o texto) una sola vez y devuelve su `doc_id`, que
+    aceptan /api/summarize y los endpoints de análisis sin volver a subirlo ni extraerlo.
+    """
+    if file is not None and file.filename:
+        document, extracted = await store_upload(file)
+    elif text and text.strip():
+        doc_id = text_document_id(text)
+        document = await document_store.aget(doc_id)
+        extracted = document is None
+        if document is None:
+            document = await document_store.aput(doc_id, text, filename, artifacts=await index_artifacts(text))
+    else:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide a file or text")
+    return {**document.info(), "extracted": extracted}
+
+
+@router.get("/documents/{doc_id}")
+async def get_document(doc_id: str):
+    """
+    Metadatos del documento: nombre, longitud, informe de extracción y artefactos guardados.
+    """
+    return (await load_document(doc_id)).info()
+
+
+@router.delete("/documents/{doc_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document(doc_id: str):
+    if not valid_document_id(doc_id) or not await asyncio.to_thread(document_store.delete, doc_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
@@ -0,0 +1,103 @@
+# app/api/jobs.py
+import asyncio
+import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
+from typing import Optional
+from app.api.documents import load_document
+from app.schemas.job_schema import JobProgress, JobStatusResponse, JobSubmitResponse
+from app.schemas.summary_schema import SummarizeResponse
+from app.services.jobs import COMPLETED, FAILED, JOBS_UPLOAD_DIR, job_manager
+from app.utils.file_utils import save_upload_stream
+from app.api.summarize import MAX_FILE_SIZE_BYTES
+
+router = APIRouter()
+
+
+def _get_job(job_id: str) -> dict:
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.post("/jobs/summarize", response_model=JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_summarize_job(
+    file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),  # documento ya subido (POST /api/documents) en lugar de `file`
+    summary_type: Optional[str] = Form("general"),
+    max_tokens: Optional[int] = Form(1024),
+    max_concurrency: Optional[int] = Form(None),
+):
+    """
+    Encola el resumen de un documento y devuelve el id del job inmediatamente.
+    """
+    if doc_id:
+        # el texto ya extraído va directamente al job
+        document = await load_document(doc_id)
+        job_id = job_manager.submit(
+            document.filename or doc_id, None, summary_type, max_tokens, max_concurrency, text=document.text
+        )
+        return JobSubmitResponse(job_id=job_id, status="queued")
+    if file is None or not file.filename:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide a file or doc_id")
+
+    filename = file.filename.lower()
+    if not (filename.endswith(".pdf") or filename.endswith(".docx")):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only .pdf and .docx supported")
+
+    if file.size is not None and file.size > MAX_FILE_SIZE_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+    # el archivo se guarda fuera de TMP_DIR para poder retomar el job tras un reinicio
+    os.makedirs(JOBS_UPLOAD_DIR, exist_ok=True)
+    upload_path = await asyncio.to_thread(save_upload_stream, file.filename, file.file, JOBS_UPLOAD_DIR)
+
+    job_id = job_manager.submit(file.filename, upload_path, summary_type, max_tokens, max_concurrency)
+    return JobSubmitResponse(job_id=job_id, status="queued")
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job_status(job_id: str):
+    """
+    Estado del job, progreso por chunk y ETA estimado.
+    """
+    job = _get_job(job_id)
+    total = job["total_chunks"]
+    done = job["completed_chunks"]
+    if job["status"] == COMPLETED:
+        percent = 100.0
+    elif total:
+        # la síntesis final cuenta como un paso más
+        percent = round(100 * done / (total + 1), 1)
+    else:
+        percent = 0.0
+    return JobStatusResponse(
+        job_id=job["id"],
+        status=job["status"],
+        filename=job["filename"],
+        summary_type=job["summary_type"],
+        progress=JobProgress(completed_chunks=done, total_chunks=total, percent=percent),
+        eta_seconds=job_manager.eta_seconds(job),
+        error=job["error"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+    )
+
+
+@router.get("/jobs/{job_id}/result", response_model=SummarizeResponse)
+async def get_job_result(job_id: str):
+    """
+    Resultado del job (mismo formato que /api/summarize). 409 si aún no ha terminado.
+    """
+    job = _get_job(job_id)
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=422, detail=job["error"] or "Job failed")
+    if job["status"] != COMPLETED:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job is {job['status']}")
+    return SummarizeResponse(
+        summary=job["result"],
+        summary_type=job["summary_type"],
+        original_filename=job["filename"],
+        length_original=len(job["text"] or ""),
+        length_summary=len(job["result"]),
+    )
@@ -1,53 +1,184 @@
 # app/api/summarize.py
-import os
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, Depends
-from typing import Optional
+import asyncio
+import functools
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, status, Depends
+from typing import List, Optional
+from app.api.documents import load_document, store_upload
 from app.schemas.summary_schema import SummarizeRequest, SummarizeResponse
-from app.services.extractor import extract_text_from_pdf, extract_text_from_docx
-from app.services.ai_client import summarize_text_with_ollama
-from app.utils.file_utils import save_upload_temp, remove_file_silently
+from app.services.ai_client import plan_summary, summarize_text_with_ollama
+from app.services.batch import BATCH_DOCUMENTS_IN_FLIGHT, BATCH_LLM_WORKERS, summarize_batch
+from app.services.incremental import summarize_versioned
+from app.services.precompress import PRECOMPRESS_KEEP_FRACTION, compress_text
+from app.services.request_context import current_context
+from app.services.streaming import stream_map_reduce, streaming_response
+from app.utils.upload_limit import MAX_UPLOAD_BYTES
 
 router = APIRouter()
 
-MAX_FILE_SIZE_BYTES = 10 * 1024 * 1024  # 10 MB (ajusta si quieres)
+MAX_FILE_SIZE_BYTES = MAX_UPLOAD_BYTES  # 10 MB por defecto (MAX_UPLOAD_BYTES)
 
 @router.post("/summarize", response_model=SummarizeResponse)
 async def summarize(
-    file: UploadFile = File(...),
+    request: Request,
+    file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),  # documento ya subido (POST /api/documents) en lugar de `file`
     summary_type: Optional[str] = Form("general"),  # e.g., general, bullets, tldr, business
     max_tokens: Optional[int] = Form(1024),  # desired summary length (model dependent)
+    max_concurrency: Optional[int] = Form(None),  # chunks resumidos en paralelo (None = OLLAMA_MAP_CONCURRENCY)
+    stream: bool = Form(False),  # NDJSON/SSE con progreso por chunk y tokens de la síntesis
+    versioned: bool = Form(False),  # guardar los parciales por chunk para resumir versiones siguientes
+    previous_doc_id: Optional[str] = Form(None),  # versión anterior: solo se resumen los chunks cambiados
+    compress: bool = Form(False),  # pre-compresión extractiva local antes de los chunks
+    keep_fraction: Optional[float] = Form(None),  # fracción de oraciones conservadas (None = PRECOMPRESS_KEEP_FRACTION)
 ):
-    # Validate file type
-    filename = file.filename.lower()
-    if not (filename.endswith(".pdf") or filename.endswith(".docx")):
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only .pdf and .docx supported")
-
-    # Optional: check size
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE_BYTES:
-        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
-    # save temp
-    tmp_path = save_upload_temp(file.filename, contents)
-
-    try:
-        # Extract text
-        if filename.endswith(".pdf"):
-            text = extract_text_from_pdf(tmp_path)
-        else:
-            text = extract_text_from_docx(tmp_path)
-
-        if not text or text.strip() == "":
-            raise HTTPException(status_code=422, detail="No text could be extracted from the document")
-
-        # Call AI summarizer (Ollama)
-        summary = summarize_text_with_ollama(text, summary_type=summary_type, max_tokens=max_tokens)
-
-        return SummarizeResponse(
-            summary=summary,
+    if doc_id:
+        # documento ya extraído: se empieza directamente en la etapa del LLM
+        document = await load_document(doc_id)
+        extracted = False
+    else:
+        if file is None or not file.filename:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide a file or doc_id")
+        # Validate file type
+        filename = file.filename.lower()
+        if not (filename.endswith(".pdf") or filename.endswith(".docx")):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only .pdf and .docx supported")
+
+        # El cuerpo ya llegó en streaming con el límite aplicado (UploadSizeLimitMiddleware);
+        # aquí solo queda el límite por archivo, sin volver a leerlo en memoria
+        if file.size is not None and file.size > MAX_FILE_SIZE_BYTES:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+
+        # Extract text directamente del buffer de la subida (fuera del event loop;
+        # páginas de PDF en paralelo y cacheadas) y guardarlo en el almacén de documentos:
+        # la respuesta lleva el doc_id para los siguientes análisis
+        document, extracted = await store_upload(file)
+    text = document.text
+    extraction = document.extraction if extracted else None
+    original_filename = document.filename or ""
+
+    if versioned or previous_doc_id:
+        if compress:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Versioned summaries do not support compress")
+        if stream:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Versioned summaries do not support stream")
+        previous = await load_document(previous_doc_id, attach=False) if previous_doc_id else None
+        summary = await summarize_versioned(
+            document,
+            previous,
             summary_type=summary_type,
-            original_filename=file.filename,
-            length_original=len(text),
-            length_summary=len(summary),
+            max_tokens=max_tokens,
+            max_concurrency=max_concurrency,
         )
-    finally:
-        remove_file_silently(tmp_path)
+        return _response(document, summary, summary_type, extraction)
+
+    compression = None
+    if compress:
+        text, compression = await _compressed(document, keep_fraction)
+
+    if stream:
+        # el evento "done" lleva los mismos campos que SummarizeResponse
+        def done_fields(summary: str) -> dict:
+            return {
+                "summary": summary,
+                "summary_type": summary_type,
+                "original_filename": original_filename,
+                "length_original": len(document.text),
+                "length_summary": len(summary),
+                "doc_id": document.doc_id,
+                "extraction": extraction,
+                "compression": compression,
+            }
+
+        events = stream_map_reduce(
+            plan_summary(text, summary_type),
+            max_tokens=max_tokens,
+            max_concurrency=max_concurrency,
+            retry_delay=1,
+            done_fields=done_fields,
+        )
+        return streaming_response(request, events)
+
+    # Call AI summarizer (Ollama)
+    summary = await summarize_text_with_ollama(
+        text,
+        summary_type=summary_type,
+        max_tokens=max_tokens,
+        max_concurrency=max_concurrency,
+    )
+
+    return _response(document, summary, summary_type, extraction, compression)
+
+
+@router.post("/summarize/batch")
+async def summarize_many(
+    request: Request,
+    files: Optional[List[UploadFile]] = File(None),
+    doc_ids: Optional[List[str]] = Form(None),  # documentos ya subidos (POST /api/documents)
+    summary_type: Optional[str] = Form("general"),
+    max_tokens: Optional[int] = Form(1024),
+    workers: Optional[int] = Form(None),  # llamadas al LLM a la vez para todo el lote (None = BATCH_LLM_WORKERS)
+):
+    """
+    Resume varios documentos en un solo request. Devuelve NDJSON (o SSE) con un evento por
+    documento a medida que termina y un evento final con el throughput del lote; los
+    chunks idénticos entre documentos se resumen una sola vez.
+    """
+    sources = [(file.filename or f"document-{i}", functools.partial(_upload_text, file))
+               for i, file in enumerate(files or [])]
+    sources += [(doc_id, functools.partial(_stored_text, doc_id)) for doc_id in doc_ids or []]
+    if not sources:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide files or doc_ids")
+    events = summarize_batch(
+        sources,
+        summary_type=summary_type,
+        max_tokens=max_tokens,
+        workers=workers or BATCH_LLM_WORKERS,
+        in_flight=BATCH_DOCUMENTS_IN_FLIGHT,
+    )
+    return streaming_response(request, events)
+
+
+async def _upload_text(file: UploadFile):
+    document, _ = await store_upload(file)
+    return document.text, {"doc_id": document.doc_id}
+
+
+async def _stored_text(doc_id: str):
+    document = await load_document(doc_id)
+    return document.text, {"doc_id": document.doc_id}
+
+
+async def _compressed(document, keep_fraction: Optional[float]):
+    """
+    Texto pre-comprimido del documento (guardado como artefacto por fracción conservada).
+    """
+    fraction = PRECOMPRESS_KEEP_FRACTION if keep_fraction is None else keep_fraction
+    if not 0 < fraction <= 1:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="keep_fraction must be in (0, 1]")
+    key = f"compressed:{fraction}"
+    cached = document.get_artifact(key)
+    if cached is None:
+        # TextRank con NumPy: CPU, fuera del event loop
+        text, report = await asyncio.to_thread(
+            compress_text, document.text, document.get_artifact("page_offsets"), fraction
+        )
+        cached = {"text": text, "report": report}
+        document.set_artifact(key, cached)
+    return cached["text"], cached["report"]
+
+
+def _response(document, summary: str, summary_type: str, extraction: Optional[dict],
+              compression: Optional[dict] = None) -> SummarizeResponse:
+    return SummarizeResponse(
+        summary=summary,
+        summary_type=summary_type,
+        original_filename=document.filename or "",
+        length_original=len(document.text),
+        length_summary=len(summary),
+        doc_id=document.doc_id,
+        partial=current_context().partial,
+        stats=current_context().stats.as_dict(),
+        extraction=extraction,
+        compression=compression,
+        timings=current_context().timings_report(),
+    )
@@ -1,14 +1,49 @@
 # app/main.py
 import os
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import summarize, analysis
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.api import summarize, analysis, documents, jobs
+from app.services.ai_client import DeadlineExceededError, close_async_client
+from app.services.document_store import document_store
+from app.services.extractor import shutdown_extraction_pool
+from app.services.jobs import job_manager
+from app.services.llm_cache import llm_cache
+from app.services.llm_scheduler import LLMOverloadedError, scheduler
+from app.services.metrics import HTTP_REQUEST_SECONDS, LLM_CALLS_PER_REQUEST, REQUESTS_CANCELLED, registry
+from app.services.ollama_pool import backend_pool
+from app.services.request_context import begin_request, current_context, end_request
+from app.services.warmup import model_warmer
+from app.utils.disconnect import CancelOnDisconnectMiddleware
+from app.utils.upload_limit import BATCH_MAX_UPLOAD_BYTES, UploadSizeLimitMiddleware
 
 # Cargar variables de entorno desde .env
 load_dotenv()
 
-app = FastAPI(title="ResumeAI - PDF/DOCX Summarizer")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # health checks periódicos de los hosts de Ollama
+    await backend_pool.start()
+    # carga del modelo en segundo plano y ping periódico para que no se descargue
+    await model_warmer.start()
+    # workers de jobs en segundo plano (retoman los jobs pendientes)
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+    await model_warmer.stop()
+    # cerrar los pools de conexiones con Ollama
+    await close_async_client()
+    # procesos de extracción de PDF/DOCX
+    shutdown_extraction_pool()
+    # artefactos de documentos aún solo en memoria
+    document_store.flush()
+
+
+app = FastAPI(title="ResumeAI - PDF/DOCX Summarizer", lifespan=lifespan)
 
 # CORS (ajusta en producción)
 app.add_middleware(
@@ -17,12 +52,124 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],
 )
+# límite de tamaño de las subidas aplicado mientras se recibe el cuerpo
+app.add_middleware(UploadSizeLimitMiddleware, path_limits={"/api/summarize/batch": BATCH_MAX_UPLOAD_BYTES})
+
+
+def _route_path(request: Request) -> str:
+    # plantilla de la ruta (p. ej. /api/jobs/{job_id}) para no disparar la cardinalidad
+    route = request.scope.get("route")
+    template = getattr(route, "path", None)
+    if not template:
+        return "unmatched"
+    # con routers incluidos la plantilla puede venir sin el prefijo (/api)
+    path = request.url.path
+    depth = template.count("/")
+    prefix = path.rsplit("/", depth)[0] if path.count("/") > depth else ""
+    return prefix + template
+
+
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    # cada request tiene su propio turno en el scheduler de Ollama;
+    # `Cache-Control: no-cache` o `?no_cache=1` saltan la caché de respuestas del LLM;
+    # `?timings=1` añade el desglose de tiempos por etapa a la respuesta;
+    # `?deadline=<segundos>` (o X-Request-Deadline) devuelve un resultado parcial al llegar la hora límite
+    no_cache = (
+        "no-cache" in request.headers.get("Cache-Control", "").lower()
+        or request.query_params.get("no_cache", "").lower() in ("1", "true", "yes")
+    )
+    include_timings = request.query_params.get("timings", "").lower() in ("1", "true", "yes")
+    token = begin_request(
+        request.headers.get("X-Request-ID"), use_cache=not no_cache, include_timings=include_timings
+    )
+    ctx = current_context()
+    deadline = _deadline_seconds(request)
+    if deadline:
+        ctx.set_deadline(deadline)
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        end_request(token)
+
+    # etapas terminadas antes de enviar las cabeceras (en streaming, solo las previas)
+    if ctx.timings:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in ctx.timings.items()
+        )
+
+    body = response.body_iterator
+    path = _route_path(request)
+
+    async def observed_body():
+        # las métricas del request se registran cuando termina el cuerpo (incluido el streaming)
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=request.method, path=path, status=response.status_code
+            )
+            if path.startswith("/api/"):
+                LLM_CALLS_PER_REQUEST.observe(ctx.stats.llm_calls, path=path)
+            # respuesta parcial o 504: quien corta por la hora límite marca ctx.partial
+            if ctx.partial:
+                REQUESTS_CANCELLED.inc(reason="deadline")
+
+    response.body_iterator = observed_body()
+    return response
+
+
+def _deadline_seconds(request: Request):
+    raw = request.query_params.get("deadline") or request.headers.get("X-Request-Deadline")
+    try:
+        seconds = float(raw) if raw else None
+    except ValueError:
+        return None
+    return seconds if seconds and seconds > 0 else None
+
+
+# el más externo: al desconectarse el cliente se cancela toda la cadena del request
+app.add_middleware(CancelOnDisconnectMiddleware)
+
+
+@app.exception_handler(LLMOverloadedError)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloadedError):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(DeadlineExceededError)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededError):
+    # la cancelación se cuenta en request_context_middleware (ctx.partial), una vez por request
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 
 app.include_router(summarize.router, prefix="/api")
 app.include_router(analysis.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(documents.router, prefix="/api")
 
 @app.get("/")
 def root():
     return {"ok": True, "service": "ResumeAI Backend"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Métricas en formato de texto de Prometheus.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/status")
+def service_status():
+    return {"scheduler": scheduler.stats(), "ollama": backend_pool.stats(), "llm_cache": llm_cache.stats(),
+            "documents": document_store.stats(), "warmup": model_warmer.stats()}
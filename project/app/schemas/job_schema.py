@@ -0,0 +1,24 @@
+# app/schemas/job_schema.py
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+class JobProgress(BaseModel):
+    completed_chunks: int
+    total_chunks: Optional[int] = Field(None, description="None hasta que termina la extracción")
+    percent: float
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str = Field(..., description="queued | running | completed | failed")
+    filename: str
+    summary_type: str
+    progress: JobProgress
+    eta_seconds: Optional[float] = None
+    error: Optional[str] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
@@ -1,6 +1,6 @@
 # app/schemas/summary_schema.py
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Any, Dict, Optional
 
 class SummarizeRequest(BaseModel):
     summary_type: Optional[str] = Field("general", description="Tipo de resumen: general | bullets | tldr | business | academic")
@@ -12,3 +12,9 @@ class SummarizeResponse(BaseModel):
     original_filename: str
     length_original: int
     length_summary: int
+    doc_id: Optional[str] = Field(None, description="Id del documento en el almacén, para reutilizarlo en otros endpoints")
+    partial: bool = Field(False, description="True si la hora límite (?deadline=) cortó el trabajo y el resumen usa solo parte de los chunks")
+    stats: Optional[Dict[str, int]] = Field(None, description="Chunks, llamadas map/reduce, profundidad del reduce, llamadas reales a Ollama, tokens y ms de carga y de prompt")
+    extraction: Optional[Dict[str, Any]] = Field(None, description="Páginas extraídas, páginas servidas desde caché y tiempos de extracción")
+    compression: Optional[Dict[str, Any]] = Field(None, description="Pre-compresión extractiva: tamaños, ratio, líneas de cabecera eliminadas y tiempo")
+    timings: Optional[Dict[str, float]] = Field(None, description="Segundos por etapa (con ?timings=1)")
@@ -1,39 +1,111 @@
+import asyncio
 import os
 import time
-from typing import List
-import ollama
+from typing import AsyncIterator, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from app.services.chunker import (
+    CHARS_PER_TOKEN,
+    CHUNK_OVERLAP_TOKENS,
+    OLLAMA_NUM_CTX,
+    chunk_by_content,
+    chunk_text_by_budget,
+    chunk_token_budget,
+    estimate_tokens,
+    text_hash,
+)
+from app.services.llm_cache import LLM_CACHE_ENABLED, llm_cache, make_cache_key
+from app.services.llm_scheduler import LLMOverloadedError, scheduler
+from app.services.metrics import (
+    LLM_CACHE_LOOKUPS,
+    LLM_CALL_SECONDS,
+    LLM_CALLS,
+    record_ollama_response,
+    span,
+)
+from app.services.ollama_pool import OLLAMA_BASE_URL, OLLAMA_TIMEOUT, backend_pool
+from app.services.request_context import current_context
+from app.services.token_budget import TokenBudget, plan_budget, shares
 
 # Configuración para Ollama
+# (hosts, timeout y health checks en app/services/ollama_pool.py)
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:latest")
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
-# División de texto para evitar límites
-CHUNK_SIZE_CHARS = 2500
+# División de texto para evitar límites: los chunks se miden en tokens y ocupan
+# una fracción de la ventana de contexto del modelo (ver app/services/chunker.py)
+CHUNK_TOKENS = chunk_token_budget()
+# Equivalente en caracteres, para decidir si un texto cabe en un solo chunk
+CHUNK_SIZE_CHARS = int(CHUNK_TOKENS * CHARS_PER_TOKEN)
 
+# Máximo de chunks que se envían en paralelo por request (map stage).
+# Conviene alinearlo con OLLAMA_NUM_PARALLEL del servidor Ollama.
+MAP_CONCURRENCY = int(os.getenv("OLLAMA_MAP_CONCURRENCY", "4"))
+MAX_MAP_CONCURRENCY = int(os.getenv("OLLAMA_MAX_MAP_CONCURRENCY", "16"))
 
-def chunk_text(text: str, chunk_size: int = CHUNK_SIZE_CHARS) -> List[str]:
+# Reduce jerárquico: máximo de parciales fusionadas por llamada
+REDUCE_FAN_IN = int(os.getenv("REDUCE_FAN_IN", "8"))
+
+# Con `?deadline=<segundos>`, fracción del plazo reservada para la síntesis final:
+# el map stage y el reduce se cortan antes para que la síntesis llegue a tiempo
+DEADLINE_SYNTHESIS_FRACTION = float(os.getenv("DEADLINE_SYNTHESIS_FRACTION", "0.25"))
+
+
+class DeadlineExceededError(Exception):
     """
-    Divide textos grandes en partes más pequeñas para evitar límites de tokens.
+    La hora límite del request llegó antes de tener ningún resultado (HTTP 504).
     """
-    text = text.strip()
-    if len(text) <= chunk_size:
-        return [text]
+    status_code = 504
+    detail = "Deadline exceeded before any result was ready"
+
 
-    chunks = []
-    start = 0
+def _keep_alive(value: str):
+    """
+    keep_alive de Ollama: número = segundos (negativo = modelo fijado en memoria),
+    o una duración como "30m".
+    """
+    try:
+        return float(value)
+    except ValueError:
+        return value
 
-    while start < len(text):
-        end = min(len(text), start + chunk_size)
 
-        # intenta cortar en salto de línea
-        if end < len(text):
-            nl = text.rfind("\n", start, end)
-            if nl > start:
-                end = nl
+# Tiempo que Ollama mantiene el modelo cargado tras cada llamada ("-1" = siempre)
+OLLAMA_KEEP_ALIVE = _keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
 
-        chunks.append(text[start:end].strip())
-        start = end
 
+class ChatPrompt(str):
+    """
+    Prompt en dos mensajes: las instrucciones fijas van en el mensaje de sistema y el
+    contenido variable (chunk, parciales) en el de usuario. Todas las llamadas de un mismo
+    tipo comparten el prefijo, y Ollama reutiliza su caché KV en lugar de volver a
+    procesar las instrucciones en cada chunk.
+    Como str es el prompt completo, así que la caché, la estimación de tokens y quien
+    solo necesita el texto lo siguen tratando como un prompt normal.
+    """
+
+    def __new__(cls, system: str, user: str):
+        prompt = super().__new__(cls, f"{system}\n\n{user}")
+        prompt.system = system
+        prompt.user = user
+        return prompt
+
+
+def chunk_text(text: str, max_tokens: int = CHUNK_TOKENS) -> List[str]:
+    """
+    Divide textos grandes en partes más pequeñas para evitar límites de tokens.
+    Corta en límites de párrafo (o de oración si el párrafo no cabe).
+    Si el texto es el del documento del request (doc_id), los chunks se guardan
+    y reutilizan como artefacto del documento.
+    """
+    document = current_context().document
+    stored = document is not None and text == document.text
+    key = f"chunks:{max_tokens}:{CHUNK_OVERLAP_TOKENS}:{CHARS_PER_TOKEN}"
+    if stored:
+        chunks = document.get_artifact(key)
+        if chunks is not None:
+            return list(chunks)
+    with span("chunk"):
+        chunks = chunk_text_by_budget(text, max_tokens=max_tokens)
+    if stored:
+        document.set_artifact(key, chunks)
     return chunks
 
 
@@ -94,66 +166,628 @@ Usa terminología académica apropiada, cita hallazgos específicos con datos cu
 
     inst = instructions.get(summary_type, instructions["general"])
     markdown_note = "\n\nDevuelve ÚNICAMENTE el resumen en formato Markdown, sin introducción ni texto adicional. El resumen debe ser autocontenido y profesional."
-    return f"{inst}\n{markdown_note}\n\nTexto a resumir:\n{chunk}\n\nResumen:"
+    return ChatPrompt(f"{inst}\n{markdown_note}", f"Texto a resumir:\n{chunk}\n\nResumen:")
 
 
-def call_ollama_api(prompt: str, max_tokens: int = 1024) -> str:
+async def close_async_client():
     """
-    Llamada a Ollama usando el modelo local llama3.1.
+    Detiene los health checks y cierra los pools de conexiones con Ollama (shutdown de la app).
     """
-    try:
-        # Configurar cliente de Ollama
-        client = ollama.Client(host=OLLAMA_BASE_URL)
-        
-        # Realizar la llamada al modelo
-        response = client.chat(
-            model=OLLAMA_MODEL,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            options={
-                "num_predict": max_tokens,
-                "temperature": 0.2,
+    await backend_pool.stop()
+
+
+def _chat_request(prompt: str, max_tokens: int, response_format: Optional[str] = None) -> Tuple[list, dict, Optional[str]]:
+    """
+    Mensajes, opciones y clave de caché de una llamada a Ollama.
+    """
+    if isinstance(prompt, ChatPrompt):
+        messages = [
+            {"role": "system", "content": prompt.system},
+            {"role": "user", "content": prompt.user},
+        ]
+    else:
+        messages = [
+            {
+                "role": "user",
+                "content": prompt
             }
-        )
-        
-        # Extraer el contenido de la respuesta
-        return response['message']['content']
-        
-    except Exception as e:
-        raise RuntimeError(f"Ollama API error: {str(e)}")
+        ]
+    options = {
+        "num_predict": max_tokens,
+        "temperature": 0.2,
+        "num_ctx": OLLAMA_NUM_CTX,
+    }
+    extra = {"format": response_format} if response_format else {}
+    cache_key = make_cache_key(OLLAMA_MODEL, messages, options, **extra) if LLM_CACHE_ENABLED else None
+    return messages, options, cache_key
 
 
-def summarize_text_with_ollama(
-        text: str,
-        summary_type: str = "general",
-        max_tokens: int = 1024
+async def _cached_response(cache_key: Optional[str], use_cache: Optional[bool]) -> Optional[str]:
+    if use_cache is None:
+        use_cache = current_context().use_cache
+    if not cache_key or not use_cache:
+        return None
+    cached = await llm_cache.aget(cache_key)
+    LLM_CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+    if cached is not None:
+        current_context().stats.cache_hits += 1
+    return cached
+
+
+def _record_call(mode: str, started: float, response, max_tokens: int):
+    """
+    Métricas de una llamada terminada: duración, contadores del request y datos de Ollama.
+    """
+    elapsed = time.perf_counter() - started
+    LLM_CALL_SECONDS.observe(elapsed, model=OLLAMA_MODEL, mode=mode)
+    LLM_CALLS.inc(model=OLLAMA_MODEL, result="ok")
+    ctx = current_context()
+    ctx.stats.llm_calls += 1
+    ctx.stats.budgeted_tokens += max_tokens
+    ctx.add_timing("llm", elapsed)
+    record_ollama_response(OLLAMA_MODEL, response, max_tokens)
+
+
+async def call_ollama_api(
+        prompt: str,
+        max_tokens: int = 1024,
+        use_cache: Optional[bool] = None,
+        response_format: Optional[str] = None,
 ) -> str:
     """
-    Divide el texto en chunks, resume cada chunk y luego combina todo.
+    Llamada a Ollama usando el modelo local llama3.1.
+    Las respuestas se guardan en la caché por hash de (modelo, prompt, opciones);
+    `use_cache=False` (o un request con `Cache-Control: no-cache`) fuerza una generación nueva.
+    Pasa por el scheduler global, que limita las generaciones en curso por modelo,
+    y se envía al host de Ollama menos cargado del pool (con failover entre hosts).
+    `response_format="json"` pide a Ollama una salida JSON válida (structured output).
     """
-    chunks = chunk_text(text)
-    partial_summaries = []
+    messages, options, cache_key = _chat_request(prompt, max_tokens, response_format)
+    cached = await _cached_response(cache_key, use_cache)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    async with scheduler.slot(OLLAMA_MODEL):
+        try:
+            response = await backend_pool.chat(
+                model=OLLAMA_MODEL,
+                messages=messages,
+                options=options,
+                keep_alive=OLLAMA_KEEP_ALIVE,
+                **({"format": response_format} if response_format else {}),
+            )
 
-    for i, chunk in enumerate(chunks):
-        prompt = build_prompt(chunk, summary_type)
+            # Extraer el contenido de la respuesta
+            content = response['message']['content']
 
+        except asyncio.CancelledError:
+            # cliente desconectado u hora límite: se cierra la conexión y Ollama deja de generar
+            LLM_CALLS.inc(model=OLLAMA_MODEL, result="cancelled")
+            raise
+        except Exception as e:
+            LLM_CALLS.inc(model=OLLAMA_MODEL, result="error")
+            raise RuntimeError(f"Ollama API error: {str(e)}")
+    _record_call("call", started, response, max_tokens)
+
+    if cache_key:
+        await llm_cache.aset(cache_key, content)
+    return content
+
+
+async def stream_ollama_api(prompt: str, max_tokens: int = 1024, use_cache: Optional[bool] = None) -> AsyncIterator[str]:
+    """
+    Igual que `call_ollama_api` pero devuelve los tokens a medida que Ollama los genera
+    (`stream=True`). Un acierto de caché se devuelve como un único fragmento.
+    """
+    messages, options, cache_key = _chat_request(prompt, max_tokens)
+    cached = await _cached_response(cache_key, use_cache)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    last = None
+    started = time.perf_counter()
+    async with scheduler.slot(OLLAMA_MODEL):
         try:
-            partial = call_ollama_api(prompt, max_tokens=max_tokens)
-        except Exception:
-            time.sleep(1)
-            partial = call_ollama_api(prompt, max_tokens=max_tokens)
+            stream = backend_pool.chat_stream(
+                model=OLLAMA_MODEL,
+                messages=messages,
+                options=options,
+                keep_alive=OLLAMA_KEEP_ALIVE,
+            )
+            async for part in stream:
+                last = part
+                token = part['message']['content']
+                if token:
+                    parts.append(token)
+                    yield token
+        except Exception as e:
+            LLM_CALLS.inc(model=OLLAMA_MODEL, result="error")
+            raise RuntimeError(f"Ollama API error: {str(e)}")
+    # el último fragmento (done=True) trae los contadores de Ollama
+    _record_call("stream", started, last, max_tokens)
+
+    if cache_key:
+        await llm_cache.aset(cache_key, "".join(parts))
+
+
+async def call_ollama_with_retry(
+        prompt: str,
+        max_tokens: int = 1024,
+        retry_delay: float = 0,
+        response_format: Optional[str] = None,
+) -> str:
+    """
+    Llama a Ollama con un reintento simple (opcionalmente esperando `retry_delay` segundos).
+    Los rechazos del scheduler (cola llena) no se reintentan.
+    Si el contexto tiene `llm_call` (un documento de un lote), la llamada se delega en él.
+    """
+    llm_call = current_context().llm_call
+    if llm_call is not None:
+        return await llm_call(prompt, max_tokens, retry_delay, response_format)
+    kwargs = {"response_format": response_format} if response_format else {}
+    try:
+        return await call_ollama_api(prompt, max_tokens=max_tokens, **kwargs)
+    except LLMOverloadedError:
+        raise
+    except Exception:
+        if retry_delay:
+            await asyncio.sleep(retry_delay)
+        return await call_ollama_api(prompt, max_tokens=max_tokens, **kwargs)
+
+
+def stage_deadline() -> Optional[float]:
+    """
+    Hora límite (time.monotonic) del map stage y del reduce: la del request menos
+    la reserva para la síntesis final. None si el request no tiene hora límite.
+    """
+    ctx = current_context()
+    if ctx.deadline is None:
+        return None
+    return ctx.deadline - ctx.deadline_seconds * DEADLINE_SYNTHESIS_FRACTION
+
+
+async def with_deadline(awaitable):
+    """
+    Espera `awaitable` como mucho hasta la hora límite del request (asyncio.TimeoutError si no llega).
+    """
+    remaining = current_context().remaining()
+    if remaining is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, timeout=remaining)
+
+
+def resolve_map_concurrency(max_concurrency: Optional[int], n_prompts: int) -> int:
+    """
+    Concurrencia efectiva del map stage: la pedida por el request (o la de entorno),
+    acotada entre 1, MAX_MAP_CONCURRENCY y el número de prompts.
+    """
+    requested = max_concurrency if max_concurrency else MAP_CONCURRENCY
+    return max(1, min(requested, MAX_MAP_CONCURRENCY, n_prompts))
+
+
+async def gather_ordered(coros) -> list:
+    """
+    asyncio.gather que cancela las tareas pendientes si alguna falla.
+    Los resultados mantienen el orden de entrada.
+    """
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def gather_until(coros, deadline: float) -> list:
+    """
+    Como `gather_ordered`, pero a la hora límite (time.monotonic) cancela las tareas
+    sin terminar (también las que esperan turno en el scheduler); su resultado es None.
+    """
+    tasks = [asyncio.ensure_future(c) for c in coros]
+    try:
+        if tasks:
+            done, _ = await asyncio.wait(
+                tasks, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_EXCEPTION
+            )
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        return [task.result() if task.done() else None for task in tasks]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def map_prompts(
+        prompts: List[str],
+        max_tokens: int = 1024,
+        max_concurrency: Optional[int] = None,
+        retry_delay: float = 0,
+        on_result: Optional[Callable[[int, str], None]] = None,
+        response_format: Optional[str] = None,
+        deadline: Optional[float] = None,
+        token_limits: Optional[List[int]] = None,
+) -> List[Optional[str]]:
+    """
+    Map stage: envía los prompts a Ollama con concurrencia acotada por request
+    (el scheduler global limita además el total del proceso).
+    Las respuestas se devuelven en el mismo orden que los prompts;
+    `on_result(index, respuesta)` se invoca a medida que termina cada una.
+    Con `deadline` (time.monotonic), las llamadas sin terminar a esa hora se cancelan
+    y su respuesta es None.
+    `token_limits` fija el num_predict de cada prompt (en lugar de `max_tokens` para todos).
+    """
+    semaphore = asyncio.Semaphore(resolve_map_concurrency(max_concurrency, len(prompts)))
+    kwargs = {"response_format": response_format} if response_format else {}
+
+    async def run(index: int, prompt: str) -> str:
+        limit = token_limits[index] if token_limits else max_tokens
+        async with semaphore:
+            resp = await call_ollama_with_retry(
+                prompt, max_tokens=limit, retry_delay=retry_delay, **kwargs
+            )
+        resp = resp.strip()
+        if on_result:
+            on_result(index, resp)
+        return resp
+
+    if deadline is not None:
+        return await gather_until((run(i, p) for i, p in enumerate(prompts)), deadline)
+    return await gather_ordered(run(i, p) for i, p in enumerate(prompts))
+
+
+async def map_prompt_stream(
+        prompts: Iterable[str],
+        max_tokens: int = 1024,
+        max_concurrency: Optional[int] = None,
+        retry_delay: float = 0,
+        on_result: Optional[Callable[[int, str], None]] = None,
+        deadline: Optional[float] = None,
+) -> List[Optional[str]]:
+    """
+    Map stage sobre prompts que se generan bajo demanda (p. ej. chunks de un archivo que
+    se lee poco a poco): cada worker pide el siguiente prompt al quedar libre, así que en
+    memoria solo están los prompts en curso y las respuestas, no todo el texto.
+    El iterable se consume en un hilo (lectura y chunking fuera del event loop).
+    Las respuestas vuelven en el orden de los prompts. Con `deadline`, las llamadas sin
+    terminar son None y los prompts aún sin leer se descartan (el request queda parcial).
+    """
+    iterator = iter(prompts)
+    lock = asyncio.Lock()
+    results: List[Optional[str]] = []
+    exhausted = False
+
+    async def next_prompt() -> Tuple[int, Optional[str]]:
+        nonlocal exhausted
+        async with lock:
+            prompt = None if exhausted else await asyncio.to_thread(next, iterator, None)
+            if prompt is None:
+                exhausted = True
+                return -1, None
+            results.append(None)
+            return len(results) - 1, prompt
+
+    async def worker():
+        while True:
+            index, prompt = await next_prompt()
+            if prompt is None:
+                return
+            resp = (await call_ollama_with_retry(prompt, max_tokens=max_tokens, retry_delay=retry_delay)).strip()
+            results[index] = resp
+            if on_result:
+                on_result(index, resp)
+
+    workers = [
+        asyncio.ensure_future(worker())
+        for _ in range(resolve_map_concurrency(max_concurrency, MAX_MAP_CONCURRENCY))
+    ]
+    try:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        done, pending = await asyncio.wait(workers, timeout=timeout, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+        if pending or not exhausted:
+            current_context().partial = True
+    finally:
+        for task in workers:
+            if not task.done():
+                task.cancel()
+    return results
+
+
+def finished(results: List[Optional[str]]) -> List[str]:
+    """
+    Respuestas terminadas antes de la hora límite; si falta alguna, el request queda
+    marcado como parcial.
+    """
+    done = [r for r in results if r is not None]
+    if len(done) < len(results):
+        ctx = current_context()
+        ctx.partial = True
+        ctx.stats.skipped_chunks += len(results) - len(done)
+    return done
+
+
+def fit_budget(partials: List[str], budget: int = CHUNK_TOKENS) -> List[str]:
+    """
+    Primeras parciales que caben en `budget` tokens (al menos una).
+    """
+    kept, used = [], 0
+    for partial in partials:
+        used += estimate_tokens(partial)
+        if kept and used > budget:
+            break
+        kept.append(partial)
+    return kept
+
+
+class MapReducePlan(NamedTuple):
+    """
+    Plan map/reduce: prompts del map stage y función que construye el prompt final
+    a partir de las respuestas parciales (None = unir las parciales sin otra llamada).
+    """
+    prompts: List[str]
+    final_prompt_fn: Optional[Callable[[List[str]], str]]
+    # prompt para fusionar grupos de parciales en niveles intermedios (None = final_prompt_fn)
+    reduce_prompt_fn: Optional[Callable[[List[str]], str]] = None
+    # False si las parciales no se pueden fusionar entre sí (p. ej. pertenecen a textos distintos)
+    tree_reduce: bool = True
+    # tipo de resumen para repartir los tokens de salida de las llamadas intermedias
+    # (None = todas usan max_tokens) y fracción del documento que cubre cada prompt
+    budget_type: Optional[str] = None
+    shares: Optional[List[float]] = None
+    # prompts del map stage generados a medida que se consumen (en lugar de `prompts`)
+    prompt_stream: Optional[Iterator[str]] = None
 
-        partial_summaries.append(partial.strip())
 
-    # si solo fue un resumen
-    if len(partial_summaries) == 1:
-        return partial_summaries[0].strip()
+def plan_token_budget(plan: MapReducePlan, max_tokens: int) -> Optional[TokenBudget]:
+    """
+    Presupuesto de tokens de salida de las llamadas intermedias de un plan.
+    """
+    if plan.budget_type is None:
+        return None
+    return plan_budget(plan.budget_type, max_tokens, CHUNK_TOKENS)
+
 
-    # síntesis final - con instrucciones específicas según el tipo
+def map_token_limits(plan: MapReducePlan, max_tokens: int) -> Optional[List[int]]:
+    """
+    num_predict de cada prompt del map stage (None = max_tokens para todos).
+    """
+    budget = plan_token_budget(plan, max_tokens)
+    if budget is None:
+        return None
+    return budget.for_shares(plan.shares or shares([1] * len(plan.prompts)))
+
+
+def _reduce_groups(partials: List[str], fan_in: int, budget: int, content_defined: bool = False) -> List[List[str]]:
+    """
+    Agrupa parciales consecutivas: como máximo `fan_in` por grupo y `budget` tokens.
+    Con `content_defined`, un grupo también se cierra tras una parcial cuyo hash
+    cumple la condición de corte, para que los grupos no cambien al insertar o quitar
+    parciales en otro punto.
+    """
+    groups, current, used = [], [], 0
+    for partial in partials:
+        tokens = estimate_tokens(partial)
+        if current and (len(current) >= fan_in or used + tokens > budget):
+            groups.append(current)
+            current, used = [], 0
+        current.append(partial)
+        used += tokens
+        if content_defined and len(current) > 1 and int(text_hash(partial)[:8], 16) % max(2, fan_in // 2) == 0:
+            groups.append(current)
+            current, used = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def tree_reduce(
+        partials: List[str],
+        reduce_prompt_fn: Callable[[List[str]], str],
+        max_tokens: int = 1024,
+        max_concurrency: Optional[int] = None,
+        retry_delay: float = 0,
+        fan_in: int = REDUCE_FAN_IN,
+        budget: int = CHUNK_TOKENS,
+        on_level: Optional[Callable[[int, int], None]] = None,
+        memo: Optional[Dict[str, str]] = None,
+        memo_out: Optional[Dict[str, str]] = None,
+        token_budget: Optional[TokenBudget] = None,
+        partial_shares: Optional[List[float]] = None,
+) -> List[str]:
+    """
+    Reduce jerárquico: mientras las parciales no quepan en una sola llamada (más de
+    `fan_in` o más de `budget` tokens), se fusionan por grupos en paralelo, nivel a nivel.
+    Devuelve las parciales del último nivel, listas para la síntesis final.
+    `on_level(nivel, llamadas)` se invoca al terminar cada nivel.
+    Con `memo` (hash del prompt -> fusión de una ejecución anterior) los grupos se forman
+    por contenido y solo se llama al LLM para los grupos nuevos; todas las fusiones de
+    esta ejecución se escriben en `memo_out`.
+    Si se alcanza la hora límite del request, los grupos sin fusionar se quedan como
+    estaban y no se sigue reduciendo (el request queda marcado como parcial).
+    Con `token_budget`, cada fusión genera como máximo los tokens que corresponden a la
+    fracción del documento que cubre su grupo (`partial_shares`: fracción de cada parcial).
+    """
+    stats = current_context().stats
+    deadline = stage_deadline()
+    fan_in = max(2, fan_in)
+    level = 0
+    if not partial_shares or len(partial_shares) != len(partials):
+        # p. ej. faltan chunks por la hora límite: reparto uniforme
+        partial_shares = shares([1] * len(partials))
+    while len(partials) > 1 and (
+        len(partials) > fan_in or sum(estimate_tokens(p) for p in partials) > budget
+    ):
+        groups = _reduce_groups(partials, fan_in, budget, content_defined=memo is not None)
+        if len(groups) == len(partials):
+            # ninguna parcial se puede agrupar sin superar el presupuesto
+            break
+        prompts = [reduce_prompt_fn(group) for group in groups if len(group) > 1]
+        group_shares, start = [], 0
+        for group in groups:
+            group_shares.append(partial_shares[start:start + len(group)])
+            start += len(group)
+        limits = (
+            token_budget.for_shares([sum(s) for g, s in zip(groups, group_shares) if len(g) > 1])
+            if token_budget else None
+        )
+        keys = [text_hash(prompt) for prompt in prompts] if memo is not None else [None] * len(prompts)
+        pending = [i for i, key in enumerate(keys) if key is None or key not in memo]
+        with span("reduce"):
+            fresh = dict(zip(pending, await map_prompts(
+                [prompts[i] for i in pending],
+                max_tokens=max_tokens,
+                max_concurrency=max_concurrency,
+                retry_delay=retry_delay,
+                deadline=deadline,
+                token_limits=[limits[i] for i in pending] if limits else None,
+            )))
+        results = [fresh[i] if i in fresh else memo[keys[i]] for i in range(len(prompts))]
+        if memo is not None and memo_out is not None:
+            memo_out.update((key, result) for key, result in zip(keys, results) if result is not None)
+        merged = iter(results)
+        next_partials, next_shares = [], []
+        for group, group_share in zip(groups, group_shares):
+            result = next(merged) if len(group) > 1 else group[0]
+            next_partials.extend(group if result is None else [result])
+            next_shares.extend(group_share if result is None else [sum(group_share)])
+        timed_out = any(result is None for result in results)
+        partials, partial_shares = next_partials, next_shares
+        level += 1
+        stats.reduce_calls += sum(1 for i in pending if fresh[i] is not None)
+        stats.reduce_depth += 1
+        if on_level:
+            on_level(level, len(pending))
+        if timed_out:
+            current_context().partial = True
+            break
+    return partials
+
+
+async def run_map_stage(
+        plan: MapReducePlan,
+        max_tokens: int = 1024,
+        max_concurrency: Optional[int] = None,
+        retry_delay: float = 0,
+        on_result: Optional[Callable[[int, str], None]] = None,
+) -> List[str]:
+    """
+    Map stage de un plan (registrando chunks y llamadas en las estadísticas del request).
+    """
+    stats = current_context().stats
+    if plan.prompt_stream is not None:
+        # el número de chunks se conoce al terminar de leer
+        with span("map"):
+            results = await map_prompt_stream(
+                plan.prompt_stream,
+                max_tokens=max_tokens,
+                max_concurrency=max_concurrency,
+                retry_delay=retry_delay,
+                on_result=on_result,
+                deadline=stage_deadline(),
+            )
+        stats.chunks += len(results)
+        stats.map_calls += len(results)
+    else:
+        stats.chunks += max(1, len(plan.prompts))
+        stats.map_calls += len(plan.prompts)
+        if not plan.prompts:
+            return []
+        with span("map"):
+            results = await map_prompts(
+                plan.prompts,
+                max_tokens=max_tokens,
+                max_concurrency=max_concurrency,
+                retry_delay=retry_delay,
+                on_result=on_result,
+                deadline=stage_deadline(),
+                token_limits=map_token_limits(plan, max_tokens),
+            )
+    # con hora límite, la síntesis se hace con los chunks terminados
+    partials = finished(results)
+    if not partials:
+        raise DeadlineExceededError()
+    return partials
+
+
+async def run_reduce_levels(
+        plan: MapReducePlan,
+        partials: List[str],
+        max_tokens: int = 1024,
+        max_concurrency: Optional[int] = None,
+        retry_delay: float = 0,
+        on_level: Optional[Callable[[int, int], None]] = None,
+) -> List[str]:
+    """
+    Niveles intermedios del reduce de un plan (sin la síntesis final).
+    """
+    if plan.final_prompt_fn is None or not plan.tree_reduce:
+        return partials
+    return await tree_reduce(
+        partials,
+        plan.reduce_prompt_fn or plan.final_prompt_fn,
+        max_tokens=max_tokens,
+        max_concurrency=max_concurrency,
+        retry_delay=retry_delay,
+        on_level=on_level,
+        token_budget=plan_token_budget(plan, max_tokens),
+        partial_shares=plan.shares,
+    )
+
+
+def final_prompt(plan: MapReducePlan, partials: List[str]) -> Optional[str]:
+    """
+    Prompt de la síntesis final (None si el plan solo concatena las parciales).
+    """
+    if plan.final_prompt_fn is None:
+        return None
+    ctx = current_context()
+    if ctx.partial and plan.tree_reduce:
+        # el reduce no llegó a terminar: solo entra en la síntesis lo que cabe en un prompt
+        partials = fit_budget(partials)
+    ctx.stats.reduce_calls += 1
+    ctx.stats.reduce_depth += 1
+    return plan.final_prompt_fn(partials)
+
+
+async def run_map_reduce(
+        plan: MapReducePlan,
+        max_tokens: int = 1024,
+        max_concurrency: Optional[int] = None,
+        retry_delay: float = 0,
+) -> str:
+    """
+    Ejecuta un plan map/reduce: map stage en paralelo, reduce jerárquico si hace falta
+    y una llamada final de síntesis.
+    """
+    partials = await run_map_stage(plan, max_tokens, max_concurrency, retry_delay)
+    partials = await run_reduce_levels(plan, partials, max_tokens, max_concurrency, retry_delay)
+    prompt = final_prompt(plan, partials)
+    if prompt is None:
+        return "\n\n".join(partials)
+    with span("synthesis"):
+        try:
+            final = await with_deadline(call_ollama_with_retry(prompt, max_tokens=max_tokens, retry_delay=retry_delay))
+        except asyncio.TimeoutError:
+            # sin tiempo para la síntesis: se devuelven las parciales terminadas
+            current_context().partial = True
+            if not partials:
+                raise DeadlineExceededError()
+            return "\n\n".join(partials)
+    return final.strip()
+
+
+def build_synthesis_prompt(partial_summaries: List[str], summary_type: str) -> str:
+    """
+    Prompt de síntesis final - con instrucciones específicas según el tipo.
+    """
     combined = "\n\n---\n\n".join(partial_summaries)
     
     synthesis_instructions = {
@@ -170,12 +804,48 @@ def summarize_text_with_ollama(
     
     synthesis_inst = synthesis_instructions.get(summary_type, synthesis_instructions["general"])
 
-    final_prompt = (
+    return ChatPrompt(
         f"{synthesis_inst}\n\n"
-        f"Resúmenes parciales a fusionar:\n\n{combined}\n\n"
-        f"Devuelve ÚNICAMENTE el resumen final fusionado en formato Markdown, sin introducción ni texto adicional.\n\n"
-        f"Resumen final:"
+        "Devuelve ÚNICAMENTE el resumen final fusionado en formato Markdown, sin introducción ni texto adicional.",
+        f"Resúmenes parciales a fusionar:\n\n{combined}\n\nResumen final:",
     )
 
-    final = call_ollama_api(final_prompt, max_tokens=max_tokens)
-    return final.strip()
+
+def plan_summary(text: str, summary_type: str = "general", content_defined: bool = False) -> MapReducePlan:
+    """
+    Plan de resumen: un prompt por chunk y la síntesis final. Si el texto cabe en un
+    solo chunk, no hay map stage y la llamada final es el propio resumen.
+    Los tokens de salida de cada chunk se reparten según su tamaño (ver token_budget.py).
+    Con `content_defined` los chunks se cortan por contenido: un mismo pasaje en dos
+    documentos da el mismo chunk (y el mismo prompt) aunque esté en otra posición.
+    """
+    chunks = chunk_by_content(text, CHUNK_TOKENS) if content_defined else chunk_text(text)
+    if len(chunks) == 1:
+        return MapReducePlan([], lambda _: build_prompt(chunks[0], summary_type))
+    prompts = [build_prompt(chunk, summary_type) for chunk in chunks]
+    return MapReducePlan(
+        prompts,
+        lambda partials: build_synthesis_prompt(partials, summary_type),
+        # los niveles intermedios conservan el detalle; el formato se aplica al final
+        reduce_prompt_fn=lambda partials: build_synthesis_prompt(partials, "general"),
+        budget_type=summary_type,
+        shares=shares([estimate_tokens(chunk) for chunk in chunks]),
+    )
+
+
+async def summarize_text_with_ollama(
+        text: str,
+        summary_type: str = "general",
+        max_tokens: int = 1024,
+        max_concurrency: Optional[int] = None,
+        content_defined: bool = False,
+) -> str:
+    """
+    Divide el texto en chunks, resume cada chunk (en paralelo) y luego combina todo.
+    """
+    return await run_map_reduce(
+        plan_summary(text, summary_type, content_defined),
+        max_tokens=max_tokens,
+        max_concurrency=max_concurrency,
+        retry_delay=1,
+    )
@@ -0,0 +1,303 @@
+# app/services/batch.py
+"""
+Resumen de lotes de documentos (endpoint /api/summarize/batch y línea de comandos):
+
+    python -m app.services.batch documentos/ otro.pdf --summary-type bullets --out resumenes.jsonl
+"""
+import argparse
+import asyncio
+import functools
+import itertools
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.ai_client import call_ollama_with_retry, close_async_client, summarize_text_with_ollama
+from app.services.chunker import text_hash
+from app.services.extractor import extract_document, shutdown_extraction_pool
+from app.services.llm_scheduler import LLM_MAX_INFLIGHT
+from app.services.request_context import begin_request, current_context, end_request
+from app.services.text_stream import read_text
+
+# Llamadas al LLM en curso a la vez para todo el lote (la cola del lote alimenta al scheduler)
+BATCH_LLM_WORKERS = int(os.getenv("BATCH_LLM_WORKERS", str(LLM_MAX_INFLIGHT)))
+# Documentos extrayéndose o resumiéndose a la vez (acota los textos extraídos en memoria)
+BATCH_DOCUMENTS_IN_FLIGHT = int(os.getenv("BATCH_DOCUMENTS_IN_FLIGHT", "8"))
+# Respuestas ya generadas que se guardan para los duplicados de documentos posteriores (LRU)
+BATCH_DEDUP_ITEMS = int(os.getenv("BATCH_DEDUP_ITEMS", "4096"))
+
+BATCH_EXTENSIONS = (".pdf", ".docx", ".txt", ".md")
+
+# (nombre, función que devuelve el texto y los campos extra de su resultado)
+BatchSource = Tuple[str, Callable[[], Awaitable[Tuple[str, dict]]]]
+
+
+@dataclass
+class _WorkItem:
+    key: str
+    prompt: str
+    max_tokens: int
+    retry_delay: float
+    response_format: Optional[str]
+    future: asyncio.Future
+    started: bool = False
+
+
+class BatchWorkQueue:
+    """
+    Cola de llamadas al LLM compartida por todos los documentos de un lote: `workers`
+    tareas las envían al scheduler (nunca hay más de `workers` esperando turno en él),
+    primero las del documento más antiguo, para que los resultados salgan en orden.
+    Un prompt idéntico a otro ya enviado (la misma cláusula o plantilla en dos documentos)
+    espera la respuesta del primero en lugar de generar otra. Cada chunk lleva su propio
+    num_predict, así que se comparte la respuesta generada con el límite mayor: si el
+    prompt aún está en cola se le sube el límite; si ya se generó con uno menor, se
+    vuelve a generar (y esa respuesta sustituye a la anterior). De las respuestas ya
+    generadas solo se guardan las `dedup_items` usadas más recientemente.
+    """
+
+    def __init__(self, workers: int = BATCH_LLM_WORKERS, dedup_items: int = BATCH_DEDUP_ITEMS):
+        self.workers = max(1, workers)
+        self.dedup_items = dedup_items
+        self.calls = 0
+        self.deduplicated = 0
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        # prompts en cola o generándose, y respuestas ya generadas: clave -> (num_predict, respuesta)
+        self._pending: Dict[str, _WorkItem] = {}
+        self._done: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def call(
+        self,
+        prompt: str,
+        max_tokens: int = 1024,
+        retry_delay: float = 0,
+        response_format: Optional[str] = None,
+        priority: int = 0,
+    ) -> str:
+        """
+        Misma firma que call_ollama_with_retry (más la prioridad: menor = antes).
+        """
+        key = text_hash(f"{response_format}\0{prompt}")
+        done = self._done.get(key)
+        if done is not None and max_tokens <= done[0]:
+            self._done.move_to_end(key)
+            self._count_duplicate()
+            return done[1]
+        item = self._pending.get(key)
+        if item is not None and (max_tokens <= item.max_tokens or not item.started):
+            item.max_tokens = max(item.max_tokens, max_tokens)
+            self._count_duplicate()
+        else:
+            future = asyncio.get_running_loop().create_future()
+            item = self._pending[key] = _WorkItem(key, prompt, max_tokens, retry_delay, response_format, future)
+            self._queue.put_nowait((priority, next(self._seq), item))
+        # otro documento puede estar esperando la misma respuesta
+        return await asyncio.shield(item.future)
+
+    def _count_duplicate(self):
+        self.deduplicated += 1
+        current_context().stats.deduplicated_calls += 1
+
+    def _finish(self, item: _WorkItem, result: Optional[str] = None):
+        if self._pending.get(item.key) is item:
+            del self._pending[item.key]
+        if result is None:
+            return
+        done = self._done.get(item.key)
+        if done is None or done[0] <= item.max_tokens:
+            self._done[item.key] = (item.max_tokens, result)
+            self._done.move_to_end(item.key)
+        while len(self._done) > self.dedup_items:
+            self._done.popitem(last=False)
+
+    async def _worker(self):
+        while True:
+            _, _, item = await self._queue.get()
+            item.started = True
+            try:
+                result = await call_ollama_with_retry(
+                    item.prompt, item.max_tokens, item.retry_delay, item.response_format
+                )
+            except asyncio.CancelledError:
+                item.future.cancel()
+                raise
+            except Exception as e:
+                # un prompt que falla se vuelve a intentar si otro documento lo pide
+                self._finish(item)
+                item.future.set_exception(e)
+                item.future.exception()  # puede no quedar nadie esperándola
+            else:
+                self.calls += 1
+                self._finish(item, result)
+                item.future.set_result(result)
+
+
+async def summarize_batch(
+    sources: Iterable[BatchSource],
+    summary_type: str = "general",
+    max_tokens: int = 1024,
+    workers: int = BATCH_LLM_WORKERS,
+    in_flight: int = BATCH_DOCUMENTS_IN_FLIGHT,
+) -> AsyncIterator[dict]:
+    """
+    Resume un lote con summarize_text_with_ollama: `in_flight` documentos a la vez
+    (extracción en paralelo), chunks cortados por contenido y todas las llamadas al LLM
+    por una misma BatchWorkQueue. Emite eventos a medida que termina cada documento:
+    - {"event": "document", "index": i, "filename": ..., "summary": ..., "stats": {...}, "seconds": s}
+      (o `error` en lugar de `summary` si el documento falla)
+    - {"event": "done", "documents": n, "failed": k, "seconds": s, "documents_per_hour": x,
+      "llm_calls": c, "deduplicated_calls": d, "stats": {...}}
+    Las `stats` de cada documento cuentan sus chunks y llamadas del map/reduce; los tokens
+    y las llamadas que llegaron a Ollama se acumulan en las `stats` del evento final.
+    """
+    parent = current_context()
+    queue = BatchWorkQueue(workers)
+    events: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max(1, in_flight))
+    started = time.perf_counter()
+
+    async def run(index: int, name: str, load: Callable[[], Awaitable[Tuple[str, dict]]]):
+        async with slots:
+            doc_started = time.perf_counter()
+            event = {"event": "document", "index": index, "filename": name}
+            token = begin_request(
+                f"{parent.request_id}:{index}",
+                use_cache=parent.use_cache,
+                llm_call=functools.partial(queue.call, priority=index),
+            )
+            try:
+                text, extra = await load()
+                summary = await summarize_text_with_ollama(
+                    text, summary_type=summary_type, max_tokens=max_tokens, content_defined=True
+                )
+                event.update(
+                    summary=summary,
+                    summary_type=summary_type,
+                    length_original=len(text),
+                    length_summary=len(summary),
+                    stats=current_context().stats.as_dict(),
+                    **extra,
+                )
+            except Exception as e:
+                event["error"] = getattr(e, "detail", None) or str(e)
+            finally:
+                end_request(token)
+            event["seconds"] = round(time.perf_counter() - doc_started, 3)
+            events.put_nowait(event)
+
+    queue.start()
+    tasks = [asyncio.ensure_future(run(i, name, load)) for i, (name, load) in enumerate(sources)]
+    try:
+        failed = 0
+        for _ in tasks:
+            event = await events.get()
+            failed += "error" in event
+            yield event
+        elapsed = time.perf_counter() - started
+        yield {
+            "event": "done",
+            "documents": len(tasks),
+            "failed": failed,
+            "seconds": round(elapsed, 3),
+            "documents_per_hour": round((len(tasks) - failed) * 3600 / elapsed, 1) if elapsed else None,
+            "llm_calls": queue.calls,
+            "deduplicated_calls": queue.deduplicated,
+            "stats": parent.stats.as_dict(),
+        }
+    finally:
+        # cliente desconectado: se cancela el resto del lote
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await queue.stop()
+
+
+def collect_paths(inputs: Iterable[str]) -> List[str]:
+    """
+    Archivos soportados de las rutas recibidas (los directorios se recorren enteros).
+    """
+    paths = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for root, _, names in sorted(os.walk(path)):
+                paths.extend(os.path.join(root, n) for n in sorted(names) if n.lower().endswith(BATCH_EXTENSIONS))
+        else:
+            paths.append(path)
+    return paths
+
+
+def _read_path(path: str) -> str:
+    with open(path, "rb") as f:
+        return read_text(f)
+
+
+def path_source(path: str) -> BatchSource:
+    async def load() -> Tuple[str, dict]:
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in BATCH_EXTENSIONS:
+            raise ValueError(f"Unsupported file extension: {ext}")
+        if ext in (".pdf", ".docx"):
+            text = (await extract_document(path, ext)).text
+        else:
+            text = await asyncio.to_thread(_read_path, path)
+        if not text or text.strip() == "":
+            raise ValueError("No text could be extracted from the document")
+        return text, {}
+
+    return path, load
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Resume un lote de documentos (un JSON por línea y documento)")
+    parser.add_argument("paths", nargs="+", help="Archivos o directorios (.pdf, .docx, .txt, .md)")
+    parser.add_argument("--summary-type", default="general")
+    parser.add_argument("--max-tokens", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=BATCH_LLM_WORKERS, help="Llamadas al LLM a la vez")
+    parser.add_argument("--in-flight", type=int, default=BATCH_DOCUMENTS_IN_FLIGHT, help="Documentos a la vez")
+    parser.add_argument("--out", default=None, help="Archivo JSONL (por defecto la salida estándar)")
+    args = parser.parse_args(argv)
+
+    paths = collect_paths(args.paths)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+
+    async def run():
+        try:
+            events = summarize_batch(
+                [path_source(path) for path in paths],
+                summary_type=args.summary_type,
+                max_tokens=args.max_tokens,
+                workers=args.workers,
+                in_flight=args.in_flight,
+            )
+            async for event in events:
+                out.write(json.dumps(event, ensure_ascii=False) + "\n")
+                out.flush()
+        finally:
+            await close_async_client()
+
+    try:
+        asyncio.run(run())
+    finally:
+        shutdown_extraction_pool()
+        if args.out:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
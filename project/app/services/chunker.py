@@ -0,0 +1,239 @@
+# app/services/chunker.py
+import hashlib
+import math
+import os
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Ventana de contexto configurada en Ollama (se envía como `num_ctx` en cada llamada)
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "8192"))
+# Fracción de la ventana que puede ocupar el texto de un chunk
+CHUNK_CTX_FRACTION = float(os.getenv("CHUNK_CTX_FRACTION", "0.6"))
+# Tokens reservados para las instrucciones del prompt
+CHUNK_PROMPT_RESERVE_TOKENS = int(os.getenv("CHUNK_PROMPT_RESERVE_TOKENS", "512"))
+# Tokens repetidos del final de un chunk al inicio del siguiente
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+# Estimador calibrado: caracteres por token de llama3 en texto español/inglés
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "3.6"))
+
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"[^.!?…\n]*(?:[.!?…]+[\"'”»)\]]*|\n|$)")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación rápida del número de tokens (sin tokenizador).
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def chunk_token_budget(
+    num_ctx: int = OLLAMA_NUM_CTX,
+    max_output_tokens: int = 1024,
+    fraction: float = CHUNK_CTX_FRACTION,
+) -> int:
+    """
+    Tokens de texto por chunk: una fracción del contexto, dejando siempre sitio
+    para las instrucciones y la salida del modelo.
+    """
+    available = num_ctx - CHUNK_PROMPT_RESERVE_TOKENS - max_output_tokens
+    return max(64, min(int(num_ctx * fraction), available))
+
+
+def _split_long(text: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """
+    Divide un párrafo demasiado largo en oraciones (o líneas); las que siguen siendo
+    demasiado largas se cortan por el último espacio antes del límite.
+    Devuelve (pieza, separador_con_la_anterior).
+    """
+    max_chars = max(1, int(max_tokens * CHARS_PER_TOKEN))
+    pieces = []
+    sep = " "
+    for match in _SENTENCE_RE.finditer(text):
+        raw = match.group()
+        sentence = raw.strip()
+        if sentence:
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(" ", 0, max_chars)
+                if cut <= 0:
+                    cut = max_chars
+                pieces.append((sentence[:cut].strip(), sep))
+                sentence = sentence[cut:].strip()
+                sep = " "
+            if sentence:
+                pieces.append((sentence, sep))
+        sep = "\n" if raw.endswith("\n") else " "
+    return pieces
+
+
+def _units(text: str, max_tokens: int) -> List[Tuple[str, str]]:
+    """
+    Unidades indivisibles del texto: (texto, separador_con_la_anterior). Un párrafo
+    es una unidad si cabe en el presupuesto; si no, se divide en oraciones.
+    """
+    units = []
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append((paragraph, "\n\n"))
+            continue
+        for i, (sentence, sep) in enumerate(_split_long(paragraph, max_tokens)):
+            units.append((sentence, "\n\n" if i == 0 else sep))
+    return units
+
+
+def _join(units: List[Tuple[str, str]]) -> str:
+    parts = []
+    for i, (unit, sep) in enumerate(units):
+        if i:
+            parts.append(sep)
+        parts.append(unit)
+    return "".join(parts)
+
+
+def chunk_by_tokens(text: str, max_tokens: int, overlap_tokens: int = 0) -> List[str]:
+    """
+    Agrupa párrafos (y, si hace falta, oraciones) en chunks de hasta `max_tokens`
+    tokens estimados, cortando siempre en un límite de párrafo u oración.
+    Con `overlap_tokens` cada chunk repite las últimas unidades del anterior.
+    Tiempo lineal en la longitud del texto.
+    """
+    text = text.strip()
+    if not text:
+        return [""]
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+    chunks = []
+    current: List[Tuple[str, str]] = []
+    # tokens de cada unidad en `current`, incluido el separador
+    current_tokens: List[int] = []
+    used = 0
+    fresh = False  # hay unidades nuevas (no solo solapamiento) en el chunk actual
+
+    for unit in _units(text, max_tokens):
+        cost = estimate_tokens(unit[0]) + 1
+        if current and used + cost > max_tokens:
+            chunks.append(_join(current))
+            # solapamiento: conservar las últimas unidades hasta overlap_tokens
+            keep, kept = 0, 0
+            while keep < len(current) and kept + current_tokens[-1 - keep] <= overlap_tokens:
+                kept += current_tokens[-1 - keep]
+                keep += 1
+            current = current[len(current) - keep:] if keep else []
+            current_tokens = current_tokens[len(current_tokens) - keep:] if keep else []
+            used = kept
+            fresh = False
+            # si el solapamiento no deja sitio, se descarta
+            while current and used + cost > max_tokens:
+                used -= current_tokens.pop(0)
+                current.pop(0)
+        current.append(unit)
+        current_tokens.append(cost)
+        used += cost
+        fresh = True
+
+    if current and fresh:
+        chunks.append(_join(current))
+    return chunks
+
+
+def _stream_cut(buffer: str, start: int) -> Tuple[int, str]:
+    """
+    Último corte seguro de `buffer` a partir de `start`: fin de párrafo, de línea o
+    espacio (o el final). Devuelve (posición, separador).
+    """
+    for sep in ("\n\n", "\n", " "):
+        cut = buffer.rfind(sep, start)
+        if cut > start:
+            return cut, sep
+    return len(buffer), " "
+
+
+def iter_chunks_by_tokens(blocks: Iterable[str], max_tokens: int, overlap_tokens: int = 0) -> Iterator[str]:
+    """
+    Como `chunk_by_tokens`, pero sobre un texto que llega en bloques (p. ej. un archivo
+    que se decodifica poco a poco) y devolviendo los chunks a medida que se completan.
+    En memoria solo hay el bloque actual y unos dos chunks de texto pendiente, sea cual
+    sea la longitud total. Los cortes siguen siendo límites de párrafo u oración.
+    """
+    window = 2 * max(1, int(max_tokens * CHARS_PER_TOKEN))
+    buffer = ""
+    emitted = False
+    for block in blocks:
+        buffer += block
+        while len(buffer) >= 2 * window:
+            # se trocea hasta el último corte seguro; el último chunk puede seguir
+            # en el texto que aún no ha llegado, así que vuelve al buffer
+            cut, sep = _stream_cut(buffer, window)
+            chunks = chunk_by_tokens(buffer[:cut], max_tokens, overlap_tokens)
+            for chunk in chunks[:-1]:
+                emitted = True
+                yield chunk
+            buffer = chunks[-1] + sep + buffer[cut + len(sep):]
+            if len(chunks) == 1:
+                break
+    if buffer.strip() or not emitted:
+        yield from chunk_by_tokens(buffer, max_tokens, overlap_tokens)
+
+
+def chunk_text_by_budget(
+    text: str,
+    max_tokens: Optional[int] = None,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[str]:
+    """
+    Chunking con el presupuesto por defecto derivado de OLLAMA_NUM_CTX.
+    """
+    return chunk_by_tokens(text, max_tokens or chunk_token_budget(), overlap_tokens)
+
+
+def text_hash(text: str) -> str:
+    """
+    Hash del contenido de un chunk (o de un prompt), estable entre versiones y procesos.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _boundary_score(unit: str) -> float:
+    """
+    Valor pseudoaleatorio en [0, 1) que depende solo del contenido de la unidad.
+    """
+    return int(hashlib.blake2b(unit.encode("utf-8"), digest_size=8).hexdigest(), 16) / 2 ** 64
+
+
+def chunk_by_content(text: str, max_tokens: int, min_tokens: Optional[int] = None) -> List[str]:
+    """
+    Chunking definido por el contenido: tras alcanzar `min_tokens` (por defecto la mitad
+    del presupuesto), el chunk se cierra después de una unidad cuyo hash cae bajo un umbral
+    proporcional a su tamaño (media ~3/4 del presupuesto), o cuando la siguiente unidad no
+    cabe. Editar una parte del texto solo mueve los cortes cercanos: el resto de chunks
+    sale idéntico en la versión nueva y sus resultados se pueden reutilizar.
+    """
+    text = text.strip()
+    if not text:
+        return [""]
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+
+    min_tokens = max_tokens // 2 if min_tokens is None else max(0, min(min_tokens, max_tokens))
+    window = max(1, (max_tokens - min_tokens) // 2)
+    chunks = []
+    current: List[Tuple[str, str]] = []
+    used = 0
+    for unit in _units(text, max_tokens):
+        cost = estimate_tokens(unit[0]) + 1
+        if current and used + cost > max_tokens:
+            chunks.append(_join(current))
+            current, used = [], 0
+        current.append(unit)
+        used += cost
+        if used >= min_tokens and _boundary_score(unit[0]) < cost / window:
+            chunks.append(_join(current))
+            current, used = [], 0
+    if current:
+        chunks.append(_join(current))
+    return chunks
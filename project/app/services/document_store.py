@@ -0,0 +1,320 @@
+# app/services/document_store.py
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.utils.file_utils import DATA_DIR
+
+DOC_STORE_DIR = os.getenv("DOC_STORE_DIR", os.path.join(DATA_DIR, "documents"))
+# Documentos sin usar durante este tiempo se eliminan (memoria y disco)
+DOC_STORE_TTL_SECONDS = float(os.getenv("DOC_STORE_TTL_SECONDS", str(24 * 3600)))
+DOC_STORE_MEMORY_ITEMS = int(os.getenv("DOC_STORE_MEMORY_ITEMS", "32"))
+DOC_STORE_MEMORY_BYTES = int(os.getenv("DOC_STORE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+
+_DOC_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def text_document_id(text: str) -> str:
+    """
+    doc_id de un texto enviado directamente (hash del contenido en UTF-8).
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def valid_document_id(doc_id: str) -> bool:
+    return bool(doc_id) and bool(_DOC_ID_RE.match(doc_id))
+
+
+@dataclass
+class StoredDocument:
+    """
+    Documento subido una vez: texto extraído, informe de extracción y artefactos
+    derivados (chunks por presupuesto de tokens, resúmenes parciales, ...).
+    """
+    doc_id: str
+    text: str
+    filename: Optional[str] = None
+    extraction: Optional[Dict[str, Any]] = None
+    artifacts: Dict[str, Any] = field(default_factory=dict)
+    created: float = field(default_factory=time.time)
+    accessed: float = field(default_factory=time.time)
+    # artefactos nuevos aún no escritos en disco
+    dirty: bool = field(default=False, compare=False)
+
+    def get_artifact(self, key: str) -> Any:
+        return self.artifacts.get(key)
+
+    def set_artifact(self, key: str, value: Any):
+        self.artifacts[key] = value
+        self.dirty = True
+
+    def size(self) -> int:
+        # aproximado: texto más los textos y listas de textos de los artefactos
+        # (chunks, texto comprimido, índice de recuperación)
+        total = len(self.text)
+        for value in self.artifacts.values():
+            for item in value.values() if isinstance(value, dict) else [value]:
+                if isinstance(item, str):
+                    total += len(item)
+                elif isinstance(item, list):
+                    total += sum(len(v) for v in item if isinstance(v, str))
+        return total
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "doc_id": self.doc_id,
+            "filename": self.filename,
+            "characters": len(self.text),
+            "extraction": self.extraction,
+            "artifacts": sorted(self.artifacts),
+            "created": self.created,
+            "accessed": self.accessed,
+        }
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "doc_id": self.doc_id,
+            "text": self.text,
+            "filename": self.filename,
+            "extraction": self.extraction,
+            "artifacts": self.artifacts,
+            "created": self.created,
+        }
+
+
+class DocumentStore:
+    """
+    Almacén de documentos por doc_id (hash del contenido subido):
+    - memoria: LRU acotado por número de documentos y tamaño del texto; al desalojar
+      un documento sus artefactos nuevos se vuelcan a disco
+    - disco: un JSON por documento en `directory`; la fecha de modificación del
+      archivo es el último acceso y sirve para la expiración por TTL
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = DOC_STORE_DIR,
+        ttl_seconds: float = DOC_STORE_TTL_SECONDS,
+        memory_items: int = DOC_STORE_MEMORY_ITEMS,
+        memory_bytes: int = DOC_STORE_MEMORY_BYTES,
+    ):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self._memory: "OrderedDict[str, StoredDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "spills": 0, "expired": 0}
+
+    def _path(self, doc_id: str) -> Optional[str]:
+        if not self.directory or not valid_document_id(doc_id):
+            return None
+        return os.path.join(self.directory, doc_id + ".json")
+
+    def _expired(self, accessed: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - accessed > self.ttl_seconds
+
+    def _write(self, document: StoredDocument):
+        path = self._path(document.doc_id)
+        if path is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".doc_", dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(document.to_json(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+        document.dirty = False
+        self.counters["writes"] += 1
+
+    def _read(self, doc_id: str, now: float) -> Optional[StoredDocument]:
+        path = self._path(doc_id)
+        if path is None or not os.path.exists(path):
+            return None
+        try:
+            if self._expired(os.path.getmtime(path), now):
+                os.remove(path)
+                self.counters["expired"] += 1
+                return None
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path, (now, now))
+        except (OSError, ValueError):
+            return None
+        return StoredDocument(
+            doc_id=data["doc_id"],
+            text=data["text"],
+            filename=data.get("filename"),
+            extraction=data.get("extraction"),
+            artifacts=data.get("artifacts") or {},
+            created=data.get("created") or now,
+            accessed=now,
+        )
+
+    def _touch(self, document: StoredDocument):
+        """
+        Lleva el último acceso en memoria a la fecha del archivo (la que usa el TTL).
+        """
+        path = self._path(document.doc_id)
+        if path is None:
+            return
+        try:
+            os.utime(path, (document.accessed, document.accessed))
+        except OSError:
+            pass
+
+    def _remember(self, document: StoredDocument) -> List[StoredDocument]:
+        """
+        Añade el documento al LRU y devuelve los desalojados (para volcarlos o
+        actualizar la fecha de su archivo).
+        """
+        self._memory[document.doc_id] = document
+        self._memory.move_to_end(document.doc_id)
+        spilled = []
+        used = sum(d.size() for d in self._memory.values())
+        while len(self._memory) > 1 and (len(self._memory) > self.memory_items or used > self.memory_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            used -= evicted.size()
+            spilled.append(evicted)
+        return spilled
+
+    def _spill(self, documents: List[StoredDocument]):
+        # los aciertos en memoria no tocan el disco: sin esto, un documento usado
+        # durante más del TTL expiraría en disco en cuanto saliera de memoria
+        for document in documents:
+            if document.dirty:
+                self._write(document)
+                self.counters["spills"] += 1
+            else:
+                self._touch(document)
+
+    def put(
+        self,
+        doc_id: str,
+        text: str,
+        filename: Optional[str] = None,
+        extraction: Optional[Dict[str, Any]] = None,
+        artifacts: Optional[Dict[str, Any]] = None,
+    ) -> StoredDocument:
+        """
+        Guarda el documento (o devuelve el existente con el mismo doc_id).
+        """
+        existing = self.get(doc_id)
+        if existing is not None:
+            return existing
+        document = StoredDocument(
+            doc_id=doc_id, text=text, filename=filename, extraction=extraction, artifacts=dict(artifacts or {})
+        )
+        with self._lock:
+            spilled = self._remember(document)
+        self._write(document)
+        self._spill(spilled)
+        self.purge_expired()
+        return document
+
+    def get(self, doc_id: str) -> Optional[StoredDocument]:
+        now = time.time()
+        with self._lock:
+            document = self._memory.get(doc_id)
+            if document is not None:
+                if not self._expired(document.accessed, now):
+                    document.accessed = now
+                    self._memory.move_to_end(doc_id)
+                    self.counters["memory_hits"] += 1
+                    return document
+                del self._memory[doc_id]
+        document = self._read(doc_id, now)
+        if document is None:
+            self.counters["misses"] += 1
+            return None
+        self.counters["disk_hits"] += 1
+        with self._lock:
+            spilled = self._remember(document)
+        self._spill(spilled)
+        return document
+
+    def delete(self, doc_id: str) -> bool:
+        with self._lock:
+            found = self._memory.pop(doc_id, None) is not None
+        path = self._path(doc_id)
+        if path and os.path.exists(path):
+            os.remove(path)
+            found = True
+        return found
+
+    def purge_expired(self, min_interval: float = 60.0):
+        """
+        Elimina del disco los documentos sin usar durante más de `ttl_seconds`
+        (como mucho una vez cada `min_interval` segundos).
+        """
+        now = time.time()
+        if self.ttl_seconds <= 0 or not self.directory or now - self._last_purge < min_interval:
+            return
+        self._last_purge = now
+        with self._lock:
+            for doc_id in [k for k, d in self._memory.items() if self._expired(d.accessed, now)]:
+                del self._memory[doc_id]
+            in_memory = set(self._memory)
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            doc_id = name[:-5]
+            if not name.endswith(".json") or doc_id in in_memory:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if self._expired(os.path.getmtime(path), now):
+                    os.remove(path)
+                    self.counters["expired"] += 1
+            except OSError:
+                pass
+
+    def flush(self):
+        """
+        Vuelca a disco los artefactos pendientes de los documentos en memoria (y la
+        fecha de último acceso de los demás).
+        """
+        with self._lock:
+            documents = list(self._memory.values())
+        for document in documents:
+            if document.dirty:
+                self._write(document)
+            else:
+                self._touch(document)
+
+    async def aput(self, doc_id: str, text: str, filename: Optional[str] = None,
+                   extraction: Optional[Dict[str, Any]] = None,
+                   artifacts: Optional[Dict[str, Any]] = None) -> StoredDocument:
+        return await asyncio.to_thread(self.put, doc_id, text, filename, extraction, artifacts)
+
+    async def aget(self, doc_id: str) -> Optional[StoredDocument]:
+        # los documentos en memoria se sirven sin salir del event loop
+        with self._lock:
+            cached = doc_id in self._memory
+        if cached:
+            document = self.get(doc_id)
+            if document is not None:
+                return document
+        return await asyncio.to_thread(self.get, doc_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                "memory_entries": len(self._memory),
+                "memory_bytes": sum(d.size() for d in self._memory.values()),
+            }
+
+
+# Almacén compartido por el proceso
+document_store = DocumentStore()
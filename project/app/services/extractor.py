@@ -1,9 +1,32 @@
 # app/services/extractor.py
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional, Tuple, Union
+
 import pdfplumber
 from docx import Document
-from typing import List
 
-def extract_text_from_pdf(path: str) -> str:
+from app.services.metrics import record_timing
+from app.utils.file_utils import remove_file_silently, save_upload_stream
+
+# Procesos para extraer texto fuera del event loop (0 = usar hilos)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Páginas de PDF por tarea del pool; los PDFs grandes se reparten en rangos
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# Páginas extraídas que se mantienen en caché (clave: hash del archivo + página)
+EXTRACT_PAGE_CACHE_ITEMS = int(os.getenv("EXTRACT_PAGE_CACHE_ITEMS", "4096"))
+
+# Ruta en disco o buffer binario (p. ej. el SpooledTemporaryFile de un UploadFile)
+Source = Union[str, BinaryIO]
+
+def extract_text_from_pdf(path: Source) -> str:
     """
     Extrae texto de un PDF intentando página por página.
     """
@@ -19,7 +42,7 @@ def extract_text_from_pdf(path: str) -> str:
         raise RuntimeError(f"PDF extraction failed: {e}")
     return "\n\n".join(text_pages).strip()
 
-def extract_text_from_docx(path: str) -> str:
+def extract_text_from_docx(path: Source) -> str:
     """
     Extrae texto de .docx por párrafo.
     """
@@ -29,3 +52,252 @@ def extract_text_from_docx(path: str) -> str:
         return "\n\n".join(paragraphs).strip()
     except Exception as e:
         raise RuntimeError(f"DOCX extraction failed: {e}")
+
+def extract_text_from_file(path: Source, ext: str) -> str:
+    """
+    Extrae texto según la extensión (.pdf o .docx).
+    """
+    ext = ext.lower()
+    if ext == ".pdf":
+        return extract_text_from_pdf(path)
+    if ext == ".docx":
+        return extract_text_from_docx(path)
+    raise ValueError(f"Unsupported file extension: {ext}")
+
+
+# --- Extracción en paralelo (process pool) ---
+
+@dataclass
+class ExtractionResult:
+    text: str
+    pages: List[str]  # texto por página (un .docx cuenta como una página)
+    page_seconds: List[float]  # tiempo de extracción por página (0 si vino de caché)
+    cached_pages: int
+    seconds: float  # tiempo total, incluida la espera del pool
+
+    def report(self) -> dict:
+        extracted = [s for s in self.page_seconds if s > 0]
+        return {
+            "pages": len(self.pages),
+            "cached_pages": self.cached_pages,
+            "seconds": round(self.seconds, 4),
+            "page_seconds_avg": round(sum(extracted) / len(extracted), 4) if extracted else 0.0,
+            "page_seconds_max": round(max(extracted), 4) if extracted else 0.0,
+            "page_seconds": [round(s, 4) for s in self.page_seconds],
+        }
+
+    def page_offsets(self) -> List[int]:
+        """
+        Posición en `text` donde empieza cada página no vacía, para volver a separarlas.
+        """
+        offsets, pos = [], 0
+        for page in self.pages:
+            if page:
+                offsets.append(pos)
+                pos += len(page) + 2
+        joined = "\n\n".join(p for p in self.pages if p)
+        lead = len(joined) - len(joined.lstrip())
+        return [max(0, offset - lead) for offset in offsets]
+
+
+def _pdf_page_range(path: Source, start: int, end: int) -> List[Tuple[str, float]]:
+    """
+    Worker: texto y segundos de las páginas [start, end) de un PDF.
+    """
+    results = []
+    with pdfplumber.open(path) as pdf:
+        for page in pdf.pages[start:end]:
+            started = time.perf_counter()
+            text = page.extract_text() or ""
+            results.append((text, time.perf_counter() - started))
+    return results
+
+
+def _pdf_page_count(path: Source) -> int:
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _docx_timed(path: Source) -> Tuple[str, float]:
+    started = time.perf_counter()
+    text = extract_text_from_docx(path)
+    return text, time.perf_counter() - started
+
+
+def content_hash(path: Source) -> str:
+    """
+    SHA-256 del contenido del archivo (ruta o buffer, que queda rebobinado).
+    """
+    digest = hashlib.sha256()
+    if isinstance(path, str):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    else:
+        path.seek(0)
+        for block in iter(lambda: path.read(1024 * 1024), b""):
+            digest.update(block)
+        path.seek(0)
+    return digest.hexdigest()
+
+
+def _buffer_path(buffer: BinaryIO) -> Optional[str]:
+    """
+    Ruta en disco de un buffer que ya tiene archivo propio (un archivo abierto o un
+    SpooledTemporaryFile volcado a disco con nombre), o None si solo está en memoria.
+    """
+    raw = getattr(buffer, "_file", buffer)
+    name = getattr(raw, "name", None)
+    if not isinstance(name, str) or not os.path.isfile(name):
+        return None
+    raw.flush()
+    return name
+
+
+def _spill_buffer(buffer: BinaryIO) -> str:
+    path = save_upload_stream("buffer.pdf", buffer)
+    buffer.seek(0)
+    return path
+
+
+def _pdf_ranges_sequential(buffer: BinaryIO, ranges: List[Tuple[int, int]]) -> List[List[Tuple[str, float]]]:
+    return [_pdf_page_range(buffer, start, end) for start, end in ranges]
+
+
+class PageCache:
+    """
+    LRU de texto por (hash del archivo, página).
+    """
+
+    def __init__(self, max_items: int = EXTRACT_PAGE_CACHE_ITEMS):
+        self.max_items = max_items
+        self._items: "OrderedDict[Tuple[str, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_hash: str, page: int) -> Optional[str]:
+        with self._lock:
+            text = self._items.get((file_hash, page))
+            if text is not None:
+                self._items.move_to_end((file_hash, page))
+            return text
+
+    def set(self, file_hash: str, page: int, text: str):
+        with self._lock:
+            self._items[(file_hash, page)] = text
+            self._items.move_to_end((file_hash, page))
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+page_cache = PageCache()
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Pool de procesos compartido (None si EXTRACT_WORKERS=0: se usan hilos).
+    """
+    global _pool
+    if EXTRACT_WORKERS <= 0:
+        return None
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_extraction_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _page_ranges(missing: List[int], size: int) -> List[Tuple[int, int]]:
+    """
+    Agrupa páginas pendientes consecutivas en rangos de como máximo `size` páginas.
+    """
+    ranges = []
+    for page in missing:
+        if ranges and ranges[-1][1] == page and page - ranges[-1][0] < size:
+            ranges[-1] = (ranges[-1][0], page + 1)
+        else:
+            ranges.append((page, page + 1))
+    return ranges
+
+
+async def extract_document(path: Source, ext: str) -> ExtractionResult:
+    """
+    Extrae el texto de un .pdf o .docx fuera del event loop. Los PDFs se reparten por
+    rangos de páginas entre los procesos del pool y cada página se cachea por hash
+    del archivo, de modo que volver a subir el mismo documento no lo re-procesa.
+
+    `path` puede ser una ruta o un buffer binario: un buffer se lee en su sitio desde
+    un hilo (sin copiarlo a un archivo temporal). Con varios rangos de páginas que
+    repartir entre procesos, los workers reciben solo una ruta: la del propio buffer si
+    ya está en disco o, si está en memoria, la de una única copia temporal.
+    """
+    result = await _extract_document(path, ext)
+    record_timing("extract", result.seconds)
+    return result
+
+
+async def _extract_document(path: Source, ext: str) -> ExtractionResult:
+    ext = ext.lower()
+    if ext not in (".pdf", ".docx"):
+        raise ValueError(f"Unsupported file extension: {ext}")
+
+    loop = asyncio.get_running_loop()
+    pool = get_extraction_pool()
+    started = time.perf_counter()
+    file_hash = await asyncio.to_thread(content_hash, path)
+
+    if ext == ".docx":
+        text = page_cache.get(file_hash, 0)
+        seconds, cached = 0.0, 1
+        if text is None:
+            try:
+                executor = pool if isinstance(path, str) else None
+                text, seconds = await loop.run_in_executor(executor, _docx_timed, path)
+            except RuntimeError:
+                raise
+            except Exception as e:
+                raise RuntimeError(f"DOCX extraction failed: {e}")
+            page_cache.set(file_hash, 0, text)
+            cached = 0
+        return ExtractionResult(text, [text], [seconds], cached, time.perf_counter() - started)
+
+    try:
+        n_pages = await asyncio.to_thread(_pdf_page_count, path)
+        pages: List[Optional[str]] = [page_cache.get(file_hash, i) for i in range(n_pages)]
+        page_seconds = [0.0] * n_pages
+        missing = [i for i, text in enumerate(pages) if text is None]
+        ranges = _page_ranges(missing, max(1, PDF_PAGES_PER_TASK))
+        if isinstance(path, str):
+            results = await asyncio.gather(*(
+                loop.run_in_executor(pool, _pdf_page_range, path, start, end) for start, end in ranges
+            ))
+        elif pool is None or len(ranges) <= 1:
+            results = await asyncio.to_thread(_pdf_ranges_sequential, path, ranges)
+        else:
+            spilled = None
+            shared = _buffer_path(path)
+            if shared is None:
+                shared = spilled = await asyncio.to_thread(_spill_buffer, path)
+            try:
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(pool, _pdf_page_range, shared, start, end) for start, end in ranges
+                ))
+            finally:
+                remove_file_silently(spilled)
+    except Exception as e:
+        raise RuntimeError(f"PDF extraction failed: {e}")
+
+    for (start, _), page_results in zip(ranges, results):
+        for offset, (text, seconds) in enumerate(page_results):
+            pages[start + offset] = text
+            page_seconds[start + offset] = seconds
+            page_cache.set(file_hash, start + offset, text)
+
+    text = "\n\n".join(p for p in pages if p).strip()
+    return ExtractionResult(text, pages, page_seconds, n_pages - len(missing), time.perf_counter() - started)
@@ -0,0 +1,104 @@
+# app/services/incremental.py
+from typing import Dict, List, Optional
+
+from app.services.ai_client import (
+    CHUNK_TOKENS,
+    OLLAMA_MODEL,
+    build_prompt,
+    build_synthesis_prompt,
+    call_ollama_with_retry,
+    map_prompts,
+    tree_reduce,
+)
+from app.services.chunker import chunk_by_content, estimate_tokens, text_hash
+from app.services.document_store import StoredDocument
+from app.services.metrics import span
+from app.services.request_context import current_context
+from app.services.token_budget import plan_budget, shares
+
+
+def _chunks(document: StoredDocument, max_tokens: int = CHUNK_TOKENS) -> List[str]:
+    key = f"cdc_chunks:{max_tokens}"
+    chunks = document.get_artifact(key)
+    if chunks is None:
+        with span("chunk"):
+            chunks = chunk_by_content(document.text, max_tokens)
+        document.set_artifact(key, chunks)
+    return list(chunks)
+
+
+def _artifact(document: Optional[StoredDocument], key: str) -> Dict[str, str]:
+    return dict(document.get_artifact(key) or {}) if document is not None else {}
+
+
+async def summarize_versioned(
+    document: StoredDocument,
+    previous: Optional[StoredDocument] = None,
+    summary_type: str = "general",
+    max_tokens: int = 1024,
+    max_concurrency: Optional[int] = None,
+) -> str:
+    """
+    Resumen de una versión de un documento reutilizando el trabajo de la anterior.
+    Los chunks se cortan por contenido, así que los que no cambiaron tienen el mismo
+    hash en ambas versiones: su resumen parcial se toma del documento anterior y solo
+    los chunks nuevos o modificados pasan por el map stage. El reduce reutiliza del
+    mismo modo las fusiones de grupos que no cambiaron y al final se vuelve a sintetizar.
+    Los parciales y fusiones de esta versión quedan guardados en `document` para la siguiente.
+    """
+    stats = current_context().stats
+    suffix = f"{OLLAMA_MODEL}:{summary_type}:{max_tokens}"
+    partials_key, merges_key = f"partials:{suffix}", f"merges:{suffix}"
+
+    chunks = _chunks(document)
+    hashes = [text_hash(chunk) for chunk in chunks]
+    known = {**_artifact(previous, partials_key), **_artifact(document, partials_key)}
+    pending = [i for i, h in enumerate(hashes) if h not in known]
+    stats.chunks += len(chunks)
+    stats.map_calls += len(pending)
+    stats.reused_chunks += len(chunks) - len(pending)
+
+    # tokens de salida según el tamaño de cada chunk, como en plan_summary
+    budget = plan_budget(summary_type, max_tokens, CHUNK_TOKENS) if len(chunks) > 1 else None
+    chunk_shares = shares([estimate_tokens(chunk) for chunk in chunks])
+    with span("map"):
+        results = await map_prompts(
+            [build_prompt(chunks[i], summary_type) for i in pending],
+            max_tokens=max_tokens,
+            max_concurrency=max_concurrency,
+            retry_delay=1,
+            token_limits=budget.for_shares([chunk_shares[i] for i in pending]) if budget else None,
+        )
+    known.update((hashes[i], result) for i, result in zip(pending, results))
+    partials = [known[h] for h in hashes]
+    document.set_artifact(partials_key, {h: known[h] for h in hashes})
+    if len(partials) == 1:
+        # un solo chunk: su resumen (mismo prompt que en plan_summary) es el final
+        return partials[0]
+
+    known_merges = {**_artifact(previous, merges_key), **_artifact(document, merges_key)}
+    merges: Dict[str, str] = {}
+    partials = await tree_reduce(
+        partials,
+        lambda group: build_synthesis_prompt(group, "general"),
+        max_tokens=max_tokens,
+        max_concurrency=max_concurrency,
+        retry_delay=1,
+        memo=known_merges,
+        memo_out=merges,
+        token_budget=budget,
+        partial_shares=chunk_shares,
+    )
+
+    # la síntesis final también se reutiliza si sus entradas no cambiaron
+    prompt = build_synthesis_prompt(partials, summary_type)
+    key = text_hash(prompt)
+    final = known_merges.get(key)
+    if final is None:
+        stats.reduce_calls += 1
+        stats.reduce_depth += 1
+        with span("synthesis"):
+            final = (await call_ollama_with_retry(prompt, max_tokens=max_tokens, retry_delay=1)).strip()
+    merges[key] = final
+    document.set_artifact(merges_key, merges)
+    return final
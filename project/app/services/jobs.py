@@ -0,0 +1,271 @@
+# app/services/jobs.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app.services.ai_client import (
+    call_ollama_with_retry,
+    final_prompt,
+    map_prompts,
+    map_token_limits,
+    plan_summary,
+    run_reduce_levels,
+)
+from app.services.extractor import extract_document
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.metrics import span
+from app.services.request_context import begin_request, end_request
+from app.utils.file_utils import DATA_DIR, remove_file_silently
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+JOBS_UPLOAD_DIR = os.getenv("JOBS_UPLOAD_DIR", os.path.join(DATA_DIR, "job_uploads"))
+# Jobs procesados a la vez (cada uno con su propio map stage en paralelo)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Espera máxima antes de reencolar un job que el scheduler rechazó por sobrecarga
+JOB_OVERLOAD_MAX_DELAY = float(os.getenv("JOB_OVERLOAD_MAX_DELAY", "60"))
+
+QUEUED, RUNNING, COMPLETED, FAILED = "queued", "running", "completed", "failed"
+
+
+class JobStore:
+    """
+    Estado de los jobs en SQLite: parámetros, texto extraído, resúmenes parciales
+    por chunk y resultado. Permite retomar un job en el chunk donde se quedó.
+    """
+
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                upload_path TEXT,
+                summary_type TEXT NOT NULL,
+                max_tokens INTEGER NOT NULL,
+                max_concurrency INTEGER,
+                text TEXT,
+                total_chunks INTEGER,
+                completed_chunks INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_partials (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+            """
+        )
+        self._db.commit()
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def create(self, filename: str, upload_path: Optional[str], summary_type: str, max_tokens: int,
+               max_concurrency: Optional[int], text: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, status, filename, upload_path, summary_type, max_tokens, max_concurrency, text, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, filename, upload_path, summary_type, max_tokens, max_concurrency, text, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def save_partial(self, job_id: str, index: int, content: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO job_partials (job_id, idx, content) VALUES (?, ?, ?)",
+                (job_id, index, content),
+            )
+            self._db.execute(
+                "UPDATE jobs SET completed_chunks = (SELECT COUNT(*) FROM job_partials WHERE job_id = ?) WHERE id = ?",
+                (job_id, job_id),
+            )
+            self._db.commit()
+
+    def partials(self, job_id: str) -> Dict[int, str]:
+        with self._lock:
+            rows = self._db.execute("SELECT idx, content FROM job_partials WHERE job_id = ?", (job_id,)).fetchall()
+        return {row["idx"]: row["content"] for row in rows}
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+
+class JobManager:
+    """
+    Cola de jobs de resumen procesada por un pool de workers asyncio.
+    Cada worker ejecuta extracción → chunking → map → reduce y guarda el progreso
+    por chunk, de modo que tras un reinicio el job continúa donde se quedó.
+    """
+
+    def __init__(self, store: Optional[JobStore] = None, workers: int = JOB_WORKERS):
+        self._store = store
+        self.workers = max(1, workers)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # reencolados pendientes de jobs rechazados por sobrecarga
+        self._retries: Dict[str, asyncio.TimerHandle] = {}
+        # métricas en memoria de la ejecución actual, para estimar el ETA
+        self._run_started: Dict[str, float] = {}
+        self._run_done: Dict[str, int] = {}
+
+    @property
+    def store(self) -> JobStore:
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        # retomar jobs que quedaron pendientes o a medias
+        for job_id in self.store.unfinished():
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, filename: str, upload_path: Optional[str], summary_type: str, max_tokens: int,
+               max_concurrency: Optional[int] = None, text: Optional[str] = None) -> str:
+        """
+        Encola un job a partir del archivo subido o, con `text`, del texto ya extraído.
+        """
+        if self._queue is None:
+            raise RuntimeError("JobManager is not started (call start() in the app lifespan)")
+        job_id = self.store.create(filename, upload_path, summary_type, max_tokens, max_concurrency, text)
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def _requeue(self, job_id: str):
+        self._retries.pop(job_id, None)
+        self._queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            token = begin_request(f"job-{job_id}")
+            try:
+                await self._run(job_id)
+            except LLMOverloadedError as e:
+                # el scheduler está saturado: el job vuelve a la cola pasado `retry_after`
+                # y continúa desde los chunks ya guardados
+                self.store.update(job_id, status=QUEUED)
+                delay = min(max(e.retry_after, 0), JOB_OVERLOAD_MAX_DELAY)
+                self._retries[job_id] = asyncio.get_running_loop().call_later(delay, self._requeue, job_id)
+            except Exception as e:
+                self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            finally:
+                end_request(token)
+                self._run_started.pop(job_id, None)
+                self._run_done.pop(job_id, None)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        if job is None or job["status"] in (COMPLETED, FAILED):
+            return
+        self.store.update(job_id, status=RUNNING, started_at=job["started_at"] or time.time())
+
+        text = job["text"]
+        if text is None:
+            ext = os.path.splitext(job["filename"])[1]
+            text = (await extract_document(job["upload_path"], ext)).text
+            if not text or text.strip() == "":
+                raise ValueError("No text could be extracted from the document")
+            self.store.update(job_id, text=text)
+            remove_file_silently(job["upload_path"])
+
+        plan = plan_summary(text, job["summary_type"])
+        prompts = plan.prompts
+        self.store.update(job_id, total_chunks=len(prompts))
+
+        done = self.store.partials(job_id)
+        pending = [i for i in range(len(prompts)) if i not in done]
+        self._run_started[job_id] = time.time()
+        self._run_done[job_id] = 0
+
+        def on_result(pos: int, content: str):
+            self.store.save_partial(job_id, pending[pos], content)
+            self._run_done[job_id] += 1
+
+        limits = map_token_limits(plan, job["max_tokens"])
+        with span("map"):
+            await map_prompts(
+                [prompts[i] for i in pending],
+                max_tokens=job["max_tokens"],
+                max_concurrency=job["max_concurrency"],
+                retry_delay=1,
+                on_result=on_result,
+                token_limits=[limits[i] for i in pending] if limits else None,
+            )
+
+        stored = self.store.partials(job_id)
+        partials = await run_reduce_levels(
+            plan,
+            [stored[i] for i in range(len(prompts))],
+            max_tokens=job["max_tokens"],
+            max_concurrency=job["max_concurrency"],
+            retry_delay=1,
+        )
+        prompt = final_prompt(plan, partials)
+        if prompt is None:
+            result = "\n\n".join(partials)
+        else:
+            with span("synthesis"):
+                result = (await call_ollama_with_retry(prompt, max_tokens=job["max_tokens"], retry_delay=1)).strip()
+        self.store.update(job_id, status=COMPLETED, result=result, finished_at=time.time())
+
+    def eta_seconds(self, job: dict) -> Optional[float]:
+        """
+        ETA a partir del ritmo de chunks de la ejecución actual (más la síntesis final).
+        """
+        if job["status"] != RUNNING or not job["total_chunks"]:
+            return None
+        done = self._run_done.get(job["id"], 0)
+        if not done:
+            return None
+        per_chunk = (time.time() - self._run_started[job["id"]]) / done
+        remaining = job["total_chunks"] - job["completed_chunks"]
+        return round(per_chunk * (remaining + 1), 1)
+
+
+# Gestor compartido por la app
+job_manager = JobManager()
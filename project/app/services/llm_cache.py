@@ -0,0 +1,238 @@
+# app/services/llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.utils.file_utils import DATA_DIR
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MEMORY_ITEMS = int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "512"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Los aciertos en memoria se anotan en SQLite (columna `accessed`) por lotes:
+# cuando hay tantos pendientes o cuando pasan estos segundos desde la última escritura
+LLM_CACHE_TOUCH_BATCH = int(os.getenv("LLM_CACHE_TOUCH_BATCH", "64"))
+LLM_CACHE_TOUCH_SECONDS = float(os.getenv("LLM_CACHE_TOUCH_SECONDS", "5"))
+
+# Entradas borradas por consulta en el desalojo LRU
+_EVICT_BATCH = 64
+
+
+def make_cache_key(model: str, messages: Any, options: Optional[Dict[str, Any]] = None, **extra) -> str:
+    """
+    Hash de contenido de una llamada al LLM: modelo, mensajes y opciones de generación.
+    """
+    payload = {"model": model, "messages": messages, "options": options or {}, **extra}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Caché de respuestas del LLM en dos niveles:
+    - memoria: LRU de `memory_items` entradas
+    - disco: SQLite con expiración por TTL y desalojo LRU cuando supera `max_bytes`
+
+    Los bytes en disco se llevan en un contador (se lee SUM(size) una vez al abrir la base),
+    así que una escritura solo recorre las entradas que desaloja.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = LLM_CACHE_PATH,
+        ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+        memory_items: int = LLM_CACHE_MEMORY_ITEMS,
+        max_bytes: int = LLM_CACHE_MAX_BYTES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._bytes = 0
+        # aciertos en memoria aún no anotados en disco: clave -> instante del acceso
+        self._touched: Dict[str, float] = {}
+        self._touched_flush = time.time()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not self.path:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache(created)")
+            self._db.commit()
+            self._bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        return self._db
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created > self.ttl_seconds
+
+    def _remember(self, key: str, value: str, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _touch_due(self, now: float) -> bool:
+        return bool(self._touched) and (
+            len(self._touched) >= LLM_CACHE_TOUCH_BATCH or now - self._touched_flush >= LLM_CACHE_TOUCH_SECONDS
+        )
+
+    def _flush_touched(self, db: sqlite3.Connection, now: float):
+        """
+        Anota en `accessed` los aciertos en memoria pendientes (sin commit).
+        """
+        if self._touched:
+            db.executemany(
+                "UPDATE llm_cache SET accessed = ? WHERE key = ?",
+                [(accessed, key) for key, accessed in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_flush = now
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit is not None:
+                value, created = hit
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    if self.path:
+                        self._touched[key] = now
+                        if self._touch_due(now):
+                            db = self._conn()
+                            self._flush_touched(db, now)
+                            db.commit()
+                    return value
+                del self._memory[key]
+
+            db = self._conn()
+            row = (
+                db.execute("SELECT value, created, size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if db else None
+            )
+            if row is None or self._expired(row[1], now):
+                if row is not None:
+                    db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    db.commit()
+                    self._bytes -= row[2]
+                    self._touched.pop(key, None)
+                self.counters["misses"] += 1
+                return None
+
+            self._touched[key] = now
+            self._flush_touched(db, now)
+            db.commit()
+            self._remember(key, row[0], row[1])
+            self.counters["disk_hits"] += 1
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self.counters["writes"] += 1
+            db = self._conn()
+            if db is None:
+                return
+            size = len(value.encode("utf-8"))
+            previous = db.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._bytes += size - (previous[0] if previous else 0)
+            self._touched.pop(key, None)
+            # el orden LRU en disco tiene que incluir los aciertos en memoria antes de desalojar
+            self._flush_touched(db, now)
+            self._evict(db, now)
+            db.commit()
+
+    def _evict(self, db: sqlite3.Connection, now: float):
+        if self.ttl_seconds > 0:
+            cutoff = now - self.ttl_seconds
+            count, size = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache WHERE created < ?", (cutoff,)
+            ).fetchone()
+            if count:
+                db.execute("DELETE FROM llm_cache WHERE created < ?", (cutoff,))
+                self._bytes -= size
+                self.counters["evictions"] += count
+        # desalojo LRU: las entradas menos usadas recientemente primero, por tandas
+        while self._bytes > self.max_bytes:
+            rows = db.execute(
+                "SELECT key, size FROM llm_cache ORDER BY accessed ASC LIMIT ?", (_EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            victims = []
+            for key, size in rows:
+                if self._bytes <= self.max_bytes:
+                    break
+                victims.append((key,))
+                self._memory.pop(key, None)
+                self._bytes -= size
+            db.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+            self.counters["evictions"] += len(victims)
+
+    async def aget(self, key: str) -> Optional[str]:
+        # el nivel de memoria responde sin salir del event loop
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            touch_due = self.path and self._touch_due(now)
+        # salvo si toca escribir en SQLite los accesos pendientes
+        if hit is not None and not self._expired(hit[1], now) and not touch_due:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str):
+        await asyncio.to_thread(self.set, key, value)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._touched.clear()
+            db = self._conn()
+            if db is not None:
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+                self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            db = self._conn()
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone() if db else (0, 0)
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": entries,
+                "disk_bytes": size,
+            }
+
+
+# Caché compartida por el proceso
+llm_cache = LLMCache()
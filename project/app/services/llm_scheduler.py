@@ -0,0 +1,170 @@
+# app/services/llm_scheduler.py
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from app.services.metrics import LLM_QUEUE_WAIT_SECONDS, registry
+from app.services.request_context import current_context
+
+# Generaciones simultáneas por modelo (alinear con OLLAMA_NUM_PARALLEL)
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "4"))
+# Llamadas en espera por modelo antes de rechazar con 429
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "256"))
+# Segundos máximos de espera en cola antes de rechazar con 503
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "120"))
+
+
+class LLMOverloadedError(Exception):
+    """
+    El scheduler no puede admitir la llamada. `status_code` es 429 (cola llena)
+    o 503 (timeout esperando turno); `retry_after` son segundos sugeridos.
+    """
+
+    def __init__(self, detail: str, status_code: int = 429, retry_after: int = 1):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class _ModelLane:
+    """
+    Estado de un modelo: generaciones en curso y colas de espera por request.
+    """
+
+    def __init__(self):
+        self.inflight = 0
+        self.queued = 0
+        # request_id -> cola FIFO de waiters; el orden del dict es el turno round-robin
+        self.waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        # media móvil de la duración de una generación (segundos)
+        self.avg_service = 5.0
+
+
+class LLMScheduler:
+    """
+    Limita las generaciones en curso por modelo y reparte los turnos libres
+    round-robin entre requests, para que un documento de cientos de chunks no
+    bloquee a una pregunta corta.
+    """
+
+    def __init__(
+        self,
+        max_inflight: int = LLM_MAX_INFLIGHT,
+        max_queue: int = LLM_MAX_QUEUE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.max_inflight = max(1, max_inflight)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lanes: Dict[str, _ModelLane] = {}
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _ModelLane()
+        return lane
+
+    def _retry_after(self, lane: _ModelLane) -> int:
+        return max(1, math.ceil(lane.avg_service * (lane.queued + 1) / self.max_inflight))
+
+    def _dispatch(self, lane: _ModelLane):
+        while lane.inflight < self.max_inflight and lane.waiting:
+            request_id, waiters = next(iter(lane.waiting.items()))
+            fut = waiters.popleft()
+            lane.queued -= 1
+            if waiters:
+                lane.waiting.move_to_end(request_id)
+            else:
+                del lane.waiting[request_id]
+            if fut.done():
+                continue
+            lane.inflight += 1
+            fut.set_result(None)
+
+    def _release(self, lane: _ModelLane):
+        lane.inflight -= 1
+        self._dispatch(lane)
+
+    def _remove_waiter(self, lane: _ModelLane, request_id: str, fut: asyncio.Future):
+        waiters = lane.waiting.get(request_id)
+        if waiters is None or fut not in waiters:
+            return
+        waiters.remove(fut)
+        lane.queued -= 1
+        if not waiters:
+            del lane.waiting[request_id]
+
+    async def acquire(self, model: str, request_id: str):
+        lane = self._lane(model)
+        if lane.inflight < self.max_inflight and lane.queued == 0:
+            lane.inflight += 1
+            return
+        if lane.queued >= self.max_queue:
+            raise LLMOverloadedError("LLM queue is full", 429, self._retry_after(lane))
+
+        fut = asyncio.get_running_loop().create_future()
+        lane.waiting.setdefault(request_id, deque()).append(fut)
+        lane.queued += 1
+        try:
+            await asyncio.wait_for(fut, timeout=self.queue_timeout)
+        except BaseException as exc:
+            if fut.done() and not fut.cancelled():
+                # el turno llegó justo al cancelar: se devuelve
+                self._release(lane)
+            else:
+                self._remove_waiter(lane, request_id, fut)
+            if isinstance(exc, asyncio.TimeoutError):
+                raise LLMOverloadedError(
+                    "Timed out waiting for an LLM slot", 503, self._retry_after(lane)
+                ) from None
+            raise
+
+    def release(self, model: str, elapsed: Optional[float] = None):
+        lane = self._lane(model)
+        if elapsed is not None:
+            lane.avg_service = 0.8 * lane.avg_service + 0.2 * elapsed
+        self._release(lane)
+
+    @asynccontextmanager
+    async def slot(self, model: str, request_id: Optional[str] = None):
+        """
+        Reserva un turno de generación para `model` mientras dure el bloque.
+        """
+        queued = time.perf_counter()
+        await self.acquire(model, request_id or current_context().request_id)
+        started = time.perf_counter()
+        LLM_QUEUE_WAIT_SECONDS.observe(started - queued, model=model)
+        current_context().add_timing("queue_wait", started - queued)
+        try:
+            yield
+        finally:
+            self.release(model, time.perf_counter() - started)
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            model: {
+                "inflight": lane.inflight,
+                "queued": lane.queued,
+                "requests_waiting": len(lane.waiting),
+                "avg_service_seconds": round(lane.avg_service, 3),
+            }
+            for model, lane in self._lanes.items()
+        }
+
+
+# Scheduler compartido por todo el proceso
+scheduler = LLMScheduler()
+
+registry.gauge(
+    "resumeai_llm_inflight", "Generaciones en curso por modelo", ["model"],
+    lambda: {(model, ): lane.inflight for model, lane in scheduler._lanes.items()},
+)
+registry.gauge(
+    "resumeai_llm_queued", "Llamadas esperando turno por modelo", ["model"],
+    lambda: {(model, ): lane.queued for model, lane in scheduler._lanes.items()},
+)
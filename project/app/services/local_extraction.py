@@ -0,0 +1,308 @@
+# app/services/local_extraction.py
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.services.ai_client import ChatPrompt
+from app.services.chunker import chunk_by_tokens
+
+# Palabras clave devueltas en modo fast y n-gramas máximos de los candidatos
+KEYWORDS_TOP_K = int(os.getenv("KEYWORDS_TOP_K", "20"))
+KEYWORDS_MAX_NGRAM = int(os.getenv("KEYWORDS_MAX_NGRAM", "3"))
+# Tamaño de los chunks sobre los que se mide la dispersión de cada candidato
+KEYWORDS_CHUNK_TOKENS = int(os.getenv("KEYWORDS_CHUNK_TOKENS", "400"))
+# Candidatos que el LLM re-ordena o etiqueta en modo hybrid (una sola llamada)
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "40"))
+# JSON opcional {"Organización": [...], "Lugar": [...], "Persona": [...]} que amplía el gazetteer
+ENTITY_GAZETTEER_PATH = os.getenv("ENTITY_GAZETTEER_PATH")
+
+EXTRACTION_MODES = ("fast", "hybrid", "llm")
+
+STOPWORDS_ES = frozenset("""
+a al algo algun alguna algunas alguno algunos ante antes aqui asi aun aunque bajo bien cada casi como con
+contra cual cuales cuando cuanto de del desde donde dos durante e el ella ellas ello ellos en entre era eran
+es esa esas ese eso esos esta estaba estado estan estar este esto estos fue fueron ha habia han hasta hay la
+las le les lo los mas me mi mientras mismo muy nada ni no nos nuestra nuestro o otra otras otro otros para
+pero poco por porque pues que quien quienes se sea segun ser si sido siempre sin sino sobre su sus tal
+tambien tan tanto te tiene tienen todo todos tras tu un una unas uno unos y ya yo puede pueden debe deben
+cuya cuyo dicha dicho cual sera seran seria hace hacer otro ademas
+""".split())
+
+STOPWORDS_EN = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers him his how i if in into is it its itself just me more most my no nor not now of off on
+once only or other our ours out over own same she should so some such than that the their theirs them then
+there these they this those through to too under until up very was we were what when where which while who
+whom why will with would you your yours may must shall
+""".split())
+
+STOPWORDS = STOPWORDS_ES | STOPWORDS_EN
+
+ENTITY_TYPES = ("Persona", "Organización", "Lugar", "Fecha")
+
+_MONTHS_ES = "enero|febrero|marzo|abril|mayo|junio|julio|agosto|septiembre|setiembre|octubre|noviembre|diciembre"
+_MONTHS_EN = "january|february|march|april|may|june|july|august|september|october|november|december"
+_DATE_RE = re.compile(
+    rf"\b\d{{1,2}} de (?:{_MONTHS_ES})(?: de(?:l)? \d{{4}})?\b"
+    rf"|\b(?:{_MONTHS_ES}) de \d{{4}}\b"
+    rf"|\b(?:{_MONTHS_EN}) \d{{1,2}}(?:st|nd|rd|th)?,? \d{{4}}\b"
+    rf"|\b\d{{1,2}} (?:{_MONTHS_EN}) \d{{4}}\b"
+    r"|\b\d{4}-\d{2}-\d{2}\b"
+    r"|\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}\b",
+    re.IGNORECASE,
+)
+_MONTH_WORDS = frozenset(f"{_MONTHS_ES}|{_MONTHS_EN}".split("|"))
+
+_CAP = r"[A-ZÁÉÍÓÚÑÜ][\w'’&.-]*"
+_SPAN_RE = re.compile(rf"{_CAP}(?:\s+(?:(?:de|del|la|las|los|y|of|the|for|and|&)\s+)?{_CAP})*")
+
+_TITLES = frozenset("sr sra srta dr dra don dona d dna mr mrs ms prof lic ing".split())
+_ORG_WORDS = frozenset("""
+banco universidad ministerio grupo fundacion asociacion instituto consejo comision agencia empresa
+compania sociedad tribunal gobierno ayuntamiento camara federacion partido hospital colegio
+bank university ministry group foundation association institute council commission agency company
+corporation court government department hospital college committee
+""".split())
+_ORG_SUFFIXES = frozenset("sa sl sau slu sas inc ltd llc corp co gmbh ag plc spa".split())
+_ACRONYM_RE = re.compile(r"^[A-ZÁÉÍÓÚÑ]{2,6}$")
+
+_PLACE_NAMES = frozenset(
+    {"espana", "mexico", "argentina", "colombia", "chile", "peru", "venezuela", "ecuador", "bolivia", "uruguay",
+     "paraguay", "cuba", "guatemala", "honduras", "panama", "francia", "alemania", "italia", "portugal",
+     "reino unido", "estados unidos", "china", "japon", "india", "brasil", "canada", "rusia", "europa", "america",
+     "africa", "asia", "madrid", "barcelona", "valencia", "sevilla", "bilbao", "malaga", "zaragoza", "lisboa",
+     "paris", "londres", "berlin", "roma", "bruselas", "nueva york", "washington", "buenos aires", "bogota",
+     "lima", "santiago", "caracas", "quito", "spain", "france", "germany", "italy", "united kingdom",
+     "united states", "japan", "brazil", "russia", "europe", "london", "new york", "rome", "brussels", "tokyo",
+     "beijing"}
+)
+_FIRST_NAMES = frozenset("""
+ana antonio carlos carmen david elena francisco isabel javier jorge jose juan laura lucia luis manuel
+maria marta miguel pablo pedro rafael sara sergio alejandro andrea daniel diego fernando gabriel
+james john robert michael william mary patricia jennifer linda elizabeth susan thomas george emma
+""".split())
+
+
+def _fold(text: str) -> str:
+    """
+    Minúsculas, sin acentos y sin puntuación (clave de comparación).
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"[^\w\s]+", "", text).strip()
+
+
+@lru_cache(maxsize=1)
+def _custom_gazetteer() -> Dict[str, str]:
+    if not ENTITY_GAZETTEER_PATH:
+        return {}
+    try:
+        with open(ENTITY_GAZETTEER_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {_fold(name): entity_type for entity_type, names in data.items() for name in names}
+
+
+# ---------------------------------------------------------------------------
+# Palabras clave
+# ---------------------------------------------------------------------------
+
+_WORD_RE = re.compile(r"\w+(?:[-'’]\w+)*")
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+_PHRASE_BREAK_RE = re.compile(r"[,;:()\[\]\"“”«»]")
+# palabras que no pueden empezar ni terminar un candidato
+_SKIP = STOPWORDS | _TITLES
+
+
+def rank_keywords(text: str, limit: int = KEYWORDS_TOP_K, max_ngram: int = KEYWORDS_MAX_NGRAM) -> List[dict]:
+    """
+    Palabras clave sin LLM (estilo YAKE): candidatos de 1 a `max_ngram` palabras que no
+    empiezan ni terminan en stopword (español e inglés), puntuados con arrays NumPy por
+    frecuencia, dispersión entre chunks, posición de la primera aparición y uso en mayúsculas.
+    Devuelve [{"keyword", "score"}] de más a menos relevante.
+    """
+    ids: Dict[str, int] = {}
+    surfaces: List[Counter] = []
+    n_words: List[int] = []
+    occ_cand, occ_chunk, occ_sent, occ_caps = [], [], [], []
+    sentence_index = 0
+    chunks = chunk_by_tokens(text, KEYWORDS_CHUNK_TOKENS) if text.strip() else []
+    for chunk_index, chunk in enumerate(chunks):
+        for sentence in _SENTENCE_BREAK_RE.split(chunk):
+            for phrase in _PHRASE_BREAK_RE.split(sentence):
+                words = _WORD_RE.findall(phrase)
+                folded = [_fold(w) for w in words]
+                for i in range(len(words)):
+                    if folded[i] in _SKIP or folded[i].isdigit() or len(folded[i]) < 2:
+                        continue
+                    for n in range(1, max_ngram + 1):
+                        j = i + n
+                        if j > len(words):
+                            break
+                        last = folded[j - 1]
+                        if last in _SKIP or last.isdigit() or len(last) < 2:
+                            continue
+                        key = " ".join(folded[i:j])
+                        cand = ids.get(key)
+                        if cand is None:
+                            cand = ids[key] = len(ids)
+                            surfaces.append(Counter())
+                            n_words.append(n)
+                        surface = " ".join(words[i:j])
+                        surfaces[cand][surface] += 1
+                        occ_cand.append(cand)
+                        occ_chunk.append(chunk_index)
+                        occ_sent.append(sentence_index)
+                        # nombres propios y siglas: en mayúscula fuera del inicio de la oración
+                        occ_caps.append(i > 0 and all(
+                            w[0].isupper() for w, f in zip(words[i:j], folded[i:j]) if f not in STOPWORDS
+                        ))
+            sentence_index += 1
+    if not ids:
+        return []
+
+    n_cands, n_chunks = len(ids), len(chunks)
+    cand = np.array(occ_cand, dtype=np.int64)
+    tf = np.bincount(cand, minlength=n_cands).astype(np.float64)
+    caps = np.bincount(cand, weights=np.array(occ_caps, dtype=np.float64), minlength=n_cands) / tf
+    pairs = np.unique(cand * n_chunks + np.array(occ_chunk, dtype=np.int64))
+    spread = np.bincount(pairs // n_chunks, minlength=n_cands) / n_chunks
+    first = np.full(n_cands, np.inf)
+    np.minimum.at(first, cand, np.array(occ_sent, dtype=np.float64))
+    length = np.array(n_words, dtype=np.float64)
+
+    scores = (
+        (1.0 + np.log(tf))
+        * (0.5 + spread)
+        * (1.0 + 1.0 / (1.0 + np.log1p(first)))
+        * (1.0 + caps)
+        * np.sqrt(length)
+    )
+    # las frases de varias palabras que aparecen una sola vez no son candidatas
+    scores[(length > 1) & (tf < 2)] = 0.0
+
+    keys = list(ids)
+    selected: List[dict] = []
+    chosen: List[str] = []
+    for cand_id in np.argsort(-scores, kind="stable"):
+        if scores[cand_id] <= 0 or len(selected) >= limit:
+            break
+        key = keys[cand_id]
+        # "contrato" no se repite si ya está "contrato de suministro"
+        if any(f" {key} " in f" {other} " for other in chosen):
+            continue
+        surface, _ = surfaces[cand_id].most_common(1)[0]
+        keyword = surface if caps[cand_id] >= 0.5 else surface.lower()
+        chosen.append(key)
+        selected.append({"keyword": keyword, "score": round(float(scores[cand_id]), 4)})
+    return selected
+
+
+def keywords_rerank_prompt(text: str, candidates: List[dict], budget_tokens: int = 500) -> str:
+    """
+    Prompt único del modo hybrid: el LLM solo re-ordena los candidatos locales.
+    """
+    excerpt = chunk_by_tokens(text[:int(budget_tokens * 8)], budget_tokens)[0] if text.strip() else ""
+    listed = "\n".join(f"- {c['keyword']}" for c in candidates)
+    return ChatPrompt(
+        "Estas son palabras clave candidatas extraídas automáticamente de un texto. "
+        "Selecciona las más relevantes, elimina las genéricas o redundantes y ordénalas por relevancia. "
+        "Usa solo términos de la lista. "
+        "Devuelve el resultado en formato Markdown, como una lista de bullets (una palabra o frase por bullet).",
+        f"Candidatas:\n{listed}\n\nInicio del texto:\n{excerpt}\n\nPalabras clave:",
+    )
+
+
+# ---------------------------------------------------------------------------
+# Entidades
+# ---------------------------------------------------------------------------
+
+def _classify(tokens: List[str], folded: List[str]) -> Optional[str]:
+    name = " ".join(folded)
+    custom = _custom_gazetteer().get(name)
+    if custom:
+        return custom
+    if name in _PLACE_NAMES:
+        return "Lugar"
+    if folded[0] in _ORG_WORDS or folded[-1] in _ORG_SUFFIXES or (len(tokens) == 1 and _ACRONYM_RE.match(tokens[0])):
+        return "Organización"
+    if 2 <= len(tokens) <= 4 and folded[0] in _FIRST_NAMES:
+        return "Persona"
+    return None
+
+
+def find_entities(text: str, include_unlabeled: bool = False) -> List[dict]:
+    """
+    Entidades sin LLM: fechas por expresiones regulares y secuencias de palabras en
+    mayúscula clasificadas con reglas (títulos como "Dr.", sufijos "S.A.", "Inc.",
+    palabras como "Banco", siglas) y un gazetteer de lugares y nombres de pila
+    (ampliable con ENTITY_GAZETTEER_PATH).
+    Con `include_unlabeled` se devuelven también las secuencias repetidas sin tipo ("Otro"),
+    candidatas a que el LLM las etiquete en modo hybrid.
+    Devuelve [{"name", "type", "count"}] en orden de primera aparición.
+    """
+    found: "OrderedDict[str, dict]" = OrderedDict()
+
+    def add(name: str, entity_type: str):
+        entry = found.setdefault(_fold(name), {"name": name, "type": entity_type, "count": 0})
+        entry["count"] += 1
+
+    for match in _DATE_RE.finditer(text):
+        add(match.group(0), "Fecha")
+
+    for match in _SPAN_RE.finditer(text):
+        tokens = match.group(0).split()
+        folded = [_fold(t) for t in tokens]
+        person = False
+        # "El Banco de España" al inicio de la oración
+        while tokens and (folded[0] in STOPWORDS or folded[0] in _MONTH_WORDS):
+            tokens, folded = tokens[1:], folded[1:]
+        # "Dr. Juan Pérez", "Sra. Gómez": el título indica persona y no forma parte del nombre
+        while tokens and folded[0] in _TITLES:
+            tokens, folded, person = tokens[1:], folded[1:], True
+        while tokens and folded[-1] in STOPWORDS:
+            tokens, folded = tokens[:-1], folded[:-1]
+        if not tokens or not any(folded):
+            continue
+        entity_type = "Persona" if person else _classify(tokens, folded)
+        name = " ".join(tokens).rstrip(".,") if entity_type != "Organización" else " ".join(tokens)
+        add(name, entity_type or "Otro")
+
+    return [
+        entity for entity in found.values()
+        if entity["type"] != "Otro" or (include_unlabeled and entity["count"] >= 2)
+    ]
+
+
+def entities_label_prompt(candidates: List[dict]) -> str:
+    """
+    Prompt único del modo hybrid: el LLM corrige tipos, etiqueta los "Otro" y descarta
+    los candidatos que no son entidades.
+    """
+    listed = "\n".join(f"- {c['name']} ({c['type']}, {c['count']} apariciones)" for c in candidates)
+    types = ", ".join(ENTITY_TYPES)
+    return ChatPrompt(
+        "Estas son entidades candidatas extraídas automáticamente de un texto, con un tipo provisional. "
+        f"Corrige el tipo ({types}), asigna tipo a las marcadas como 'Otro' y descarta las que no sean "
+        "entidades nombradas. "
+        "Devuelve el resultado en formato Markdown con bullets ' - Nombre (Tipo)', organizado por tipo.",
+        f"Candidatas:\n{listed}\n\nEntidades:",
+    )
+
+
+def top_entities(entities: List[dict], limit: int) -> List[dict]:
+    """
+    Las `limit` entidades más frecuentes, en orden de primera aparición.
+    """
+    if len(entities) <= limit:
+        return entities
+    keep = sorted(range(len(entities)), key=lambda i: (-entities[i]["count"], i))[:limit]
+    return [entities[i] for i in sorted(keep)]
@@ -0,0 +1,265 @@
+# app/services/metrics.py
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services.request_context import current_context
+
+# Buckets por defecto (segundos): de milisegundos a varios minutos de generación
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Valor instantáneo leído al exportar (`fn` devuelve {etiquetas: valor}).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str],
+                 fn: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, help_text, labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}"
+            for key, v in sorted(self.fn().items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # etiquetas -> (conteos por bucket, suma, total)
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._values.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas del proceso, exportado en formato de texto de Prometheus.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(self, name: str, help_text: str, labelnames: Iterable[str],
+              fn: Callable[[], Dict[Tuple[str, ...], float]]) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "resumeai_stage_seconds", "Duración de cada etapa del pipeline", ["stage"]
+)
+LLM_CALL_SECONDS = registry.histogram(
+    "resumeai_llm_call_seconds", "Duración de cada llamada a Ollama (incluida la espera de turno)", ["model", "mode"]
+)
+LLM_QUEUE_WAIT_SECONDS = registry.histogram(
+    "resumeai_llm_queue_wait_seconds", "Espera en el scheduler antes de cada generación", ["model"]
+)
+LLM_CALLS = registry.counter(
+    "resumeai_llm_calls_total", "Llamadas al LLM por resultado", ["model", "result"]
+)
+LLM_CACHE_LOOKUPS = registry.counter(
+    "resumeai_llm_cache_lookups_total", "Consultas a la caché de respuestas del LLM", ["result"]
+)
+LLM_TOKENS = registry.counter(
+    "resumeai_llm_tokens_total", "Tokens procesados por Ollama (prompt_eval_count / eval_count)", ["model", "kind"]
+)
+LLM_TOKENS_PER_SECOND = registry.histogram(
+    "resumeai_llm_tokens_per_second", "Velocidad de generación (eval_count / eval_duration)", ["model"],
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500),
+)
+LLM_LOAD_SECONDS = registry.histogram(
+    "resumeai_llm_load_seconds", "Tiempo de carga del modelo informado por Ollama (load_duration)", ["model"]
+)
+LLM_PROMPT_EVAL_SECONDS = registry.histogram(
+    "resumeai_llm_prompt_eval_seconds", "Tiempo de procesado del prompt (prompt_eval_duration)", ["model"]
+)
+LLM_CALLS_PER_REQUEST = registry.histogram(
+    "resumeai_llm_calls_per_request", "Llamadas al LLM por request HTTP", ["path"],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+LLM_BUDGET_USE = registry.histogram(
+    "resumeai_llm_budget_use_ratio", "Tokens generados sobre el num_predict de la llamada (1 = recortada)", ["model"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 0.9, 0.99, 1),
+)
+REQUESTS_CANCELLED = registry.counter(
+    "resumeai_requests_cancelled_total", "Requests cuyo trabajo con el LLM se interrumpió", ["reason"]
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "resumeai_http_request_seconds", "Duración de los requests HTTP", ["method", "path", "status"]
+)
+
+
+def record_timing(stage: str, seconds: float):
+    """
+    Registra `seconds` en el histograma de la etapa y en el desglose del request actual.
+    """
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    current_context().add_timing(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Mide la duración del bloque como etapa `stage` del pipeline.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(stage, time.perf_counter() - started)
+
+
+def response_field(response, name: str) -> Optional[float]:
+    try:
+        value = response.get(name) if hasattr(response, "get") else getattr(response, name, None)
+    except Exception:
+        return None
+    return value if isinstance(value, (int, float)) else None
+
+
+def record_ollama_response(model: str, response, max_tokens: Optional[int] = None):
+    """
+    Métricas que Ollama devuelve en la respuesta final: tokens, velocidad y tiempos de carga.
+    Con `max_tokens` (num_predict de la llamada) se registra también qué parte del
+    presupuesto se usó y si la respuesta se cortó por alcanzarlo.
+    """
+    prompt_tokens = response_field(response, "prompt_eval_count")
+    eval_tokens = response_field(response, "eval_count")
+    eval_ns = response_field(response, "eval_duration")
+    load_ns = response_field(response, "load_duration")
+    prompt_ns = response_field(response, "prompt_eval_duration")
+    ctx = current_context()
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        ctx.stats.prompt_tokens += int(prompt_tokens)
+    if eval_tokens:
+        LLM_TOKENS.inc(eval_tokens, model=model, kind="completion")
+        ctx.stats.completion_tokens += int(eval_tokens)
+        if eval_ns:
+            LLM_TOKENS_PER_SECOND.observe(eval_tokens / (eval_ns / 1e9), model=model)
+        if max_tokens:
+            LLM_BUDGET_USE.observe(min(1.0, eval_tokens / max_tokens), model=model)
+            if eval_tokens >= max_tokens:
+                ctx.stats.truncated_calls += 1
+    if load_ns is not None:
+        LLM_LOAD_SECONDS.observe(load_ns / 1e9, model=model)
+        ctx.stats.load_ms += int(load_ns / 1e6)
+    if prompt_ns is not None:
+        LLM_PROMPT_EVAL_SECONDS.observe(prompt_ns / 1e9, model=model)
+        ctx.stats.prompt_eval_ms += int(prompt_ns / 1e6)
@@ -0,0 +1,261 @@
+# app/services/multi_analysis.py
+import asyncio
+import json
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.services.ai_client import (
+    ChatPrompt,
+    DeadlineExceededError,
+    build_synthesis_prompt,
+    call_ollama_with_retry,
+    chunk_text,
+    finished,
+    fit_budget,
+    map_prompts,
+    stage_deadline,
+    tree_reduce,
+    with_deadline,
+)
+from app.services.metrics import span
+from app.services.request_context import current_context
+
+ANALYSES = ("summary", "keywords", "entities", "topics")
+
+MAX_KEYWORDS = 30
+MAX_TOPICS = 8
+MAX_TOPIC_POINTS = 3
+
+_SUMMARY_STYLES = {
+    "general": "resumen profesional en párrafos bien organizados, con los puntos clave y datos importantes",
+    "bullets": "lista Markdown de 5 a 8 bullets con el formato '- **Concepto**: descripción'",
+    "tldr": "exactamente dos oraciones: el punto principal y la conclusión o acción clave",
+    "business": "resumen ejecutivo: contexto, hallazgos clave, implicaciones de negocio y acciones recomendadas",
+    "academic": "resumen académico: contexto, metodología, hallazgos principales y conclusiones",
+}
+
+_FIELD_SPECS = {
+    "summary": '"summary": string Markdown con un {style}',
+    "keywords": '"keywords": lista de hasta 15 palabras clave o frases cortas (strings), de más a menos relevante',
+    "entities": '"entities": lista de objetos {{"name": string, "type": "Persona" | "Organización" | "Lugar" | "Fecha"}}',
+    "topics": '"topics": lista de hasta 6 objetos {{"topic": string, "points": lista de 2-3 frases de apoyo}}',
+}
+
+
+def normalize_analyses(requested: Optional[List[str]]) -> List[str]:
+    """
+    Lista de análisis pedidos (acepta valores repetidos o separados por comas).
+    """
+    if not requested:
+        return list(ANALYSES)
+    names = []
+    for item in requested:
+        for name in item.split(","):
+            name = name.strip().lower()
+            if name and name not in names:
+                names.append(name)
+    unknown = [n for n in names if n not in ANALYSES]
+    if unknown:
+        raise ValueError(f"Unknown analyses: {', '.join(unknown)}")
+    return names
+
+
+def build_multi_prompt(chunk: str, analyses: List[str], summary_type: str = "general") -> str:
+    """
+    Un único prompt por chunk que pide todos los análisis como un objeto JSON.
+    """
+    style = _SUMMARY_STYLES.get(summary_type, _SUMMARY_STYLES["general"])
+    fields = "\n".join(f"- {_FIELD_SPECS[name].format(style=style)}" for name in analyses)
+    return ChatPrompt(
+        "Analiza el siguiente texto y devuelve ÚNICAMENTE un objeto JSON válido, sin texto adicional, "
+        f"con estas claves:\n{fields}",
+        f"Texto:\n{chunk}\n\nJSON:",
+    )
+
+
+def parse_multi_response(raw: str, analyses: List[str]) -> Dict[str, Any]:
+    """
+    Interpreta la respuesta JSON de un chunk. Si no es JSON válido, el texto completo
+    se usa como resumen y el resto de campos quedan vacíos.
+    """
+    data: Any = None
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        start, end = raw.find("{"), raw.rfind("}")
+        if start != -1 and end > start:
+            try:
+                data = json.loads(raw[start:end + 1])
+            except ValueError:
+                data = None
+    if not isinstance(data, dict):
+        data = {"summary": raw.strip()}
+
+    parsed: Dict[str, Any] = {}
+    if "summary" in analyses:
+        summary = data.get("summary", "")
+        parsed["summary"] = summary.strip() if isinstance(summary, str) else json.dumps(summary, ensure_ascii=False)
+    if "keywords" in analyses:
+        parsed["keywords"] = [str(k).strip() for k in _as_list(data.get("keywords")) if str(k).strip()]
+    if "entities" in analyses:
+        entities = []
+        for item in _as_list(data.get("entities")):
+            if isinstance(item, dict) and str(item.get("name", "")).strip():
+                entities.append({"name": str(item["name"]).strip(), "type": str(item.get("type") or "Otro").strip()})
+            elif isinstance(item, str) and item.strip():
+                entities.append({"name": item.strip(), "type": "Otro"})
+        parsed["entities"] = entities
+    if "topics" in analyses:
+        topics = []
+        for item in _as_list(data.get("topics")):
+            if isinstance(item, dict) and str(item.get("topic", "")).strip():
+                points = [str(p).strip() for p in _as_list(item.get("points")) if str(p).strip()]
+                topics.append({"topic": str(item["topic"]).strip(), "points": points})
+            elif isinstance(item, str) and item.strip():
+                topics.append({"topic": item.strip(), "points": []})
+        parsed["topics"] = topics
+    return parsed
+
+
+def _as_list(value) -> list:
+    return value if isinstance(value, list) else []
+
+
+def _key(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r"\W+", " ", text).strip()
+
+
+def merge_keywords(partials: List[List[str]], limit: int = MAX_KEYWORDS) -> List[str]:
+    """
+    Fusiona las listas de los chunks: deduplica (sin mayúsculas ni acentos) y ordena por
+    número de chunks en que aparece y, a igualdad, por posición.
+    """
+    scores: "OrderedDict[str, list]" = OrderedDict()
+    for keywords in partials:
+        for rank, keyword in enumerate(keywords):
+            key = _key(keyword)
+            if not key:
+                continue
+            entry = scores.setdefault(key, [keyword, 0, 0.0])
+            entry[1] += 1
+            entry[2] += rank
+    ordered = sorted(scores.values(), key=lambda e: (-e[1], e[2] / e[1]))
+    return [e[0] for e in ordered[:limit]]
+
+
+def merge_entities(partials: List[List[dict]]) -> Dict[str, List[str]]:
+    """
+    Entidades deduplicadas y agrupadas por tipo, en orden de aparición.
+    """
+    grouped: "OrderedDict[str, OrderedDict[str, str]]" = OrderedDict()
+    for entities in partials:
+        for entity in entities:
+            names = grouped.setdefault(entity["type"], OrderedDict())
+            names.setdefault(_key(entity["name"]), entity["name"])
+    return {entity_type: list(names.values()) for entity_type, names in grouped.items()}
+
+
+def merge_topics(partials: List[List[dict]], limit: int = MAX_TOPICS) -> List[dict]:
+    """
+    Temas fusionados por nombre: los que aparecen en más chunks primero, con los puntos
+    de apoyo sin repetir.
+    """
+    merged: "OrderedDict[str, dict]" = OrderedDict()
+    for topics in partials:
+        for topic in topics:
+            entry = merged.setdefault(_key(topic["topic"]), {"topic": topic["topic"], "points": [], "count": 0})
+            entry["count"] += 1
+            seen = {_key(p) for p in entry["points"]}
+            for point in topic["points"]:
+                if len(entry["points"]) < MAX_TOPIC_POINTS and _key(point) not in seen:
+                    entry["points"].append(point)
+                    seen.add(_key(point))
+    ordered = sorted(merged.values(), key=lambda t: -t["count"])
+    return [{"topic": t["topic"], "points": t["points"]} for t in ordered[:limit]]
+
+
+def render_markdown(name: str, value: Any) -> str:
+    if name == "summary":
+        return value
+    if name == "keywords":
+        return "\n".join(f"- {k}" for k in value)
+    if name == "entities":
+        return "\n\n".join(
+            f"### {entity_type}\n" + "\n".join(f"- {n}" for n in names) for entity_type, names in value.items()
+        )
+    if name == "topics":
+        return "\n\n".join(
+            f"### {t['topic']}\n" + "\n".join(f"- {p}" for p in t["points"]) for t in value
+        ).strip()
+    raise ValueError(name)
+
+
+async def run_multi_analysis(
+    text: str,
+    analyses: List[str],
+    summary_type: str = "general",
+    max_tokens: int = 1024,
+    max_concurrency: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Todos los análisis pedidos en una sola pasada: el texto se trocea una vez y cada
+    chunk recibe un único prompt JSON con todos los campos. Palabras clave, entidades
+    y temas se fusionan localmente; solo el resumen necesita reduce y síntesis con el LLM.
+    Devuelve {"data": {análisis: valor estructurado}, "results": {análisis: Markdown}}.
+    """
+    stats = current_context().stats
+    chunks = chunk_text(text)
+    prompts = [build_multi_prompt(chunk, analyses, summary_type) for chunk in chunks]
+    stats.chunks += len(chunks)
+    stats.map_calls += len(prompts)
+    with span("map"):
+        raw = finished(await map_prompts(
+            prompts, max_tokens=max_tokens, max_concurrency=max_concurrency, retry_delay=1, response_format="json",
+            deadline=stage_deadline(),
+        ))
+    if not raw:
+        raise DeadlineExceededError()
+    partials = [parse_multi_response(r, analyses) for r in raw]
+
+    data: Dict[str, Any] = {}
+    if "summary" in analyses:
+        summaries = [p["summary"] for p in partials if p["summary"]]
+        if len(summaries) <= 1:
+            data["summary"] = summaries[0] if summaries else ""
+        else:
+            summaries = await tree_reduce(
+                summaries,
+                lambda group: build_synthesis_prompt(group, "general"),
+                max_tokens=max_tokens,
+                max_concurrency=max_concurrency,
+                retry_delay=1,
+            )
+            if current_context().partial:
+                summaries = fit_budget(summaries)
+            stats.reduce_calls += 1
+            stats.reduce_depth += 1
+            with span("synthesis"):
+                try:
+                    final = await with_deadline(call_ollama_with_retry(
+                        build_synthesis_prompt(summaries, summary_type), max_tokens=max_tokens, retry_delay=1
+                    ))
+                except asyncio.TimeoutError:
+                    # sin tiempo para la síntesis: los resúmenes parciales terminados
+                    current_context().partial = True
+                    final = "\n\n".join(summaries)
+            data["summary"] = final.strip()
+    if "keywords" in analyses:
+        data["keywords"] = merge_keywords([p["keywords"] for p in partials])
+    if "entities" in analyses:
+        data["entities"] = merge_entities([p["entities"] for p in partials])
+    if "topics" in analyses:
+        data["topics"] = merge_topics([p["topics"] for p in partials])
+
+    return {
+        "data": data,
+        "results": {name: render_markdown(name, data[name]) for name in analyses},
+    }
@@ -0,0 +1,335 @@
+# app/services/ollama_pool.py
+import asyncio
+import itertools
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Deque, Iterable, List, Optional
+
+import httpx
+import ollama
+
+from app.services.llm_scheduler import LLM_MAX_INFLIGHT
+from app.services.metrics import registry
+
+# Hosts de Ollama separados por comas (por defecto, solo OLLAMA_BASE_URL)
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", OLLAMA_BASE_URL).split(",") if h.strip()]
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+# Health checks periódicos (GET /api/tags) y fallos seguidos para sacar un host de rotación
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "3"))
+OLLAMA_FAIL_THRESHOLD = int(os.getenv("OLLAMA_FAIL_THRESHOLD", "3"))
+# Hedging: si una llamada tarda más que este percentil de las latencias recientes,
+# se lanza una copia en otro host y gana la primera en terminar (0 = desactivado)
+OLLAMA_HEDGE_PERCENTILE = float(os.getenv("OLLAMA_HEDGE_PERCENTILE", "0"))
+OLLAMA_HEDGE_MIN_SAMPLES = int(os.getenv("OLLAMA_HEDGE_MIN_SAMPLES", "20"))
+
+_LATENCY_WINDOW = 200
+_EWMA_ALPHA = 0.2
+
+
+def default_client_factory(host: str) -> ollama.AsyncClient:
+    return ollama.AsyncClient(
+        host=host,
+        timeout=OLLAMA_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_INFLIGHT * 2,
+            max_keepalive_connections=LLM_MAX_INFLIGHT,
+        ),
+    )
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """
+    Errores atribuibles al host (caído, timeout, 5xx); los 4xx son errores de la petición.
+    """
+    if isinstance(exc, ollama.ResponseError):
+        return exc.status_code < 0 or exc.status_code >= 500
+    return isinstance(exc, (ConnectionError, httpx.TransportError))
+
+
+class Backend:
+    """
+    Un host de Ollama: cliente con pool de conexiones, llamadas en curso,
+    latencia reciente y estado de salud.
+    """
+
+    def __init__(self, url: str, client_factory: Callable[[str], ollama.AsyncClient]):
+        self.url = url
+        self._client_factory = client_factory
+        self._client: Optional[ollama.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.inflight = 0
+        self.latency: Optional[float] = None  # media móvil (segundos)
+        self.healthy = True
+        self.failures = 0  # fallos consecutivos
+        self.last_error: Optional[str] = None
+        self.calls = 0
+        # time.time() de la última llamada terminada (para no hacer ping a hosts activos)
+        self.last_used = 0.0
+
+    def client(self) -> ollama.AsyncClient:
+        # se recrea si cambia el event loop (p. ej. entre ejecuciones de asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = self._client_factory(self.url)
+            self._client_loop = loop
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+    def load(self) -> float:
+        """
+        Coste estimado de enviarle una llamada más: en curso × latencia reciente.
+        """
+        return (self.inflight + 1) * (self.latency or 1.0)
+
+    def record_success(self, seconds: float):
+        self.latency = seconds if self.latency is None else (1 - _EWMA_ALPHA) * self.latency + _EWMA_ALPHA * seconds
+        self.failures = 0
+        self.healthy = True
+
+    def record_failure(self, exc: BaseException, threshold: int):
+        self.failures += 1
+        self.last_error = str(exc)
+        if self.failures >= threshold:
+            self.healthy = False
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "inflight": self.inflight,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "failures": self.failures,
+            "calls": self.calls,
+            "last_error": self.last_error,
+        }
+
+
+class BackendPool:
+    """
+    Reparte las llamadas a Ollama entre varios hosts: cada llamada va al host sano
+    menos cargado, un host que falla se reintenta en otro y sale de rotación tras
+    `fail_threshold` fallos seguidos hasta que el health check lo recupera.
+    Con `hedge_percentile` las llamadas lentas se duplican en un segundo host.
+    """
+
+    def __init__(
+        self,
+        hosts: Iterable[str] = OLLAMA_HOSTS,
+        client_factory: Callable[[str], ollama.AsyncClient] = default_client_factory,
+        fail_threshold: int = OLLAMA_FAIL_THRESHOLD,
+        health_interval: float = OLLAMA_HEALTH_INTERVAL,
+        health_timeout: float = OLLAMA_HEALTH_TIMEOUT,
+        hedge_percentile: float = OLLAMA_HEDGE_PERCENTILE,
+        hedge_min_samples: int = OLLAMA_HEDGE_MIN_SAMPLES,
+    ):
+        self.backends = [Backend(url, client_factory) for url in hosts]
+        if not self.backends:
+            raise ValueError("At least one Ollama host is required")
+        self.fail_threshold = max(1, fail_threshold)
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._rotation = itertools.count()
+        self._health_task: Optional[asyncio.Task] = None
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # --- selección de host ---
+
+    def pick(self, exclude: Iterable[Backend] = ()) -> Optional[Backend]:
+        """
+        Host sano con menor carga estimada; si no queda ninguno sano se prueba igualmente
+        con el que menos fallos lleva. Los empates se reparten en rotación.
+        """
+        excluded = set(map(id, exclude))
+        candidates = [b for b in self.backends if id(b) not in excluded]
+        if not candidates:
+            return None
+        healthy = [b for b in candidates if b.healthy]
+        if not healthy:
+            return min(candidates, key=lambda b: b.failures)
+        offset = next(self._rotation)
+        n = len(healthy)
+        return min((healthy[(offset + i) % n] for i in range(n)), key=Backend.load)
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.backends) < 2 or len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))]
+
+    # --- llamadas ---
+
+    async def _call(self, backend: Backend, kwargs: dict):
+        backend.inflight += 1
+        backend.calls += 1
+        started = time.perf_counter()
+        try:
+            response = await backend.client().chat(**kwargs)
+        except Exception as e:
+            if is_backend_failure(e):
+                backend.record_failure(e, self.fail_threshold)
+            raise
+        finally:
+            backend.inflight -= 1
+            backend.last_used = time.time()
+        elapsed = time.perf_counter() - started
+        backend.record_success(elapsed)
+        self._latencies.append(elapsed)
+        return response
+
+    async def _hedged_call(self, backend: Backend, kwargs: dict):
+        delay = self.hedge_delay()
+        if delay is None:
+            return await self._call(backend, kwargs)
+        first = asyncio.ensure_future(self._call(backend, kwargs))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            second_backend = None if done else self.pick(exclude=[backend])
+            if second_backend is None:
+                return await first
+            self.hedges += 1
+            second = asyncio.ensure_future(self._call(second_backend, kwargs))
+            tasks.add(second)
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def chat(self, **kwargs):
+        """
+        `AsyncClient.chat` en el host menos cargado, con failover a otro host si falla.
+        """
+        tried: List[Backend] = []
+        last_error: Optional[BaseException] = None
+        while True:
+            backend = self.pick(exclude=tried)
+            if backend is None:
+                raise last_error
+            try:
+                return await self._hedged_call(backend, kwargs)
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                tried.append(backend)
+                last_error = e
+                if len(tried) < len(self.backends):
+                    self.failovers += 1
+
+    async def chat_stream(self, **kwargs) -> AsyncIterator[dict]:
+        """
+        `AsyncClient.chat(stream=True)`: el failover solo es posible antes del primer fragmento.
+        """
+        tried: List[Backend] = []
+        last_error: Optional[BaseException] = None
+        while True:
+            backend = self.pick(exclude=tried)
+            if backend is None:
+                raise last_error
+            backend.inflight += 1
+            backend.calls += 1
+            started = time.perf_counter()
+            emitted = False
+            try:
+                stream = await backend.client().chat(stream=True, **kwargs)
+                async for part in stream:
+                    emitted = True
+                    yield part
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                backend.record_failure(e, self.fail_threshold)
+                if emitted:
+                    raise
+                tried.append(backend)
+                last_error = e
+                if len(tried) < len(self.backends):
+                    self.failovers += 1
+                continue
+            finally:
+                backend.inflight -= 1
+                backend.last_used = time.time()
+            backend.record_success(time.perf_counter() - started)
+            return
+
+    # --- salud ---
+
+    async def check_health(self):
+        """
+        Consulta /api/tags en cada host: un host que responde vuelve a rotación. Un fallo
+        cuenta como el de una llamada (sale de rotación tras `fail_threshold` seguidos).
+        """
+        async def check(backend: Backend):
+            try:
+                await asyncio.wait_for(backend.client().list(), timeout=self.health_timeout)
+            except Exception as e:
+                backend.record_failure(e, self.fail_threshold)
+                backend.last_error = f"health check failed: {e}"
+            else:
+                backend.healthy = True
+                backend.failures = 0
+
+        await asyncio.gather(*(check(b) for b in self.backends))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    async def start(self):
+        if self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for backend in self.backends:
+            await backend.close()
+
+    def stats(self) -> dict:
+        delay = self.hedge_delay()
+        return {
+            "backends": [b.stats() for b in self.backends],
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay": round(delay, 3) if delay is not None else None,
+        }
+
+
+# Pool compartido por el proceso
+backend_pool = BackendPool()
+
+registry.gauge(
+    "resumeai_ollama_backend_healthy", "1 si el host de Ollama está en rotación", ["host"],
+    lambda: {(b.url, ): int(b.healthy) for b in backend_pool.backends},
+)
+registry.gauge(
+    "resumeai_ollama_backend_inflight", "Llamadas en curso por host de Ollama", ["host"],
+    lambda: {(b.url, ): b.inflight for b in backend_pool.backends},
+)
@@ -0,0 +1,153 @@
+# app/services/precompress.py
+import os
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.chunker import estimate_tokens
+from app.services.metrics import record_timing
+from app.services.retrieval import normalize_terms
+from app.services.similarity import tfidf_matrix
+
+# Fracción de oraciones que conserva el ranking extractivo
+PRECOMPRESS_KEEP_FRACTION = float(os.getenv("PRECOMPRESS_KEEP_FRACTION", "0.5"))
+# Por debajo de este número de oraciones el texto no se recorta
+PRECOMPRESS_MIN_SENTENCES = int(os.getenv("PRECOMPRESS_MIN_SENTENCES", "20"))
+# Oraciones por bloque de TextRank (la matriz de similitud es de bloque × bloque)
+PRECOMPRESS_BLOCK_SENTENCES = int(os.getenv("PRECOMPRESS_BLOCK_SENTENCES", "300"))
+# Líneas del principio y del final de cada página candidatas a cabecera o pie
+PRECOMPRESS_HEADER_LINES = int(os.getenv("PRECOMPRESS_HEADER_LINES", "3"))
+# Fracción de páginas en las que debe repetirse una línea para eliminarla
+PRECOMPRESS_HEADER_MIN_FRACTION = float(os.getenv("PRECOMPRESS_HEADER_MIN_FRACTION", "0.5"))
+
+TEXTRANK_DAMPING = 0.85
+TEXTRANK_ITERATIONS = 30
+
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?…])\s+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def split_pages(text: str, offsets: Optional[List[int]]) -> List[str]:
+    if not offsets:
+        return [text]
+    bounds = list(offsets[1:]) + [len(text)]
+    return [text[start:end] for start, end in zip(offsets, bounds)]
+
+
+def _line_key(line: str) -> str:
+    # los números de página cambian en cada página: "Página 3 de 10" == "Página 4 de 10"
+    return _DIGITS_RE.sub("#", " ".join(line.lower().split()))
+
+
+def strip_repeated_lines(pages: List[str]) -> Tuple[List[str], int]:
+    """
+    Elimina cabeceras y pies de página: líneas de los extremos de cada página que se
+    repiten (ignorando números) en al menos PRECOMPRESS_HEADER_MIN_FRACTION de las páginas.
+    Devuelve (páginas, líneas eliminadas).
+    """
+    if len(pages) < 3:
+        return pages, 0
+    edge = max(1, PRECOMPRESS_HEADER_LINES)
+    page_lines = [[line for line in page.splitlines()] for page in pages]
+    counts: Counter = Counter()
+    for lines in page_lines:
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(content[:edge] + content[-edge:])
+        counts.update({_line_key(lines[i]) for i in edges})
+    threshold = max(2, PRECOMPRESS_HEADER_MIN_FRACTION * len(pages))
+    repeated = {key for key, n in counts.items() if n >= threshold and key}
+
+    removed = 0
+    cleaned = []
+    for lines in page_lines:
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        edges = set(content[:edge] + content[-edge:])
+        drop = {i for i in edges if _line_key(lines[i]) in repeated}
+        removed += len(drop)
+        cleaned.append("\n".join(line for i, line in enumerate(lines) if i not in drop))
+    return cleaned, removed
+
+
+def textrank(sentences: List[str]) -> np.ndarray:
+    """
+    Centralidad de cada oración (PageRank sobre la similitud coseno de sus vectores TF-IDF).
+    """
+    n = len(sentences)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    vectors = tfidf_matrix([normalize_terms(s) for s in sentences], dim=2048)
+    weights = vectors @ vectors.T
+    np.fill_diagonal(weights, 0.0)
+    row_sums = weights.sum(axis=1, keepdims=True)
+    # oraciones sin similitud con ninguna otra reparten su peso uniformemente
+    transition = np.where(row_sums > 0, weights / np.where(row_sums == 0, 1, row_sums), 1.0 / n)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(TEXTRANK_ITERATIONS):
+        scores = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * (transition.T @ scores)
+    return scores
+
+
+def _is_heading(sentence: str) -> bool:
+    return len(sentence.split()) <= 8 and not sentence.rstrip().endswith((".", "!", "?", "…", ",", ";", ":"))
+
+
+def compress_text(
+    text: str,
+    page_offsets: Optional[List[int]] = None,
+    keep_fraction: float = PRECOMPRESS_KEEP_FRACTION,
+) -> Tuple[str, Dict]:
+    """
+    Pre-compresión extractiva local antes del chunking: quita cabeceras/pies repetidos
+    entre páginas y conserva la fracción `keep_fraction` de oraciones más centrales
+    (TextRank por bloques, en su orden original; los títulos se conservan siempre).
+    Devuelve (texto comprimido, informe con tamaños, ratio y tiempo).
+    """
+    started = time.perf_counter()
+    keep_fraction = min(1.0, max(0.05, keep_fraction))
+    pages, header_lines = strip_repeated_lines(split_pages(text, page_offsets))
+
+    # (párrafo, oración) en orden del documento
+    paragraphs = [p for page in pages for p in re.split(r"\n\s*\n", page) if p.strip()]
+    units: List[Tuple[int, str]] = []
+    for index, paragraph in enumerate(paragraphs):
+        for sentence in _SENTENCE_SPLIT_RE.split(" ".join(paragraph.split())):
+            if sentence:
+                units.append((index, sentence))
+
+    keep = np.ones(len(units), dtype=bool)
+    if len(units) >= PRECOMPRESS_MIN_SENTENCES and keep_fraction < 1.0:
+        block = max(2, PRECOMPRESS_BLOCK_SENTENCES)
+        for start in range(0, len(units), block):
+            sentences = [s for _, s in units[start:start + block]]
+            scores = textrank(sentences)
+            n_keep = max(1, round(len(sentences) * keep_fraction))
+            threshold = np.sort(scores)[-n_keep]
+            keep[start:start + len(sentences)] = scores >= threshold
+        for i, (_, sentence) in enumerate(units):
+            if _is_heading(sentence):
+                keep[i] = True
+
+    kept: Dict[int, List[str]] = {}
+    for (index, sentence), selected in zip(units, keep):
+        if selected:
+            kept.setdefault(index, []).append(sentence)
+    compressed = "\n\n".join(" ".join(kept[i]) for i in sorted(kept))
+
+    seconds = time.perf_counter() - started
+    record_timing("compress", seconds)
+    original_tokens, compressed_tokens = estimate_tokens(text), estimate_tokens(compressed)
+    return compressed, {
+        "original_chars": len(text),
+        "compressed_chars": len(compressed),
+        "original_tokens": original_tokens,
+        "compressed_tokens": compressed_tokens,
+        "ratio": round(original_tokens / compressed_tokens, 3) if compressed_tokens else None,
+        "header_lines_removed": header_lines,
+        "sentences": len(units),
+        "kept_sentences": int(keep.sum()),
+        "keep_fraction": keep_fraction,
+        "seconds": round(seconds, 4),
+    }
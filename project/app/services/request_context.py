@@ -0,0 +1,112 @@
+# app/services/request_context.py
+import time
+import uuid
+from contextvars import ContextVar, Token
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+@dataclass
+class PipelineStats:
+    """
+    Contadores del pipeline map/reduce de un request.
+    """
+    chunks: int = 0
+    map_calls: int = 0
+    reduce_calls: int = 0
+    # niveles de reduce, incluida la síntesis final
+    reduce_depth: int = 0
+    # llamadas que llegaron a Ollama (sin contar aciertos de caché)
+    llm_calls: int = 0
+    cache_hits: int = 0
+    # chunks cuyo resumen parcial se tomó de una versión anterior del documento
+    reused_chunks: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    # suma del num_predict de las llamadas a Ollama (frente a completion_tokens, lo generado)
+    # y llamadas que agotaron su num_predict (respuesta recortada)
+    budgeted_tokens: int = 0
+    truncated_calls: int = 0
+    # milisegundos informados por Ollama: carga del modelo (arranque en frío) y procesado del prompt
+    load_ms: int = 0
+    prompt_eval_ms: int = 0
+    # chunks sin resumir porque se alcanzó la hora límite del request
+    skipped_chunks: int = 0
+    # llamadas resueltas con la respuesta de un prompt idéntico de otro documento del lote
+    deduplicated_calls: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class RequestContext:
+    """
+    Estado asociado a un request HTTP (o a un job/CLI) que debe llegar hasta las
+    llamadas a Ollama sin pasarlo como argumento por todo el pipeline.
+    """
+    request_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # False = no leer la caché de respuestas del LLM (la respuesta nueva sí se guarda)
+    use_cache: bool = True
+    stats: PipelineStats = field(default_factory=PipelineStats)
+    # segundos acumulados por etapa (extract, chunk, map, reduce, synthesis, llm, queue_wait)
+    timings: Dict[str, float] = field(default_factory=dict)
+    # True = incluir `timings` en la respuesta (`?timings=1`)
+    include_timings: bool = False
+    # StoredDocument del doc_id recibido: el chunking de su texto se reutiliza
+    document: Optional[Any] = None
+    # hora límite (time.monotonic) y duración pedidas con `?deadline=<segundos>`
+    deadline: Optional[float] = None
+    deadline_seconds: Optional[float] = None
+    # True si el resultado se construyó solo con parte de los chunks por la hora límite
+    partial: bool = False
+    # sustituto de call_ollama_with_retry(prompt, max_tokens, retry_delay, response_format):
+    # los documentos de un lote envían sus llamadas a la cola compartida del lote
+    llm_call: Optional[Callable[..., Awaitable[str]]] = None
+
+    def add_timing(self, stage: str, seconds: float):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def set_deadline(self, seconds: float):
+        self.deadline_seconds = seconds
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self) -> Optional[float]:
+        """
+        Segundos hasta la hora límite (None sin hora límite).
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def timings_report(self) -> Optional[Dict[str, float]]:
+        """
+        Desglose de tiempos para la respuesta, o None si el request no lo pidió.
+        """
+        if not self.include_timings:
+            return None
+        return {stage: round(seconds, 4) for stage, seconds in self.timings.items()}
+
+
+_DEFAULT_CONTEXT = RequestContext(request_id="default")
+_current: ContextVar[RequestContext] = ContextVar("request_context", default=_DEFAULT_CONTEXT)
+
+
+def current_context() -> RequestContext:
+    """
+    Contexto del request en curso (o uno compartido por defecto fuera de un request).
+    """
+    return _current.get()
+
+
+def begin_request(request_id: Optional[str] = None, **kwargs) -> Token:
+    """
+    Activa un nuevo contexto para el request actual. Devuelve el token para `end_request`.
+    Las tareas asyncio creadas después heredan el contexto.
+    """
+    ctx = RequestContext(request_id=request_id or uuid.uuid4().hex, **kwargs)
+    return _current.set(ctx)
+
+
+def end_request(token: Token):
+    _current.reset(token)
@@ -0,0 +1,239 @@
+# app/services/retrieval.py
+import base64
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.chunker import chunk_by_tokens, estimate_tokens
+
+# Tamaño de los pasajes indexados (más pequeños que los chunks del map stage)
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_TOKENS", "400"))
+RETRIEVAL_OVERLAP_TOKENS = int(os.getenv("RETRIEVAL_OVERLAP_TOKENS", "40"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+# Peso de la similitud densa (vectores hash) frente a BM25; 0 desactiva los vectores
+RETRIEVAL_DENSE_WEIGHT = float(os.getenv("RETRIEVAL_DENSE_WEIGHT", "0.3"))
+RETRIEVAL_DENSE_DIM = int(os.getenv("RETRIEVAL_DENSE_DIM", "1024"))
+# Índices de documentos que se mantienen en memoria (LRU)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "32"))
+
+# Artefacto del almacén de documentos con el índice (depende de la configuración del índice)
+INDEX_ARTIFACT = f"retrieval_index:{RETRIEVAL_CHUNK_TOKENS}:{RETRIEVAL_OVERLAP_TOKENS}:{RETRIEVAL_DENSE_DIM}"
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def normalize_terms(text: str) -> List[str]:
+    """
+    Términos en minúsculas y sin acentos (para que "función" y "funcion" coincidan).
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [t for t in _TOKEN_RE.findall(text) if len(t) > 1]
+
+
+def document_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def hash_bucket(term: str, dim: int) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little") % dim
+
+
+class DocumentIndex:
+    """
+    Índice local de un documento: BM25 sobre listas invertidas (arrays NumPy) y,
+    opcionalmente, vectores TF-IDF con hashing trick para similitud coseno.
+    """
+
+    def __init__(self, passages: List[str], dense_dim: int = RETRIEVAL_DENSE_DIM, dense: bool = True):
+        self.passages = passages
+        self.dense_dim = dense_dim
+        docs = [normalize_terms(p) for p in passages]
+        n_docs = len(docs)
+        self.doc_len = np.array([len(d) for d in docs], dtype=np.float32)
+        self.avg_len = float(self.doc_len.mean()) if n_docs else 0.0
+
+        # listas invertidas en formato CSR: term -> (doc_ids, tf)
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, terms in enumerate(docs):
+            for term in terms:
+                tf = postings.setdefault(term, {})
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+        self.vocab = {term: i for i, term in enumerate(postings)}
+        self.ptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for i, tf in enumerate(postings.values()):
+            doc_ids.extend(tf.keys())
+            tfs.extend(tf.values())
+            self.ptr[i + 1] = len(doc_ids)
+        self.doc_ids = np.array(doc_ids, dtype=np.int32)
+        self.tfs = np.array(tfs, dtype=np.float32)
+        df = np.diff(self.ptr).astype(np.float32)
+        self.idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+        self.vectors = self._dense_matrix(docs) if dense and n_docs else None
+
+    def _dense_vector(self, terms: List[str]) -> np.ndarray:
+        vec = np.zeros(self.dense_dim, dtype=np.float32)
+        for term in terms:
+            term_id = self.vocab.get(term)
+            weight = self.idf[term_id] if term_id is not None else 1.0
+            vec[hash_bucket(term, self.dense_dim)] += weight
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _dense_matrix(self, docs: List[List[str]]) -> np.ndarray:
+        return np.vstack([self._dense_vector(terms) for terms in docs])
+
+    def bm25(self, query_terms: List[str]) -> np.ndarray:
+        scores = np.zeros(len(self.passages), dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / (self.avg_len or 1.0))
+        for term in set(query_terms):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.ptr[term_id], self.ptr[term_id + 1]
+            ids = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            scores[ids] += self.idf[term_id] * tf * (BM25_K1 + 1) / (tf + norm[ids])
+        return scores
+
+    def search(self, query: str, top_k: int = RETRIEVAL_TOP_K,
+               dense_weight: float = RETRIEVAL_DENSE_WEIGHT) -> List[Tuple[int, float]]:
+        """
+        Pasajes más relevantes para `query`: [(índice, score)] de mayor a menor.
+        """
+        if not self.passages:
+            return []
+        terms = normalize_terms(query)
+        scores = self.bm25(terms)
+        if scores.max() > 0:
+            scores = scores / scores.max()
+        if self.vectors is not None and dense_weight > 0:
+            scores = (1 - dense_weight) * scores + dense_weight * (self.vectors @ self._dense_vector(terms))
+        top_k = min(top_k, len(self.passages))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best]
+
+    def to_artifact(self) -> Dict[str, Any]:
+        """
+        Índice serializable en JSON (arrays en base64) para guardarlo con el documento.
+        """
+        def encode(array: np.ndarray) -> str:
+            return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")
+
+        return {
+            "passages": self.passages,
+            "terms": list(self.vocab),
+            "ptr": encode(self.ptr),
+            "doc_ids": encode(self.doc_ids),
+            "tfs": encode(self.tfs),
+            "doc_len": encode(self.doc_len),
+            "dense_dim": self.dense_dim,
+            "vectors": encode(self.vectors.astype(np.float16)) if self.vectors is not None else None,
+        }
+
+    @classmethod
+    def from_artifact(cls, data: Dict[str, Any]) -> "DocumentIndex":
+        def decode(value: str, dtype) -> np.ndarray:
+            return np.frombuffer(base64.b64decode(value), dtype=dtype).copy()
+
+        index = cls.__new__(cls)
+        index.dense_dim = data["dense_dim"]
+        index.passages = list(data["passages"])
+        index.vocab = {term: i for i, term in enumerate(data["terms"])}
+        index.ptr = decode(data["ptr"], np.int64)
+        index.doc_ids = decode(data["doc_ids"], np.int32)
+        index.tfs = decode(data["tfs"], np.float32)
+        index.doc_len = decode(data["doc_len"], np.float32)
+        index.avg_len = float(index.doc_len.mean()) if len(index.passages) else 0.0
+        df = np.diff(index.ptr).astype(np.float32)
+        index.idf = np.log(1.0 + (len(index.passages) - df + 0.5) / (df + 0.5))
+        index.vectors = None
+        if data.get("vectors") is not None:
+            vectors = decode(data["vectors"], np.float16).astype(np.float32)
+            index.vectors = vectors.reshape(len(index.passages), index.dense_dim)
+        return index
+
+    def context_for(self, query: str, max_tokens: int, top_k: int = RETRIEVAL_TOP_K) -> List[Tuple[int, float]]:
+        """
+        Pasajes relevantes que caben en `max_tokens`, en el orden del documento.
+        """
+        selected, used = [], 0
+        for index, score in self.search(query, top_k=top_k):
+            tokens = estimate_tokens(self.passages[index])
+            if selected and used + tokens > max_tokens:
+                continue
+            selected.append((index, score))
+            used += tokens
+        return sorted(selected)
+
+
+def build_index(text: str) -> DocumentIndex:
+    passages = chunk_by_tokens(text, RETRIEVAL_CHUNK_TOKENS, RETRIEVAL_OVERLAP_TOKENS)
+    return DocumentIndex(passages, dense=RETRIEVAL_DENSE_WEIGHT > 0)
+
+
+class IndexCache:
+    """
+    LRU de índices por hash del documento: las preguntas siguientes sobre el mismo
+    documento reutilizan el índice sin volver a construirlo.
+    """
+
+    def __init__(self, max_items: int = RETRIEVAL_CACHE_SIZE):
+        self.max_items = max_items
+        self._items: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, doc_hash: str) -> Optional[DocumentIndex]:
+        with self._lock:
+            index = self._items.get(doc_hash)
+            if index is not None:
+                self._items.move_to_end(doc_hash)
+            return index
+
+    def put(self, doc_hash: str, index: DocumentIndex):
+        with self._lock:
+            self._items[doc_hash] = index
+            self._items.move_to_end(doc_hash)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def get_or_build(self, text: str) -> Tuple[str, DocumentIndex]:
+        doc_hash = document_hash(text)
+        index = self.get(doc_hash)
+        if index is None:
+            index = build_index(text)
+            self.put(doc_hash, index)
+        return doc_hash, index
+
+    def for_document(self, document) -> Tuple[str, DocumentIndex]:
+        """
+        Índice de un documento del almacén: el que se guardó al subirlo (artefacto
+        INDEX_ARTIFACT) o, si no lo tiene, se construye ahora y se guarda con él.
+        """
+        doc_hash = document_hash(document.text)
+        index = self.get(doc_hash)
+        if index is None:
+            data = document.get_artifact(INDEX_ARTIFACT)
+            if data is not None:
+                index = DocumentIndex.from_artifact(data)
+            else:
+                index = build_index(document.text)
+                document.set_artifact(INDEX_ARTIFACT, index.to_artifact())
+            self.put(doc_hash, index)
+        return doc_hash, index
+
+
+# Caché compartida por el proceso
+index_cache = IndexCache()
@@ -0,0 +1,194 @@
+# app/services/similarity.py
+import math
+import os
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.services.ai_client import ChatPrompt
+from app.services.chunker import CHARS_PER_TOKEN, chunk_by_tokens
+from app.services.retrieval import hash_bucket, normalize_terms
+
+# Dimensión de los vectores TF-IDF (hashing trick)
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "4096"))
+# Permutaciones de MinHash y tamaño de los shingles (en palabras)
+MINHASH_PERMUTATIONS = int(os.getenv("MINHASH_PERMUTATIONS", "64"))
+MINHASH_SHINGLE_WORDS = int(os.getenv("MINHASH_SHINGLE_WORDS", "5"))
+# Jaccard estimado a partir del cual dos textos son casi duplicados
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+# Similitud coseno mínima para unir dos textos en el mismo cluster
+SIMILARITY_CLUSTER_THRESHOLD = float(os.getenv("SIMILARITY_CLUSTER_THRESHOLD", "0.5"))
+# Hasta este número de textos se comparan todos juntos en el prompt; con más, el LLM
+# solo explica las COMPARE_EXPLAIN_PAIRS parejas más parecidas y más distintas
+COMPARE_DIRECT_MAX = int(os.getenv("COMPARE_DIRECT_MAX", "3"))
+COMPARE_EXPLAIN_PAIRS = int(os.getenv("COMPARE_EXPLAIN_PAIRS", "3"))
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+
+
+def tfidf_matrix(docs: List[List[str]], dim: int = SIMILARITY_DIM) -> np.ndarray:
+    """
+    Vectores TF-IDF normalizados (tf sublineal, hashing trick), uno por fila.
+    """
+    df = Counter(term for terms in docs for term in set(terms))
+    n_docs = len(docs)
+    buckets = {term: hash_bucket(term, dim) for term in df}
+    matrix = np.zeros((n_docs, dim), dtype=np.float32)
+    for row, terms in enumerate(docs):
+        counts = Counter(terms)
+        if not counts:
+            continue
+        cols = np.fromiter((buckets[t] for t in counts), dtype=np.int64, count=len(counts))
+        tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        idf = np.fromiter((math.log((1 + n_docs) / (1 + df[t])) + 1.0 for t in counts), dtype=np.float32,
+                          count=len(counts))
+        np.add.at(matrix[row], cols, tf * idf)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def minhash_signatures(docs: List[List[str]], permutations: int = MINHASH_PERMUTATIONS,
+                       shingle_words: int = MINHASH_SHINGLE_WORDS, seed: int = 1) -> np.ndarray:
+    """
+    Firmas MinHash (N × permutations) de los shingles de `shingle_words` palabras.
+    Los shingles se codifican con aritmética vectorizada sobre los ids de los términos.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, (1 << 61) - 1, size=permutations, dtype=np.uint64)
+    b = rng.integers(0, (1 << 61) - 1, size=permutations, dtype=np.uint64)
+    vocab: Dict[str, int] = {}
+    signatures = np.full((len(docs), permutations), np.iinfo(np.uint64).max, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for row, terms in enumerate(docs):
+            if not terms:
+                continue
+            ids = np.fromiter((vocab.setdefault(t, len(vocab) + 1) for t in terms), dtype=np.uint64, count=len(terms))
+            width = min(shingle_words, len(ids))
+            shingles = np.zeros(len(ids) - width + 1, dtype=np.uint64)
+            for offset in range(width):
+                shingles = shingles * np.uint64(1_000_003) + ids[offset:len(ids) - width + 1 + offset]
+            shingles = np.unique(shingles)
+            # por bloques para acotar la memoria en documentos grandes
+            for start in range(0, len(shingles), 8192):
+                block = shingles[start:start + 8192, None]
+                hashed = (block * a + b) % _MERSENNE
+                signatures[row] = np.minimum(signatures[row], hashed.min(axis=0))
+    return signatures
+
+
+def jaccard_matrix(signatures: np.ndarray) -> np.ndarray:
+    """
+    Jaccard estimado entre todas las parejas (fracción de posiciones iguales de la firma).
+    """
+    if len(signatures) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    return (signatures[:, None, :] == signatures[None, :, :]).mean(axis=2).astype(np.float32)
+
+
+def clusters_from(similarity: np.ndarray, threshold: float = SIMILARITY_CLUSTER_THRESHOLD) -> List[List[int]]:
+    """
+    Componentes conexas del grafo "similitud >= threshold" (de mayor a menor tamaño).
+    """
+    parent = list(range(len(similarity)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rows, cols = np.nonzero(np.triu(similarity >= threshold, k=1))
+    for i, j in zip(rows.tolist(), cols.tolist()):
+        parent[find(i)] = find(j)
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(similarity)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values(), key=lambda g: (-len(g), g[0]))
+
+
+def _ranked_pairs(similarity: np.ndarray, top: int, descending: bool) -> List[Tuple[int, int, float]]:
+    rows, cols = np.triu_indices(len(similarity), k=1)
+    if len(rows) == 0:
+        return []
+    values = similarity[rows, cols]
+    order = np.argsort(-values if descending else values, kind="stable")[:top]
+    return [(int(rows[k]), int(cols[k]), float(values[k])) for k in order]
+
+
+def _top_terms(docs: List[List[str]], members: List[int], df: Counter, limit: int = 6) -> List[str]:
+    counts = Counter(term for i in members for term in docs[i])
+    n_docs = len(docs)
+    scored = {t: c * math.log((1 + n_docs) / (1 + df[t])) for t, c in counts.items() if len(t) > 3}
+    return [t for t, _ in sorted(scored.items(), key=lambda kv: -kv[1])[:limit]]
+
+
+def compare_documents(texts: List[str], top_pairs: int = 3) -> dict:
+    """
+    Etapa local de comparación: matriz N×N de similitud coseno TF-IDF, Jaccard estimado
+    con MinHash, casi duplicados, clusters y parejas más parecidas y más distintas.
+    """
+    docs = [normalize_terms(t) for t in texts]
+    vectors = tfidf_matrix(docs)
+    cosine = np.clip(vectors @ vectors.T, 0.0, 1.0)
+    jaccard = jaccard_matrix(minhash_signatures(docs))
+    df = Counter(term for terms in docs for term in set(terms))
+    clusters = clusters_from(cosine)
+
+    near_duplicates = [
+        {"a": i, "b": j, "jaccard": round(score, 4)}
+        for i, j, score in _ranked_pairs(jaccard, len(texts) ** 2, descending=True)
+        if score >= NEAR_DUPLICATE_THRESHOLD
+    ]
+    return {
+        "similarity": np.round(cosine, 4).tolist(),
+        "jaccard": np.round(jaccard, 4).tolist(),
+        "near_duplicates": near_duplicates,
+        "clusters": [
+            {"members": members, "terms": _top_terms(docs, members, df)} for members in clusters
+        ],
+        "most_similar": [
+            {"a": i, "b": j, "score": round(s, 4)} for i, j, s in _ranked_pairs(cosine, top_pairs, True)
+        ],
+        "most_divergent": [
+            {"a": i, "b": j, "score": round(s, 4)} for i, j, s in _ranked_pairs(cosine, top_pairs, False)
+        ],
+    }
+
+
+def explanation_prompt(texts: List[str], report: dict, budget_tokens: int) -> str:
+    """
+    Prompt único para explicar las parejas más parecidas y más distintas y los clusters:
+    solo entran fragmentos de los textos implicados, repartiendo `budget_tokens`.
+    """
+    pairs = report["most_similar"] + report["most_divergent"]
+    involved = sorted({p["a"] for p in pairs} | {p["b"] for p in pairs})
+    per_text = max(100, budget_tokens // max(1, len(involved)))
+    excerpts = "\n\n".join(
+        # solo se trocea el principio de cada texto
+        f"Texto {i + 1}:\n{chunk_by_tokens(texts[i][:int(per_text * CHARS_PER_TOKEN * 2)], per_text)[0]}"
+        for i in involved
+    )
+
+    def describe(items: List[dict]) -> str:
+        return "\n".join(f"- Texto {p['a'] + 1} y Texto {p['b'] + 1}: similitud {p['score']:.2f}" for p in items)
+
+    clusters = "\n".join(
+        f"- Textos {', '.join(str(m + 1) for m in c['members'])}: {', '.join(c['terms'])}"
+        for c in report["clusters"] if len(c["members"]) > 1
+    ) or "- Ningún grupo de textos similares"
+    duplicates = "\n".join(
+        f"- Texto {d['a'] + 1} y Texto {d['b'] + 1} (Jaccard {d['jaccard']:.2f})" for d in report["near_duplicates"]
+    ) or "- Ninguno"
+    return ChatPrompt(
+        "Se compararon varios textos con similitud coseno TF-IDF. "
+        "Explica en Markdown, de forma concisa, qué tienen en común las parejas más parecidas, "
+        "en qué difieren las más distintas y qué caracteriza a cada grupo. "
+        "Devuelve el resultado en formato de documento Markdown, bien organizado y visualmente atractivo.",
+        f"Textos comparados: {len(texts)}\n\n"
+        f"Parejas más parecidas:\n{describe(report['most_similar'])}\n\n"
+        f"Parejas más distintas:\n{describe(report['most_divergent'])}\n\n"
+        f"Grupos (términos característicos):\n{clusters}\n\n"
+        f"Casi duplicados:\n{duplicates}\n\n"
+        f"Fragmentos de los textos implicados:\n\n{excerpts}\n\nAnálisis comparativo:",
+    )
@@ -0,0 +1,152 @@
+# app/services/streaming.py
+import asyncio
+import json
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from app.services.ai_client import (
+    DeadlineExceededError,
+    MapReducePlan,
+    final_prompt,
+    run_map_stage,
+    run_reduce_levels,
+    stream_ollama_api,
+    with_deadline,
+)
+from app.services.llm_scheduler import LLMOverloadedError
+from app.services.metrics import span
+from app.services.request_context import current_context
+
+
+async def _drain(task: asyncio.Future, queue: asyncio.Queue) -> AsyncIterator[dict]:
+    """
+    Emite los eventos que `task` deja en `queue` hasta que termina.
+    """
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    while True:
+        event = await queue.get()
+        if event is None:
+            break
+        yield event
+
+
+async def stream_map_reduce(
+    plan: MapReducePlan,
+    max_tokens: int = 1024,
+    max_concurrency: Optional[int] = None,
+    retry_delay: float = 0,
+    done_fields: Optional[Callable[[str], dict]] = None,
+) -> AsyncIterator[dict]:
+    """
+    Ejecuta un plan map/reduce emitiendo eventos:
+    - {"event": "start", "chunks": n}
+    - {"event": "progress", "index": i, "completed": k, "total": n} al terminar cada chunk
+      (n es null si los prompts se generan a medida que se lee el texto)
+    - {"event": "reduce", "level": l, "calls": c} al terminar cada nivel intermedio del reduce
+    - {"event": "token", "text": "..."} durante la síntesis final
+    - {"event": "done", "result": "...", "partial": bool, "stats": {...}} (+ `timings` si se pidió y `done_fields(result)`)
+    - {"event": "error", "detail": "..."} si algo falla
+    """
+    total = len(plan.prompts) if plan.prompt_stream is None else None
+    yield {"event": "start", "chunks": total}
+
+    queue: asyncio.Queue = asyncio.Queue()
+    task = None
+    try:
+        completed = 0
+
+        def on_result(index: int, _):
+            nonlocal completed
+            completed += 1
+            queue.put_nowait({"event": "progress", "index": index, "completed": completed, "total": total})
+
+        task = asyncio.ensure_future(run_map_stage(plan, max_tokens, max_concurrency, retry_delay, on_result))
+        async for event in _drain(task, queue):
+            yield event
+        partials = task.result()
+
+        task = asyncio.ensure_future(run_reduce_levels(
+            plan,
+            partials,
+            max_tokens,
+            max_concurrency,
+            retry_delay,
+            on_level=lambda level, calls: queue.put_nowait({"event": "reduce", "level": level, "calls": calls}),
+        ))
+        async for event in _drain(task, queue):
+            yield event
+        partials = task.result()
+
+        prompt = final_prompt(plan, partials)
+        if prompt is None:
+            result = "\n\n".join(partials)
+            yield {"event": "token", "text": result}
+        else:
+            parts = []
+            tokens = stream_ollama_api(prompt, max_tokens=max_tokens)
+            with span("synthesis"):
+                try:
+                    while True:
+                        try:
+                            token = await with_deadline(tokens.__anext__())
+                        except StopAsyncIteration:
+                            break
+                        parts.append(token)
+                        yield {"event": "token", "text": token}
+                except asyncio.TimeoutError:
+                    # hora límite durante la síntesis: se corta el texto o, si aún no
+                    # había empezado, se devuelven las parciales terminadas
+                    current_context().partial = True
+                    if not parts and not partials:
+                        raise DeadlineExceededError()
+                    if not parts:
+                        parts = ["\n\n".join(partials)]
+                        yield {"event": "token", "text": parts[0]}
+                finally:
+                    await tokens.aclose()
+            result = "".join(parts).strip()
+
+        ctx = current_context()
+        done = {"event": "done", "result": result, "partial": ctx.partial, "stats": ctx.stats.as_dict()}
+        if ctx.include_timings:
+            done["timings"] = ctx.timings_report()
+        if done_fields:
+            done.update(done_fields(result))
+        yield done
+    except LLMOverloadedError as e:
+        yield {"event": "error", "detail": e.detail, "status_code": e.status_code, "retry_after": e.retry_after}
+    except DeadlineExceededError as e:
+        yield {"event": "error", "detail": e.detail, "status_code": e.status_code}
+    except Exception as e:
+        yield {"event": "error", "detail": str(e)}
+    finally:
+        # si el cliente se desconecta se cancela el trabajo pendiente
+        if task is not None and not task.done():
+            task.cancel()
+
+
+def _ndjson(events: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async def gen():
+        async for event in events:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+    return gen()
+
+
+def _sse(events: AsyncIterator[dict]) -> AsyncIterator[str]:
+    async def gen():
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    return gen()
+
+
+def streaming_response(request: Request, events: AsyncIterator[dict]) -> StreamingResponse:
+    """
+    Respuesta en streaming: Server-Sent Events si el cliente envía
+    `Accept: text/event-stream`, NDJSON (un evento JSON por línea) en otro caso.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(_sse(events), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(_ndjson(events), media_type="application/x-ndjson", headers=headers)
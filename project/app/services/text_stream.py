@@ -0,0 +1,53 @@
+# app/services/text_stream.py
+import codecs
+import os
+from typing import BinaryIO, Iterable, Iterator
+
+# Bytes leídos (y decodificados) de cada subida de texto por iteración
+TEXT_READ_BLOCK_BYTES = int(os.getenv("TEXT_READ_BLOCK_BYTES", "65536"))
+
+# Separador entre los textos de varias fuentes (el mismo que al unirlos con "\n\n".join)
+SOURCE_SEPARATOR = "\n\n"
+
+
+def iter_decoded(fileobj: BinaryIO, block_bytes: int = TEXT_READ_BLOCK_BYTES) -> Iterator[str]:
+    """
+    Decodifica un archivo de texto UTF-8 bloque a bloque (los caracteres partidos entre
+    dos bloques se completan con el siguiente; los bytes inválidos se ignoran).
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    while True:
+        data = fileobj.read(block_bytes)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_blocks(text: str, block_chars: int = TEXT_READ_BLOCK_BYTES) -> Iterator[str]:
+    """
+    Un texto ya cargado en bloques del mismo tamaño que las lecturas de archivo.
+    """
+    for start in range(0, len(text), block_chars):
+        yield text[start:start + block_chars]
+
+
+def iter_sources(sources: Iterable[Iterable[str]]) -> Iterator[str]:
+    """
+    Bloques de varias fuentes seguidas, separadas como en "\\n\\n".join(textos).
+    """
+    for i, blocks in enumerate(sources):
+        if i:
+            yield SOURCE_SEPARATOR
+        yield from blocks
+
+
+def read_text(fileobj: BinaryIO) -> str:
+    """
+    Texto completo de una subida, decodificado por bloques (sin copia completa en bytes).
+    """
+    return "".join(iter_decoded(fileobj))
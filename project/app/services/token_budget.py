@@ -0,0 +1,62 @@
+# app/services/token_budget.py
+import os
+from typing import List, NamedTuple, Optional
+
+# Repartir num_predict de las llamadas intermedias según el tipo de resumen y el tamaño
+# de cada chunk (false = todas las llamadas usan el max_tokens del request)
+ADAPTIVE_TOKEN_BUDGET = os.getenv("ADAPTIVE_TOKEN_BUDGET", "true").lower() in ("1", "true", "yes")
+# Tokens de salida mínimos de una llamada intermedia (resumen de un chunk o fusión)
+MIN_PARTIAL_TOKENS = int(os.getenv("MIN_PARTIAL_TOKENS", "96"))
+# Tokens de las parciales que llegan a la síntesis por cada token del resumen final
+PARTIAL_DETAIL_FACTOR = float(os.getenv("PARTIAL_DETAIL_FACTOR", "4"))
+
+# Longitud típica del resumen final por tipo (tope: max_tokens del request)
+FINAL_TOKENS = {"tldr": 160, "bullets": 512}
+# Los formatos cortos necesitan menos detalle en las parciales
+DETAIL_SCALE = {"tldr": 0.5, "bullets": 0.75}
+
+
+class TokenBudget(NamedTuple):
+    """
+    Presupuesto de tokens de salida de un plan map/reduce: las parciales de todo el
+    documento suman `total` tokens y cada llamada intermedia recibe la parte que
+    corresponde a la fracción del documento que cubre, entre `floor` y `ceiling`.
+    La síntesis final usa el max_tokens del request.
+    """
+    total: int
+    floor: int
+    ceiling: int
+
+    def for_share(self, share: float) -> int:
+        """
+        num_predict de una llamada que resume (o fusiona) `share` del documento.
+        """
+        return max(self.floor, min(self.ceiling, round(self.total * share)))
+
+    def for_shares(self, shares: List[float]) -> List[int]:
+        return [self.for_share(share) for share in shares]
+
+
+def plan_budget(summary_type: str, max_tokens: int, input_budget: int) -> Optional[TokenBudget]:
+    """
+    Presupuesto de las llamadas intermedias de un resumen (None si está desactivado).
+    El total de las parciales no supera `input_budget` (los tokens de entrada de una
+    llamada), para que la síntesis las reciba en un solo prompt siempre que el mínimo
+    por llamada lo permita.
+    """
+    if not ADAPTIVE_TOKEN_BUDGET:
+        return None
+    final = min(max_tokens, FINAL_TOKENS.get(summary_type, max_tokens))
+    total = final * PARTIAL_DETAIL_FACTOR * DETAIL_SCALE.get(summary_type, 1.0)
+    floor = min(MIN_PARTIAL_TOKENS, max_tokens)
+    return TokenBudget(total=int(min(total, input_budget)), floor=floor, ceiling=max_tokens)
+
+
+def shares(sizes: List[int]) -> List[float]:
+    """
+    Fracción del documento que representa cada tamaño (uniforme si todos son 0).
+    """
+    total = sum(sizes)
+    if not total:
+        return [1 / len(sizes)] * len(sizes) if sizes else []
+    return [size / total for size in sizes]
@@ -0,0 +1,117 @@
+# app/services/warmup.py
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+from app.services.ai_client import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL
+from app.services.metrics import registry, response_field
+from app.services.ollama_pool import Backend, BackendPool, backend_pool
+
+# Cargar el modelo en todos los hosts al arrancar la app (el primer request no paga la carga)
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() in ("1", "true", "yes")
+# Ping a los hosts sin actividad durante este tiempo, para que Ollama no descargue el modelo
+# (0 = desactivado). Conviene que sea menor que OLLAMA_KEEP_ALIVE.
+OLLAMA_KEEP_WARM_INTERVAL = float(os.getenv("OLLAMA_KEEP_WARM_INTERVAL", "600"))
+
+
+class ModelWarmer:
+    """
+    Mantiene el modelo cargado en los hosts de Ollama: un generate vacío con `keep_alive`
+    al arrancar y, después, periódicamente en los hosts que llevan `interval` segundos
+    sin llamadas. Guarda por host la duración de la carga en frío que informa Ollama.
+    """
+
+    def __init__(
+        self,
+        pool: BackendPool = backend_pool,
+        model: str = OLLAMA_MODEL,
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        enabled: bool = OLLAMA_WARMUP,
+        interval: float = OLLAMA_KEEP_WARM_INTERVAL,
+    ):
+        self.pool = pool
+        self.model = model
+        self.keep_alive = keep_alive
+        self.enabled = enabled
+        self.interval = interval
+        self.hosts: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def _state(self, backend: Backend) -> dict:
+        return self.hosts.setdefault(backend.url, {
+            "warm": False,
+            # load_duration de la primera carga (arranque en frío) y duración total del warm-up
+            "cold_start_seconds": None,
+            "warmup_seconds": None,
+            "pings": 0,
+            "last_ping": None,
+            "last_error": None,
+        })
+
+    async def warm(self, backend: Backend) -> dict:
+        """
+        Carga el modelo en `backend` (o renueva su keep_alive si ya está cargado).
+        """
+        state = self._state(backend)
+        started = time.perf_counter()
+        try:
+            response = await backend.client().generate(model=self.model, prompt="", keep_alive=self.keep_alive)
+        except Exception as e:
+            state["warm"] = False
+            state["last_error"] = str(e)
+            return state
+        load_ns = response_field(response, "load_duration")
+        if state["cold_start_seconds"] is None:
+            state["cold_start_seconds"] = round(load_ns / 1e9, 3) if load_ns is not None else None
+            state["warmup_seconds"] = round(time.perf_counter() - started, 3)
+        state.update(warm=True, pings=state["pings"] + 1, last_ping=time.time(), last_error=None)
+        backend.last_used = time.time()
+        return state
+
+    async def warm_all(self):
+        await asyncio.gather(*(self.warm(b) for b in self.pool.backends))
+
+    async def ping_idle(self, now: Optional[float] = None):
+        """
+        Renueva el keep_alive de los hosts sin llamadas en los últimos `interval` segundos.
+        """
+        now = time.time() if now is None else now
+        idle = [b for b in self.pool.backends if b.healthy and b.inflight == 0 and now - b.last_used >= self.interval]
+        await asyncio.gather(*(self.warm(b) for b in idle))
+
+    async def _loop(self):
+        if self.enabled:
+            await self.warm_all()
+        while self.interval > 0:
+            await asyncio.sleep(self.interval)
+            await self.ping_idle()
+
+    async def start(self):
+        # en segundo plano: la app acepta requests mientras el modelo se carga
+        if (self.enabled or self.interval > 0) and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+            "keep_warm_interval": self.interval,
+            "hosts": self.hosts,
+        }
+
+
+# Warm-up compartido por el proceso
+model_warmer = ModelWarmer()
+
+registry.gauge(
+    "resumeai_ollama_cold_start_seconds", "Carga del modelo en el warm-up de cada host (load_duration)", ["host"],
+    lambda: {(url, ): s["cold_start_seconds"] for url, s in model_warmer.hosts.items()
+             if s["cold_start_seconds"] is not None},
+)
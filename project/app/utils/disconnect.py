@@ -0,0 +1,54 @@
+# app/utils/disconnect.py
+import asyncio
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.metrics import REQUESTS_CANCELLED
+
+
+class CancelOnDisconnectMiddleware:
+    """
+    Cancela el request si el cliente se desconecta antes de recibir la respuesta
+    (timeout del frontend, pestaña cerrada). Con el handler se cancelan las llamadas a
+    Ollama en curso (se cierra la conexión y deja de generar) y las que esperan turno
+    en el scheduler, en lugar de terminar un resultado que nadie va a leer.
+    """
+
+    def __init__(self, app: ASGIApp, queue_size: int = 16):
+        self.app = app
+        self.queue_size = queue_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # los mensajes del cliente se leen aquí para ver el http.disconnect aunque
+        # el handler ya no esté leyendo el cuerpo
+        messages: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def pump():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def queued_receive() -> Message:
+            return await messages.get()
+
+        handler = asyncio.ensure_future(self.app(scope, queued_receive, send))
+        listener = asyncio.ensure_future(pump())
+        try:
+            await asyncio.wait({handler, listener}, return_when=asyncio.FIRST_COMPLETED)
+            if not handler.done() and listener.exception() is None:
+                # desconexión con la respuesta sin terminar
+                handler.cancel()
+                REQUESTS_CANCELLED.inc(reason="disconnect")
+                await asyncio.gather(handler, return_exceptions=True)
+                return
+            await handler
+        finally:
+            for task in (handler, listener):
+                if not task.done():
+                    task.cancel()
@@ -1,20 +1,25 @@
 # app/utils/file_utils.py
 import os
+import shutil
 import tempfile
-from typing import Optional
+from typing import BinaryIO, Optional
 
 TMP_DIR = os.getenv("TMP_DIR", "/tmp/resumeai")
+# Datos persistentes entre reinicios (cachés, SQLite)
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(TMP_DIR, "data"))
 
 os.makedirs(TMP_DIR, exist_ok=True)
 
-def save_upload_temp(filename: str, content: bytes) -> str:
+def save_upload_stream(filename: str, source: BinaryIO, directory: Optional[str] = None) -> str:
     """
-    Guarda el archivo en un path temporal y devuelve la ruta.
+    Guarda el archivo subido en un path temporal (TMP_DIR o `directory`) y devuelve la ruta;
+    copia el buffer por bloques sin cargarlo entero en memoria.
     """
     safe_name = filename.replace(" ", "_")
-    fd, path = tempfile.mkstemp(prefix="upload_", suffix="_" + safe_name, dir=TMP_DIR)
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix="_" + safe_name, dir=directory or TMP_DIR)
+    source.seek(0)
     with os.fdopen(fd, "wb") as f:
-        f.write(content)
+        shutil.copyfileobj(source, f, 1024 * 1024)
     return path
 
 def remove_file_silently(path: Optional[str]):
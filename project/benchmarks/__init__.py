@@ -0,0 +1 @@
+"""Benchmarks de rendimiento contra un Ollama simulado (ver benchmarks/run.py)."""
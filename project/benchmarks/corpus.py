@@ -0,0 +1,131 @@
+# benchmarks/corpus.py
+"""
+Corpus sintético y reproducible (texto, PDF y DOCX) de distintos tamaños.
+"""
+import io
+import random
+from typing import Dict, List
+
+from docx import Document
+
+# Tamaños en palabras
+SIZES: Dict[str, int] = {
+    "small": 1_500,
+    "medium": 15_000,
+    "large": 60_000,
+}
+
+_VOCAB = (
+    "el la los las un una de del en con por para sobre entre desde hasta segun "
+    "empresa proyecto contrato cliente proveedor mercado producto servicio equipo analisis "
+    "informe resultado objetivo estrategia riesgo oportunidad inversion beneficio coste plazo "
+    "datos modelo sistema proceso calidad gestion desarrollo investigacion tecnologia usuario "
+    "crecimiento ventas margen presupuesto trimestre anual region sector competencia precio "
+    "propuesta acuerdo clausula pago garantia entrega revision auditoria norma requisito "
+    "aumenta reduce mejora analiza propone establece indica muestra requiere permite "
+    "importante principal significativo relevante nuevo actual previo clave estable critico"
+).split()
+
+_NAMES = ["Madrid", "Lima", "Bogota", "Acme", "Globex", "Ana Torres", "Luis Perez", "Banco Central"]
+
+WORDS_PER_PAGE = 450
+_LINE_CHARS = 95
+_LINES_PER_PAGE = 60
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(_VOCAB) for _ in range(rng.randint(8, 20))]
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(_NAMES))
+    if rng.random() < 0.2:
+        words.insert(rng.randrange(len(words)), f"{rng.randint(2, 95)}%")
+    return " ".join(words).capitalize() + "."
+
+
+def make_text(n_words: int, seed: int = 0) -> str:
+    """
+    Texto de unas `n_words` palabras en párrafos de 3 a 6 oraciones.
+    """
+    rng = random.Random(seed)
+    paragraphs: List[str] = []
+    count = 0
+    while count < n_words:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        count += len(paragraph.split())
+    return "\n\n".join(paragraphs)
+
+
+def _wrap(text: str, width: int = _LINE_CHARS) -> List[str]:
+    lines = []
+    for paragraph in text.split("\n\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        lines.append("")
+    return lines
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(text: str) -> bytes:
+    """
+    PDF con el texto en Helvetica, `_LINES_PER_PAGE` líneas por página.
+    """
+    lines = _wrap(text)
+    pages = [lines[i:i + _LINES_PER_PAGE] for i in range(0, len(lines), _LINES_PER_PAGE)] or [[""]]
+    n = len(pages)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(n)), n),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, page in enumerate(pages):
+        body = " T* ".join(f"({_pdf_escape(line)}) Tj" for line in page)
+        stream = f"BT /F1 10 Tf 12 TL 50 760 Td {body} ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def make_docx(text: str) -> bytes:
+    doc = Document()
+    for paragraph in text.split("\n\n"):
+        doc.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def make_document(fmt: str, n_words: int, seed: int = 0) -> bytes:
+    """
+    Documento en formato "txt", "pdf" o "docx".
+    """
+    text = make_text(n_words, seed)
+    if fmt == "pdf":
+        return make_pdf(text)
+    if fmt == "docx":
+        return make_docx(text)
+    if fmt == "txt":
+        return text.encode("utf-8")
+    raise ValueError(f"Unsupported format: {fmt}")
@@ -0,0 +1,157 @@
+# benchmarks/fake_ollama.py
+"""
+Servidor HTTP que imita a Ollama (/api/chat y /api/tags) para los benchmarks:
+latencia configurable por token de entrada y de salida, límite de generaciones
+simultáneas (como OLLAMA_NUM_PARALLEL) e inyección de fallos.
+"""
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CHARS_PER_TOKEN = 3.6
+
+
+@dataclass
+class FakeOllamaConfig:
+    token_latency: float = 0.002  # segundos por token generado
+    prompt_token_latency: float = 0.00005  # segundos por token del prompt (prefill)
+    reply_tokens: int = 120  # tokens de cada respuesta (acotado por num_predict)
+    max_parallel: int = 4  # generaciones simultáneas; el resto espera en cola
+    failure_rate: float = 0.0  # probabilidad de responder 500
+    seed: int = 0
+
+
+class FakeOllamaStats:
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.max_inflight = 0
+        self.inflight = 0
+        self.queue_wait = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "max_inflight": self.max_inflight,
+            "queue_wait_seconds": round(self.queue_wait, 4),
+        }
+
+
+def create_app(config: FakeOllamaConfig) -> FastAPI:
+    app = FastAPI()
+    rng = random.Random(config.seed)
+    stats = FakeOllamaStats()
+    # el semáforo se crea en el loop del servidor
+    state = {"slots": None}
+    app.state.stats = stats
+
+    def slots() -> asyncio.Semaphore:
+        if state["slots"] is None:
+            state["slots"] = asyncio.Semaphore(max(1, config.max_parallel))
+        return state["slots"]
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake:latest"}]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        stats.calls += 1
+        if config.failure_rate and rng.random() < config.failure_rate:
+            stats.failures += 1
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        prompt_tokens = int(len(prompt) / CHARS_PER_TOKEN) + 1
+        num_predict = (body.get("options") or {}).get("num_predict") or config.reply_tokens
+        n_tokens = max(1, min(config.reply_tokens, num_predict))
+        words = [f"palabra{i % 50}" for i in range(n_tokens)]
+
+        async def generate():
+            queued = time.perf_counter()
+            async with slots():
+                stats.queue_wait += time.perf_counter() - queued
+                stats.inflight += 1
+                stats.max_inflight = max(stats.max_inflight, stats.inflight)
+                try:
+                    await asyncio.sleep(prompt_tokens * config.prompt_token_latency)
+                    for word in words:
+                        await asyncio.sleep(config.token_latency)
+                        yield word + " "
+                finally:
+                    stats.inflight -= 1
+
+        def message(content: str, done: bool) -> dict:
+            payload = {
+                "model": body.get("model", "fake"),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                payload.update({
+                    "done_reason": "stop",
+                    "prompt_eval_count": prompt_tokens,
+                    "eval_count": n_tokens,
+                    "prompt_eval_duration": int(prompt_tokens * config.prompt_token_latency * 1e9),
+                    "eval_duration": int(n_tokens * config.token_latency * 1e9),
+                    "load_duration": 0,
+                })
+            return payload
+
+        if body.get("stream", True):
+            async def ndjson():
+                async for token in generate():
+                    yield json.dumps(message(token, False)) + "\n"
+                yield json.dumps(message("", True)) + "\n"
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+        parts = [token async for token in generate()]
+        return message("".join(parts).strip(), True)
+
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerThread:
+    """
+    Ejecuta una app ASGI con uvicorn en un hilo (con su propio event loop).
+    """
+
+    def __init__(self, app, port: int = 0):
+        self.port = port or free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "ServerThread":
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline or not self.thread.is_alive():
+                raise RuntimeError(f"Server on port {self.port} did not start")
+            time.sleep(0.02)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
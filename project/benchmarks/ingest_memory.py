@@ -0,0 +1,100 @@
+# benchmarks/ingest_memory.py
+"""
+Memoria de la ingesta de subidas de texto grandes (sin LLM).
+
+    python -m benchmarks.ingest_memory --files 8 --mb-per-file 16
+
+Escribe archivos de texto sintéticos y mide con tracemalloc el pico de memoria de
+trocearlos de dos formas: uniendo todos los textos antes del chunking (como hacía
+/api/topic-modeling) y decodificando por bloques con los chunks generados bajo demanda
+(`max_concurrency` chunks vivos a la vez, como en el map stage).
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from typing import Callable, List
+
+from app.services.ai_client import CHUNK_TOKENS
+from app.services.chunker import chunk_by_tokens, iter_chunks_by_tokens
+from app.services.text_stream import iter_decoded, iter_sources
+from benchmarks.corpus import make_text
+
+_MB = 1024 * 1024
+
+
+def write_corpus(directory: str, files: int, mb_per_file: float, seed: int = 0) -> List[str]:
+    """
+    `files` archivos de unos `mb_per_file` MB (un texto base repetido con otra semilla por archivo).
+    """
+    paths = []
+    for i in range(files):
+        base = (make_text(20_000, seed=seed + i) + "\n\n").encode("utf-8")
+        path = os.path.join(directory, f"corpus-{i}.txt")
+        with open(path, "wb") as f:
+            for _ in range(max(1, int(mb_per_file * _MB / len(base)))):
+                f.write(base)
+        paths.append(path)
+    return paths
+
+
+def joined(paths: List[str], concurrency: int) -> int:
+    texts = []
+    for path in paths:
+        with open(path, "rb") as f:
+            texts.append(f.read().decode("utf-8", errors="ignore"))
+    return len(chunk_by_tokens("\n\n".join(texts), CHUNK_TOKENS))
+
+
+def streamed(paths: List[str], concurrency: int) -> int:
+    files = [open(path, "rb") for path in paths]
+    try:
+        chunks = iter_chunks_by_tokens(iter_sources(iter_decoded(f) for f in files), CHUNK_TOKENS)
+        # los chunks en curso del map stage
+        in_flight: deque = deque(maxlen=concurrency)
+        count = 0
+        for chunk in chunks:
+            in_flight.append(chunk)
+            count += 1
+        return count
+    finally:
+        for f in files:
+            f.close()
+
+
+def measure(fn: Callable[[List[str], int], int], paths: List[str], concurrency: int) -> dict:
+    tracemalloc.start()
+    started = time.perf_counter()
+    chunks = fn(paths, concurrency)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"chunks": chunks, "peak_mb": round(peak / _MB, 1), "seconds": round(elapsed, 2)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pico de memoria de la ingesta de texto")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--mb-per-file", type=float, default=16)
+    parser.add_argument("--concurrency", type=int, default=4, help="Chunks en curso a la vez")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_corpus(directory, args.files, args.mb_per_file)
+        input_mb = sum(os.path.getsize(p) for p in paths) / _MB
+        report = {
+            "input_mb": round(input_mb, 1),
+            "chunk_tokens": CHUNK_TOKENS,
+            "streamed": measure(streamed, paths, args.concurrency),
+            "joined": measure(joined, paths, args.concurrency),
+        }
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
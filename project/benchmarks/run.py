@@ -0,0 +1,299 @@
+# benchmarks/run.py
+"""
+Benchmark de la API contra un Ollama simulado.
+
+    python -m benchmarks.run --sizes small,medium --concurrency 4 --requests 8
+    python -m benchmarks.run --baseline benchmarks/results/base.json  # falla si hay regresiones
+
+Levanta el servidor falso de Ollama y la app (uvicorn, en hilos), envía documentos
+sintéticos a /api/summarize y a los endpoints de análisis y guarda en JSON las
+latencias p50/p95/p99, el throughput, las llamadas al LLM por documento y el
+tiempo de extracción.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.corpus import SIZES, make_document, make_text
+from benchmarks.fake_ollama import FakeOllamaConfig, ServerThread, create_app
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+# (data, files) de un request a partir del tamaño en palabras y una semilla
+Payload = Tuple[dict, Optional[list]]
+
+
+def _summarize_payload(fmt: str) -> Callable[[int, int], Payload]:
+    def build(n_words: int, seed: int) -> Payload:
+        files = [("file", (f"doc_{seed}.{fmt}", make_document(fmt, n_words, seed), MIME_TYPES[fmt]))]
+        return {"summary_type": "general"}, files
+    return build
+
+
+def _text_payload(**extra) -> Callable[[int, int], Payload]:
+    def build(n_words: int, seed: int) -> Payload:
+        return {"text": make_text(n_words, seed), **extra}, None
+    return build
+
+
+def _compare_payload(n_words: int, seed: int) -> Payload:
+    half = max(1, n_words // 2)
+    return {"texts": [make_text(half, seed), make_text(half, seed + 1_000_000)]}, None
+
+
+# endpoint -> (ruta, constructor del payload por formato)
+SCENARIOS: Dict[str, Tuple[str, Callable[[str], Callable[[int, int], Payload]]]] = {
+    "summarize": ("/api/summarize", _summarize_payload),
+    "extract-keywords": ("/api/extract-keywords", lambda fmt: _text_payload()),
+    "extract-entities": ("/api/extract-entities", lambda fmt: _text_payload()),
+    "extract-keywords-fast": ("/api/extract-keywords", lambda fmt: _text_payload(mode="fast")),
+    "extract-entities-fast": ("/api/extract-entities", lambda fmt: _text_payload(mode="fast")),
+    "compare-texts": ("/api/compare-texts", lambda fmt: _compare_payload),
+    "question": ("/api/question", lambda fmt: _text_payload(question="¿Cual es el riesgo principal del contrato?")),
+    "topic-modeling": ("/api/topic-modeling", lambda fmt: _text_payload()),
+    "text-to-bullets": ("/api/text-to-bullets", lambda fmt: _text_payload()),
+    "analyze": ("/api/analyze", lambda fmt: _text_payload()),
+}
+FILE_ENDPOINTS = {"summarize"}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Percentil `q` (0-100) con interpolación lineal.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    pos = (len(ordered) - 1) * q / 100
+    low = int(pos)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (pos - low)
+
+
+def _distribution(values: List[float]) -> dict:
+    if not values:
+        return {}
+    return {
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "p99": round(percentile(values, 99), 4),
+        "mean": round(sum(values) / len(values), 4),
+        "max": round(max(values), 4),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    size: str,
+    fmt: str,
+    requests: int,
+    concurrency: int,
+    seed: int,
+    server_stats,
+) -> dict:
+    path, builder = SCENARIOS[endpoint]
+    build = builder(fmt)
+    # los documentos se generan antes de medir; cada request lleva uno distinto
+    payloads = [build(SIZES[size], seed + i) for i in range(requests)]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    calls_before = server_stats.calls
+
+    async def one(payload: Payload) -> dict:
+        data, files = payload
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, data=data, files=files)
+            elapsed = time.perf_counter() - started
+        record = {"status": response.status_code, "seconds": elapsed}
+        if response.status_code == 200:
+            body = response.json()
+            stats = body.get("stats") or {}
+            record["llm_calls"] = stats.get("map_calls", 0) + stats.get("reduce_calls", 0)
+            record["chunks"] = stats.get("chunks", 0)
+            if body.get("extraction"):
+                record["extraction_seconds"] = body["extraction"]["seconds"]
+                record["pages"] = body["extraction"]["pages"]
+        return record
+
+    started = time.perf_counter()
+    records = await asyncio.gather(*(one(p) for p in payloads))
+    wall = time.perf_counter() - started
+
+    ok = [r for r in records if r["status"] == 200]
+    errors: Dict[str, int] = {}
+    for r in records:
+        if r["status"] != 200:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+    result = {
+        "endpoint": endpoint,
+        "size": size,
+        "words": SIZES[size],
+        "format": fmt,
+        "requests": requests,
+        "concurrency": concurrency,
+        "ok": len(ok),
+        "errors": errors,
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(len(ok) / wall, 4) if wall else None,
+        "latency": _distribution([r["seconds"] for r in ok]),
+        "llm_calls_per_doc": round(sum(r["llm_calls"] for r in ok) / len(ok), 2) if ok else None,
+        "chunks_per_doc": round(sum(r["chunks"] for r in ok) / len(ok), 2) if ok else None,
+        "ollama_requests": server_stats.calls - calls_before,
+    }
+    extraction = [r["extraction_seconds"] for r in ok if "extraction_seconds" in r]
+    if extraction:
+        result["extraction"] = _distribution(extraction)
+        result["pages_per_doc"] = round(sum(r["pages"] for r in ok) / len(ok), 2)
+    return result
+
+
+async def run_all(base_url: str, args, server_stats) -> List[dict]:
+    results = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for endpoint in args.endpoints:
+            formats = args.formats if endpoint in FILE_ENDPOINTS else ["txt"]
+            for size in args.sizes:
+                for fmt in formats:
+                    result = await run_scenario(
+                        client, endpoint, size, fmt, args.requests, args.concurrency, args.seed, server_stats
+                    )
+                    results.append(result)
+                    latency = result["latency"]
+                    print(
+                        f"{endpoint:<17} {size:<7} {fmt:<5} ok={result['ok']}/{args.requests} "
+                        f"p50={latency.get('p50')} p95={latency.get('p95')} p99={latency.get('p99')} "
+                        f"rps={result['throughput_rps']} llm_calls/doc={result['llm_calls_per_doc']}",
+                        flush=True,
+                    )
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare_with_baseline(results: List[dict], baseline: List[dict], tolerance: float) -> List[str]:
+    """
+    Regresiones frente a un JSON anterior: p95 o llamadas al LLM por documento
+    por encima de `tolerance` (fracción), o errores nuevos.
+    """
+    previous = {(r["endpoint"], r["size"], r["format"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        key = (r["endpoint"], r["size"], r["format"])
+        base = previous.get(key)
+        if base is None:
+            continue
+        name = "/".join(key)
+        for label, new, old in (
+            ("p95", r["latency"].get("p95"), base["latency"].get("p95")),
+            ("llm_calls_per_doc", r["llm_calls_per_doc"], base["llm_calls_per_doc"]),
+        ):
+            if new is not None and old and new > old * (1 + tolerance):
+                regressions.append(f"{name}: {label} {old} -> {new}")
+        if sum(r["errors"].values()) > sum(base["errors"].values()):
+            regressions.append(f"{name}: errors {base['errors']} -> {r['errors']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la API contra un Ollama simulado")
+    parser.add_argument("--endpoints", default=",".join(SCENARIOS), help="Endpoints separados por comas")
+    parser.add_argument("--sizes", default="small,medium", help=f"Tamaños: {','.join(SIZES)}")
+    parser.add_argument("--formats", default="pdf,docx", help="Formatos para /api/summarize")
+    parser.add_argument("--requests", type=int, default=8, help="Requests por escenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests simultáneos")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Segundos por token generado")
+    parser.add_argument("--prompt-token-latency", type=float, default=0.00005, help="Segundos por token de prompt")
+    parser.add_argument("--reply-tokens", type=int, default=120)
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="Generaciones simultáneas del Ollama falso")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fracción de llamadas que fallan con 500")
+    parser.add_argument("--cache", action="store_true", help="Mantener activas la caché del LLM y la de páginas")
+    parser.add_argument("--out", default=None, help="JSON de resultados (por defecto benchmarks/results/<fecha>.json)")
+    parser.add_argument("--baseline", default=None, help="JSON anterior con el que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Regresión tolerada frente al baseline")
+    args = parser.parse_args(argv)
+    args.endpoints = [e for e in args.endpoints.split(",") if e]
+    args.sizes = [s for s in args.sizes.split(",") if s]
+    args.formats = [f for f in args.formats.split(",") if f]
+    unknown = [e for e in args.endpoints if e not in SCENARIOS] + [s for s in args.sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Unknown endpoints/sizes: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    config = FakeOllamaConfig(
+        token_latency=args.token_latency,
+        prompt_token_latency=args.prompt_token_latency,
+        reply_tokens=args.reply_tokens,
+        max_parallel=args.ollama_parallel,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    fake_app = create_app(config)
+    with ServerThread(fake_app) as ollama_server, tempfile.TemporaryDirectory() as data_dir:
+        # la configuración de la app se lee al importarla
+        os.environ["OLLAMA_HOSTS"] = ollama_server.url
+        os.environ["DATA_DIR"] = data_dir
+        if not args.cache:
+            os.environ["LLM_CACHE_ENABLED"] = "false"
+            os.environ["EXTRACT_PAGE_CACHE_ITEMS"] = "0"
+        from app.main import app
+
+        with ServerThread(app) as api:
+            results = asyncio.run(run_all(api.url, args, fake_app.state.stats))
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "ollama": fake_app.state.stats.as_dict(),
+        "results": results,
+    }
+    out = args.out or os.path.join(
+        os.path.dirname(__file__), "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados en {out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESIÓN {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Tests para el map stage de ai_client
+"""
+import asyncio
+
+from app.services import ai_client
+
+
+def test_map_prompts_preserves_order(monkeypatch):
+    """Las respuestas vuelven en el orden de los prompts aunque terminen desordenadas"""
+    async def fake_call(prompt, max_tokens=1024):
+        # los primeros prompts tardan más
+        await asyncio.sleep(0.01 * (5 - int(prompt)))
+        return f" r{prompt} "
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    result = asyncio.run(ai_client.map_prompts([str(i) for i in range(5)], max_concurrency=5))
+    assert result == ["r0", "r1", "r2", "r3", "r4"]
+
+
+def test_map_prompts_respects_concurrency_limit(monkeypatch):
+    """Nunca hay más llamadas simultáneas que max_concurrency"""
+    state = {"current": 0, "peak": 0}
+
+    async def fake_call(prompt, max_tokens=1024):
+        state["current"] += 1
+        state["peak"] = max(state["peak"], state["current"])
+        await asyncio.sleep(0.01)
+        state["current"] -= 1
+        return prompt
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    asyncio.run(ai_client.map_prompts([str(i) for i in range(12)], max_concurrency=3))
+    assert state["peak"] == 3
+
+
+def test_map_prompts_retries_once(monkeypatch):
+    """Cada prompt se reintenta una vez antes de propagar el error"""
+    calls = {}
+
+    async def flaky_call(prompt, max_tokens=1024):
+        calls[prompt] = calls.get(prompt, 0) + 1
+        if calls[prompt] == 1:
+            raise RuntimeError("Ollama API error: timeout")
+        return prompt
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", flaky_call)
+    assert asyncio.run(ai_client.map_prompts(["a", "b"], max_concurrency=2)) == ["a", "b"]
+    assert calls == {"a": 2, "b": 2}
+
+
+def test_tree_reduce_merges_in_levels_until_one_call_fits(monkeypatch):
+    """Con fan-in 4, 20 parciales se fusionan en 5 y luego en 2 antes de la síntesis"""
+    async def fake_call(prompt, max_tokens=1024):
+        return f"merge({prompt})"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    levels = []
+
+    async def run():
+        begin = ai_client.current_context().stats.reduce_calls
+        result = await ai_client.tree_reduce(
+            [f"p{i}" for i in range(20)],
+            lambda group: "+".join(group),
+            fan_in=4,
+            budget=10_000,
+            on_level=lambda level, calls: levels.append((level, calls)),
+        )
+        return result, ai_client.current_context().stats.reduce_calls - begin
+
+    result, calls = asyncio.run(run())
+    assert levels == [(1, 5), (2, 1)]
+    assert calls == 6
+    assert result[0] == "merge(merge(p0+p1+p2+p3)+merge(p4+p5+p6+p7)+merge(p8+p9+p10+p11)+merge(p12+p13+p14+p15))"
+    assert result[1] == "merge(p16+p17+p18+p19)"
+
+
+def test_tree_reduce_groups_by_token_budget(monkeypatch):
+    async def fake_call(prompt, max_tokens=1024):
+        return "m"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    partials = ["x" * 360] * 6  # ~100 tokens cada una
+    result = asyncio.run(ai_client.tree_reduce(partials, "".join, fan_in=8, budget=250))
+    # grupos de 2 parciales por presupuesto: 6 -> 3 llamadas
+    assert result == ["m", "m", "m"]
+
+
+def test_chat_prompt_puts_instructions_in_system_message():
+    """Las instrucciones fijas van en el mensaje de sistema, igual para todos los chunks"""
+    first = ai_client.build_prompt("Primer chunk.", "bullets")
+    second = ai_client.build_prompt("Segundo chunk.", "bullets")
+    assert "Primer chunk." in first and first.startswith(first.system)
+
+    messages, _, _ = ai_client._chat_request(first, 256)
+    other, _, _ = ai_client._chat_request(second, 256)
+    assert [m["role"] for m in messages] == ["system", "user"]
+    assert messages[0] == other[0]
+    assert "Primer chunk." in messages[1]["content"] and "Primer chunk." not in messages[0]["content"]
+    # un prompt str normal sigue siendo un único mensaje de usuario
+    plain, _, _ = ai_client._chat_request("hola", 256)
+    assert plain == [{"role": "user", "content": "hola"}]
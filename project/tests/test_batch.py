@@ -0,0 +1,120 @@
+"""
+Tests para el resumen de lotes de documentos
+"""
+import asyncio
+import json
+
+from app.services import ai_client, batch
+
+
+def test_work_queue_deduplicates_prompts_and_serves_older_documents_first(monkeypatch):
+    """Un prompt repetido se genera una vez y las llamadas salen por prioridad"""
+    order = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        order.append(prompt)
+        await asyncio.sleep(0.01)
+        return f"r:{prompt}"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+
+    async def run():
+        queue = batch.BatchWorkQueue(workers=1)
+        calls = [queue.call(p, priority=prio) for p, prio in [("b", 2), ("a", 1), ("b", 0), ("c", 0)]]
+        tasks = [asyncio.ensure_future(c) for c in calls]
+        await asyncio.sleep(0)
+        queue.start()
+        try:
+            return await asyncio.gather(*tasks), queue
+        finally:
+            await queue.stop()
+
+    results, queue = asyncio.run(run())
+    assert results == ["r:b", "r:a", "r:b", "r:c"]
+    assert order == ["c", "a", "b"]
+    assert (queue.calls, queue.deduplicated) == (3, 1)
+
+
+def test_work_queue_shares_the_response_generated_with_the_largest_limit(monkeypatch):
+    """Un duplicado con más num_predict no recibe una respuesta recortada a un límite menor"""
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        calls.append(max_tokens)
+        return f"r:{max_tokens}"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+
+    async def run():
+        queue = batch.BatchWorkQueue(workers=1)
+        # en cola: el duplicado sube el límite del prompt pendiente
+        queued = [asyncio.ensure_future(queue.call("p", max_tokens=n)) for n in (100, 300)]
+        await asyncio.sleep(0)
+        queue.start()
+        try:
+            first = await asyncio.gather(*queued)
+            # ya generado con 300: un límite menor reutiliza la respuesta, uno mayor la regenera
+            return first, await queue.call("p", max_tokens=200), await queue.call("p", max_tokens=500), queue
+        finally:
+            await queue.stop()
+
+    first, smaller, larger, queue = asyncio.run(run())
+    assert first == ["r:300", "r:300"]
+    assert smaller == "r:300"
+    assert larger == "r:500"
+    assert calls == [300, 500]
+    assert queue.deduplicated == 2
+
+
+def test_work_queue_keeps_only_recent_responses(monkeypatch):
+    """Las respuestas ya generadas se guardan en un LRU acotado, no hasta el final del lote"""
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        calls.append(prompt)
+        return f"r:{prompt}"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+
+    async def run():
+        queue = batch.BatchWorkQueue(workers=1, dedup_items=2)
+        queue.start()
+        try:
+            results = [await queue.call(p) for p in ["a", "b", "c", "c", "a"]]
+            return results, queue
+        finally:
+            await queue.stop()
+
+    results, queue = asyncio.run(run())
+    assert results == ["r:a", "r:b", "r:c", "r:c", "r:a"]
+    assert calls == ["a", "b", "c", "a"]
+    assert len(queue._done) == 2
+    assert not queue._pending
+
+
+def test_summarize_batch_streams_one_result_per_document(monkeypatch, tmp_path):
+    """Cada documento da un evento; el texto común entre documentos se resume una vez"""
+    async def fake_call(prompt, max_tokens=1024):
+        return f"resumen {len(prompt)}"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    shared = "".join(f"Cláusula {i}. El proveedor garantiza la entrega según el contrato marco. " * 40 + "\n\n"
+                     for i in range(30))
+    for i in range(3):
+        (tmp_path / f"doc{i}.txt").write_text(f"Documento {i}. " * 200 + "\n\n" + shared, encoding="utf-8")
+    (tmp_path / "vacio.txt").write_text("  ", encoding="utf-8")
+    (tmp_path / "notas.csv").write_text("ignorado", encoding="utf-8")
+
+    async def run():
+        sources = [batch.path_source(path) for path in batch.collect_paths([str(tmp_path)])]
+        return [event async for event in batch.summarize_batch(sources, workers=2, in_flight=2)]
+
+    events = asyncio.run(run())
+    documents = [e for e in events if e["event"] == "document"]
+    assert sorted(e["filename"].rsplit("/", 1)[-1] for e in documents) == ["doc0.txt", "doc1.txt", "doc2.txt", "vacio.txt"]
+    assert [e for e in documents if "error" in e][0]["filename"].endswith("vacio.txt")
+    done = events[-1]
+    assert done["event"] == "done" and done["failed"] == 1
+    assert done["deduplicated_calls"] > 0
+    assert done["documents_per_hour"] > 0
+    json.dumps(events)
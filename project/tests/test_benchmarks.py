@@ -0,0 +1,43 @@
+"""
+Tests para el harness de benchmarks (corpus, Ollama falso y comparación con baseline)
+"""
+import io
+
+from fastapi.testclient import TestClient
+
+from app.services.extractor import extract_text_from_file
+from benchmarks.corpus import make_document, make_text
+from benchmarks.fake_ollama import FakeOllamaConfig, create_app
+from benchmarks.run import compare_with_baseline, percentile
+
+
+def test_corpus_is_reproducible_and_extractable():
+    assert make_text(300, seed=1) == make_text(300, seed=1)
+    assert make_text(300, seed=1) != make_text(300, seed=2)
+    text = extract_text_from_file(io.BytesIO(make_document("pdf", 300, seed=1)), ".pdf")
+    assert text.split()[:5] == make_text(300, seed=1).split()[:5]
+
+
+def test_fake_ollama_reports_counts_and_injects_failures():
+    app = create_app(FakeOllamaConfig(token_latency=0, reply_tokens=10))
+    client = TestClient(app)
+    body = {"model": "m", "messages": [{"role": "user", "content": "hola " * 36}], "stream": False,
+            "options": {"num_predict": 4}}
+    reply = client.post("/api/chat", json=body).json()
+    assert len(reply["message"]["content"].split()) == 4
+    assert reply["eval_count"] == 4
+    assert reply["prompt_eval_count"] > 0
+
+    failing = TestClient(create_app(FakeOllamaConfig(failure_rate=1.0)))
+    assert failing.post("/api/chat", json=body).status_code == 500
+
+
+def test_percentile_and_baseline_regressions():
+    assert percentile([1, 2, 3, 4], 50) == 2.5
+    assert percentile([], 95) is None
+    base = [{"endpoint": "summarize", "size": "small", "format": "pdf", "latency": {"p95": 1.0},
+             "llm_calls_per_doc": 2, "errors": {}}]
+    same = [dict(base[0], latency={"p95": 1.1})]
+    slower = [dict(base[0], latency={"p95": 1.5}, llm_calls_per_doc=3)]
+    assert compare_with_baseline(same, base, tolerance=0.2) == []
+    assert len(compare_with_baseline(slower, base, tolerance=0.2)) == 2
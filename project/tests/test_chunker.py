@@ -0,0 +1,51 @@
+"""
+Tests para el chunker por presupuesto de tokens
+"""
+import time
+
+from app.services.chunker import chunk_by_tokens, chunk_token_budget, estimate_tokens
+
+
+def test_budget_leaves_room_for_prompt_and_output():
+    assert chunk_token_budget(num_ctx=8192, max_output_tokens=1024, fraction=0.6) == 4915
+    assert chunk_token_budget(num_ctx=4096, max_output_tokens=2048, fraction=0.9) == 4096 - 512 - 2048
+
+
+def test_small_text_is_a_single_chunk():
+    assert chunk_by_tokens("  Hola mundo.  ", max_tokens=100) == ["Hola mundo."]
+
+
+def test_chunks_respect_budget_and_paragraph_boundaries():
+    paragraphs = [f"Párrafo {i}. " + "palabra " * 40 for i in range(30)]
+    chunks = chunk_by_tokens("\n\n".join(paragraphs), max_tokens=300)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(c) <= 300 for c in chunks)
+    # ningún párrafo queda partido entre dos chunks
+    for chunk in chunks:
+        for part in chunk.split("\n\n"):
+            assert part.strip() in [p.strip() for p in paragraphs]
+
+
+def test_text_without_newlines_is_cut_at_sentences():
+    text = " ".join(f"Esta es la oración número {i} del documento." for i in range(200))
+    chunks = chunk_by_tokens(text, max_tokens=100)
+    assert len(chunks) > 1
+    assert all(c.endswith(".") for c in chunks)
+    assert " ".join(chunks) == text
+
+
+def test_overlap_repeats_tail_of_previous_chunk():
+    text = " ".join(f"Oración {i}." for i in range(100))
+    chunks = chunk_by_tokens(text, max_tokens=40, overlap_tokens=10)
+    for previous, current in zip(chunks, chunks[1:]):
+        first_sentence = current.split(". ")[0] + "."
+        assert previous.endswith(first_sentence) or f"{first_sentence} " in previous
+        assert previous.split(". ")[-1] in current
+
+
+def test_chunking_is_linear_on_large_inputs():
+    text = "\n\n".join("Oración de prueba con varias palabras. " * 20 for _ in range(20000))
+    started = time.perf_counter()
+    chunks = chunk_by_tokens(text, max_tokens=4000)
+    assert time.perf_counter() - started < 5
+    assert sum(len(c) for c in chunks) >= len(text) * 0.99
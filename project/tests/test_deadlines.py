@@ -0,0 +1,101 @@
+"""
+Tests para la cancelación al desconectarse el cliente y la hora límite por request
+"""
+import asyncio
+import time
+from urllib.parse import urlencode
+
+from fastapi.testclient import TestClient
+
+from app.services import ai_client
+
+_TEXT = "\n\n".join(f"Sección {i}. " + "El contrato fija plazos y penalizaciones. " * 30 for i in range(60))
+
+
+def _fake_llm(state):
+    async def fake_call(prompt, max_tokens=1024):
+        if "Listas parciales" in prompt:
+            return "- bullets finales"
+        if "Sección 0." in prompt:
+            return "- parcial"
+        state["started"] += 1
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        return "- nunca"
+    return fake_call
+
+
+def test_deadline_returns_partial_synthesis(monkeypatch):
+    state = {"started": 0, "cancelled": 0}
+    monkeypatch.setattr(ai_client, "call_ollama_api", _fake_llm(state))
+    from app.main import app
+
+    started = time.perf_counter()
+    response = TestClient(app).post("/api/text-to-bullets?deadline=1", data={"text": _TEXT})
+    elapsed = time.perf_counter() - started
+
+    body = response.json()
+    assert response.status_code == 200
+    assert body["partial"] is True and body["result"] == "- bullets finales"
+    assert body["stats"]["chunks"] > 2
+    assert body["stats"]["skipped_chunks"] == body["stats"]["chunks"] - 1
+    assert state["cancelled"] == state["started"] > 0
+    assert elapsed < 5
+
+
+def test_client_disconnect_cancels_llm_calls(monkeypatch):
+    state = {"started": 0, "cancelled": 0}
+    monkeypatch.setattr(ai_client, "call_ollama_api", _fake_llm(state))
+    from app.main import app
+
+    body = urlencode({"text": _TEXT}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/text-to-bullets", "raw_path": b"/api/text-to-bullets", "query_string": b"",
+        "root_path": "", "client": ("test", 1), "server": ("test", 80),
+        "headers": [(b"content-type", b"application/x-www-form-urlencoded"),
+                    (b"content-length", str(len(body)).encode())],
+    }
+    sent = []
+
+    async def run():
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # el cliente cierra la conexión cuando los chunks ya están en Ollama
+            while state["started"] == 0:
+                await asyncio.sleep(0.01)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+
+    asyncio.run(run())
+    assert sent == []
+    assert state["started"] > 0 and state["cancelled"] == state["started"]
+
+
+def test_deadline_without_results_is_counted_once(monkeypatch):
+    """Un 504 por hora límite suma una sola cancelación"""
+    from app.services.metrics import REQUESTS_CANCELLED
+
+    state = {"started": 0, "cancelled": 0}
+    slow = _fake_llm(state)
+
+    async def all_slow(prompt, max_tokens=1024):
+        return await slow(prompt.replace("Sección 0.", "Sección cero."), max_tokens)
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", all_slow)
+    from app.main import app
+
+    before = REQUESTS_CANCELLED.value(reason="deadline")
+    response = TestClient(app).post("/api/text-to-bullets?deadline=0.5", data={"text": _TEXT})
+    assert response.status_code == 504
+    assert REQUESTS_CANCELLED.value(reason="deadline") - before == 1
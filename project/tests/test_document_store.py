@@ -0,0 +1,81 @@
+"""
+Tests para el almacén de documentos (doc_id) y su uso desde los endpoints
+"""
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.services import ai_client
+from app.services.document_store import DocumentStore, text_document_id
+
+
+def test_lru_spills_artifacts_to_disk(tmp_path):
+    store = DocumentStore(directory=str(tmp_path), memory_items=1)
+    first = store.put(text_document_id("uno"), "uno", "uno.txt")
+    first.set_artifact("chunks", ["uno"])
+    store.put(text_document_id("dos"), "dos")  # desaloja `first` y vuelca su artefacto
+
+    reloaded = DocumentStore(directory=str(tmp_path)).get(first.doc_id)
+    assert reloaded.text == "uno" and reloaded.filename == "uno.txt"
+    assert reloaded.get_artifact("chunks") == ["uno"]
+    assert store.counters["spills"] == 1
+
+
+def test_expired_documents_are_removed(tmp_path):
+    store = DocumentStore(directory=str(tmp_path), ttl_seconds=60)
+    doc_id = store.put(text_document_id("viejo"), "viejo").doc_id
+    old = time.time() - 120
+    os.utime(os.path.join(str(tmp_path), doc_id + ".json"), (old, old))
+
+    assert DocumentStore(directory=str(tmp_path), ttl_seconds=60).get(doc_id) is None
+    assert not os.listdir(str(tmp_path))
+    assert store.get("../../etc/passwd") is None
+
+
+def test_document_used_from_memory_does_not_expire_on_disk(tmp_path):
+    """Al salir de memoria, el archivo toma la fecha del último acceso en memoria"""
+    store = DocumentStore(directory=str(tmp_path), ttl_seconds=60, memory_items=1)
+    doc_id = store.put(text_document_id("activo"), "activo").doc_id
+    path = os.path.join(str(tmp_path), doc_id + ".json")
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    assert store.get(doc_id) is not None  # acierto en memoria
+    store.put(text_document_id("otro"), "otro")  # desaloja el documento activo
+
+    assert time.time() - os.path.getmtime(path) < 60
+    assert DocumentStore(directory=str(tmp_path), ttl_seconds=60).get(doc_id) is not None
+
+
+def test_doc_id_skips_extraction_and_chunking(tmp_path, monkeypatch):
+    from app.api import documents
+
+    monkeypatch.setattr(documents, "document_store", DocumentStore(directory=str(tmp_path)))
+    chunked = []
+    real_chunker = ai_client.chunk_text_by_budget
+
+    def counting_chunker(text, **kwargs):
+        chunked.append(len(text))
+        return real_chunker(text, **kwargs)
+
+    async def fake_call(prompt, max_tokens=1024, response_format=None):
+        return "ok"
+
+    monkeypatch.setattr(ai_client, "chunk_text_by_budget", counting_chunker)
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    from app.main import app
+
+    client = TestClient(app)
+    text = "\n\n".join(f"Párrafo {i}. " + "palabra " * 200 for i in range(60))
+    uploaded = client.post("/api/documents", files={"file": ("doc.txt", text.encode("utf-8"), "text/plain")})
+    assert uploaded.status_code == 201
+    doc_id = uploaded.json()["doc_id"]
+    again = client.post("/api/documents", files={"file": ("doc.txt", text.encode("utf-8"), "text/plain")})
+    assert again.json()["doc_id"] == doc_id and again.json()["extracted"] is False
+
+    for path in ("/api/extract-keywords", "/api/text-to-bullets", "/api/summarize"):
+        response = client.post(path, data={"doc_id": doc_id})
+        assert response.status_code == 200, path
+    # un solo chunking del documento completo; las siguientes llamadas reutilizan los chunks
+    assert chunked == [len(text)]
+    assert client.post("/api/summarize", data={"doc_id": "0" * 64}).status_code == 404
@@ -1,22 +1,142 @@
 """
 Tests para el módulo extractor
 """
+import asyncio
+import io
+import os
+import tempfile
+from concurrent.futures import Future
+
 import pytest
-from app.services.extractor import extract_text_from_file
+from docx import Document
+
+from app.services import extractor
+from app.services.extractor import extract_document, extract_text_from_file
+
+
+def _write_pdf(path, pages):
+    """
+    PDF mínimo con una línea de texto (Helvetica) por página.
+    """
+    n = len(pages)
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{4 + 2 * i} 0 R" for i in range(n)), n),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, line in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({line}) Tj ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    path.write_bytes(out)
+
 
-def test_extract_text_from_pdf():
+def test_extract_text_from_pdf(tmp_path):
     """Test básico para extracción de PDF"""
-    # Este test necesita un archivo PDF de prueba
-    # Por ahora es un placeholder
-    pass
+    path = tmp_path / "doc.pdf"
+    _write_pdf(path, ["Primera pagina", "Segunda pagina"])
+    assert extract_text_from_file(str(path), ".pdf") == "Primera pagina\n\nSegunda pagina"
 
-def test_extract_text_from_docx():
+
+def test_extract_text_from_docx(tmp_path):
     """Test básico para extracción de DOCX"""
-    # Este test necesita un archivo DOCX de prueba
-    # Por ahora es un placeholder
-    pass
+    path = tmp_path / "doc.docx"
+    doc = Document()
+    doc.add_paragraph("Hola")
+    doc.add_paragraph("   ")
+    doc.add_paragraph("Mundo")
+    doc.save(path)
+    assert extract_text_from_file(str(path), ".docx") == "Hola\n\nMundo"
+
 
 def test_unsupported_extension():
     """Test para extensiones no soportadas"""
     with pytest.raises(ValueError):
         extract_text_from_file("/fake/path.txt", ".txt")
+
+
+def test_page_ranges_split_consecutive_runs():
+    assert extractor._page_ranges([0, 1, 2, 3, 4, 7, 8], 2) == [(0, 2), (2, 4), (4, 5), (7, 9)]
+
+
+def test_extract_document_parallel_pages_and_cache(tmp_path, monkeypatch):
+    """Los rangos de páginas se extraen en el process pool y la segunda vez salen de la caché"""
+    monkeypatch.setattr(extractor, "PDF_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(extractor, "page_cache", extractor.PageCache())
+    path = tmp_path / "largo.pdf"
+    lines = [f"Pagina numero {i}" for i in range(5)]
+    _write_pdf(path, lines)
+
+    async def run():
+        try:
+            return await extract_document(str(path), ".pdf"), await extract_document(str(path), ".PDF")
+        finally:
+            extractor.shutdown_extraction_pool()
+
+    first, second = asyncio.run(run())
+    assert first.pages == lines
+    assert first.text == "\n\n".join(lines)
+    assert first.cached_pages == 0
+    assert second.text == first.text
+    assert second.cached_pages == 5
+    assert second.report()["pages"] == 5
+
+
+def test_extract_document_from_buffer(tmp_path, monkeypatch):
+    """Un buffer en memoria se extrae sin pasar por un archivo temporal"""
+    monkeypatch.setattr(extractor, "page_cache", extractor.PageCache())
+    path = tmp_path / "doc.pdf"
+    _write_pdf(path, ["Desde memoria"])
+    buffer = io.BytesIO(path.read_bytes())
+
+    result = asyncio.run(extract_document(buffer, ".pdf"))
+    assert result.text == "Desde memoria"
+    assert not buffer.closed
+
+
+def test_buffer_with_several_ranges_sends_paths_to_the_pool(tmp_path, monkeypatch):
+    """Los workers reciben una ruta (la del buffer en disco o una copia única), nunca los bytes"""
+    monkeypatch.setattr(extractor, "PDF_PAGES_PER_TASK", 2)
+    monkeypatch.setattr(extractor, "page_cache", extractor.PageCache())
+    lines = [f"Pagina numero {i}" for i in range(5)]
+    path = tmp_path / "largo.pdf"
+    _write_pdf(path, lines)
+    sent = []
+
+    class RecordingPool:
+        def submit(self, fn, *args):
+            sent.append(args[0])
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+
+    monkeypatch.setattr(extractor, "get_extraction_pool", lambda: RecordingPool())
+
+    in_memory = io.BytesIO(path.read_bytes())
+    on_disk = tempfile.NamedTemporaryFile(dir=tmp_path, suffix=".pdf")
+    on_disk.write(path.read_bytes())
+
+    assert asyncio.run(extract_document(in_memory, ".pdf")).pages == lines
+    copies = set(sent)
+    assert len(sent) == 3 and len(copies) == 1
+    assert all(isinstance(p, str) for p in sent)
+    assert not any(os.path.exists(p) for p in copies)  # la copia temporal se borra
+
+    sent.clear()
+    monkeypatch.setattr(extractor, "page_cache", extractor.PageCache())
+    assert asyncio.run(extract_document(on_disk, ".pdf")).pages == lines
+    assert set(sent) == {on_disk.name}
+    on_disk.close()
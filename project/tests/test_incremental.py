@@ -0,0 +1,66 @@
+"""
+Tests para el resumen incremental de versiones de un documento
+"""
+import asyncio
+import random
+
+from app.services import ai_client
+from app.services.chunker import chunk_by_content, estimate_tokens
+from app.services.document_store import StoredDocument, text_document_id
+from app.services.incremental import summarize_versioned
+from app.services.request_context import begin_request, current_context, end_request
+
+
+def _paragraphs(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = "contrato cliente plazo riesgo pago entrega garantia norma precio acuerdo".split()
+    return [f"Párrafo {i}. " + " ".join(rng.choice(words) for _ in range(rng.randint(30, 150))) for i in range(n)]
+
+
+def test_content_defined_chunks_are_stable_around_edits():
+    paragraphs = _paragraphs(600)
+    before = chunk_by_content("\n\n".join(paragraphs), max_tokens=800)
+    edited = list(paragraphs)
+    edited[300] += " cláusula nueva"
+    edited.insert(100, "Párrafo insertado.")
+    after = chunk_by_content("\n\n".join(edited), max_tokens=800)
+
+    assert all(estimate_tokens(c) <= 800 for c in after)
+    assert len(set(after) - set(before)) <= 4
+    assert len(before) > 20
+
+
+def test_one_edit_reuses_unchanged_chunks(monkeypatch):
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        calls.append(prompt)
+        return f"resumen {len(calls)}"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    monkeypatch.setattr("app.services.incremental.CHUNK_TOKENS", 800)
+    paragraphs = _paragraphs(600)
+    edited = list(paragraphs)
+    edited[300] += " cláusula nueva"
+    v1_text, v2_text = "\n\n".join(paragraphs), "\n\n".join(edited)
+    v1 = StoredDocument(text_document_id(v1_text), v1_text)
+    v2 = StoredDocument(text_document_id(v2_text), v2_text)
+
+    async def run(document, previous):
+        token = begin_request("versioned")
+        try:
+            await summarize_versioned(document, previous)
+            return current_context().stats
+        finally:
+            end_request(token)
+
+    first = asyncio.run(run(v1, None))
+    first_calls = len(calls)
+    calls.clear()
+    second = asyncio.run(run(v2, v1))
+
+    assert first.map_calls == first.chunks > 20
+    assert second.map_calls == 1
+    assert second.reused_chunks == second.chunks - 1
+    # un chunk nuevo + las fusiones de su rama del reduce + la síntesis final
+    assert len(calls) <= 1 + second.reduce_depth + 1 < first_calls / 5
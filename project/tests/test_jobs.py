@@ -0,0 +1,97 @@
+"""
+Tests para la cola de jobs en segundo plano
+"""
+import asyncio
+
+import pytest
+
+from app.services import ai_client, jobs
+from app.services.jobs import COMPLETED, JobManager, JobStore
+from app.services.llm_scheduler import LLMOverloadedError
+
+
+def _run_job(manager: JobManager, job_id: str):
+    async def main():
+        await manager.start()
+        await manager._queue.join()
+        await manager.stop()
+
+    asyncio.run(main())
+    return manager.store.get(job_id)
+
+
+def test_job_resumes_at_first_missing_chunk(tmp_path, monkeypatch):
+    """Un job interrumpido solo vuelve a resumir los chunks que faltan"""
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        calls.append(prompt)
+        return "parcial"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    text = "\n\n".join(f"Parrafo {i}. " + "texto " * 2000 for i in range(8))
+    job_id = store.create("doc.pdf", "", "general", 256, 2)
+    store.update(job_id, text=text, status="running")
+    prompts = ai_client.plan_summary(text, "general").prompts
+    assert len(prompts) > 3
+    for i in range(3):
+        store.save_partial(job_id, i, f"ya resumido {i}")
+
+    job = _run_job(JobManager(store=store, workers=1), job_id)
+
+    assert job["status"] == COMPLETED
+    assert job["completed_chunks"] == len(prompts)
+    # chunks pendientes + síntesis final
+    assert len(calls) == len(prompts) - 3 + 1
+    assert "ya resumido 0" in calls[-1]
+
+
+def test_job_failure_is_recorded(tmp_path, monkeypatch):
+    async def broken_extract(path, ext):
+        raise RuntimeError("PDF extraction failed: broken")
+
+    monkeypatch.setattr(jobs, "extract_document", broken_extract)
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create("doc.pdf", str(tmp_path / "doc.pdf"), "general", 256, None)
+
+    job = _run_job(JobManager(store=store, workers=1), job_id)
+    assert job["status"] == "failed"
+    assert "broken" in job["error"]
+
+
+def test_overloaded_job_is_requeued_and_completes(tmp_path, monkeypatch):
+    """Un 429 del scheduler no marca el job como fallido: vuelve a la cola tras retry_after"""
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        calls.append(prompt)
+        if len(calls) == 1:
+            raise LLMOverloadedError("LLM queue is full", 429, retry_after=0)
+        return "parcial"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create("doc.txt", None, "general", 256, 1, text="Un texto corto para resumir.")
+    manager = JobManager(store=store, workers=1)
+
+    async def main():
+        await manager.start()
+        for _ in range(200):
+            if store.get(job_id)["status"] == COMPLETED:
+                break
+            await asyncio.sleep(0.01)
+        await manager.stop()
+
+    asyncio.run(main())
+    job = store.get(job_id)
+    assert job["status"] == COMPLETED
+    assert job["error"] is None
+    assert len(calls) == 2
+
+
+def test_submit_before_start_raises_clear_error(tmp_path):
+    manager = JobManager(store=JobStore(str(tmp_path / "jobs.sqlite3")))
+    with pytest.raises(RuntimeError, match="not started"):
+        manager.submit("doc.txt", None, "general", 256, None, text="texto")
@@ -0,0 +1,71 @@
+"""
+Tests para la caché de respuestas del LLM
+"""
+import time
+
+from app.services.llm_cache import LLMCache, make_cache_key
+
+
+def test_cache_key_depends_on_model_prompt_and_options():
+    messages = [{"role": "user", "content": "hola"}]
+    key = make_cache_key("llama3.1", messages, {"num_predict": 100, "temperature": 0.2})
+    assert key == make_cache_key("llama3.1", messages, {"temperature": 0.2, "num_predict": 100})
+    assert key != make_cache_key("llama3.1", messages, {"num_predict": 200, "temperature": 0.2})
+    assert key != make_cache_key("mistral", messages, {"num_predict": 100, "temperature": 0.2})
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    LLMCache(path=path).set("k", "resumen")
+
+    fresh = LLMCache(path=path)
+    assert fresh.get("k") == "resumen"
+    assert fresh.get("k") == "resumen"
+    stats = fresh.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert fresh.get("otra") is None
+    assert fresh.stats()["misses"] == 1
+
+
+def test_ttl_expires_entries(tmp_path):
+    cache = LLMCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=0.01)
+    cache.set("k", "v")
+    time.sleep(0.02)
+    assert cache.get("k") is None
+
+
+def test_size_limit_evicts_least_recently_used(tmp_path):
+    cache = LLMCache(path=str(tmp_path / "cache.sqlite3"), memory_items=1, max_bytes=25)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 10)
+    cache.get("a")  # "a" pasa a ser la más reciente
+    cache.set("c", "z" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10
+    assert cache.get("c") == "z" * 10
+    assert cache.stats()["evictions"] == 1
+
+
+def test_memory_hits_keep_entries_from_disk_eviction(tmp_path):
+    """Un acierto en memoria también cuenta para el orden LRU de SQLite"""
+    cache = LLMCache(path=str(tmp_path / "cache.sqlite3"), memory_items=10, max_bytes=25)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 10)
+    assert cache.get("a") == "x" * 10  # acierto en memoria
+    cache.set("c", "z" * 10)
+
+    fresh = LLMCache(path=str(tmp_path / "cache.sqlite3"))
+    assert fresh.get("a") == "x" * 10
+    assert fresh.get("b") is None
+
+
+def test_running_byte_total_matches_disk(tmp_path):
+    """El contador de bytes sigue a SQLite con reemplazos y desalojos"""
+    path = str(tmp_path / "cache.sqlite3")
+    cache = LLMCache(path=path, memory_items=2, max_bytes=100)
+    for i in range(30):
+        cache.set(f"k{i % 12}", "v" * (5 + i % 7))
+    stats = cache.stats()
+    assert stats["disk_bytes"] == cache._bytes <= 100
+    assert LLMCache(path=path).stats()["disk_bytes"] == stats["disk_bytes"]
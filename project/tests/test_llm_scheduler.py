@@ -0,0 +1,83 @@
+"""
+Tests para el scheduler global de llamadas a Ollama
+"""
+import asyncio
+
+import pytest
+
+from app.services.llm_scheduler import LLMOverloadedError, LLMScheduler
+
+
+def test_slot_caps_inflight_generations():
+    """No hay más generaciones simultáneas que max_inflight"""
+    scheduler = LLMScheduler(max_inflight=2, max_queue=10, queue_timeout=5)
+    state = {"current": 0, "peak": 0}
+
+    async def job(i):
+        async with scheduler.slot("m", request_id=f"r{i % 3}"):
+            state["current"] += 1
+            state["peak"] = max(state["peak"], state["current"])
+            await asyncio.sleep(0.01)
+            state["current"] -= 1
+
+    async def main():
+        await asyncio.gather(*(job(i) for i in range(9)))
+
+    asyncio.run(main())
+    assert state["peak"] == 2
+    assert scheduler.stats()["m"]["inflight"] == 0
+    assert scheduler.stats()["m"]["queued"] == 0
+
+
+def test_waiting_requests_are_served_round_robin():
+    """Una pregunta corta no espera a que termine un documento de muchos chunks"""
+    scheduler = LLMScheduler(max_inflight=1, max_queue=100, queue_timeout=5)
+    order = []
+
+    async def call(request_id, label):
+        async with scheduler.slot("m", request_id=request_id):
+            order.append(label)
+
+    async def main():
+        # el turno está ocupado mientras se encolan 6 chunks y luego la pregunta
+        await scheduler.acquire("m", "other")
+        big = [asyncio.create_task(call("big", f"big{i}")) for i in range(6)]
+        await asyncio.sleep(0)
+        small = asyncio.create_task(call("small", "small"))
+        await asyncio.sleep(0)
+        scheduler.release("m")
+        await asyncio.gather(*big, small)
+
+    asyncio.run(main())
+    assert order[:2] == ["big0", "small"]
+
+
+def test_full_queue_is_rejected_with_429():
+    scheduler = LLMScheduler(max_inflight=1, max_queue=1, queue_timeout=5)
+
+    async def main():
+        await scheduler.acquire("m", "a")
+        waiter = asyncio.create_task(scheduler.acquire("m", "b"))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloadedError) as exc:
+            await scheduler.acquire("m", "c")
+        assert exc.value.status_code == 429
+        assert exc.value.retry_after >= 1
+        scheduler.release("m")
+        await waiter
+        scheduler.release("m")
+
+    asyncio.run(main())
+
+
+def test_queue_timeout_is_rejected_with_503():
+    scheduler = LLMScheduler(max_inflight=1, max_queue=10, queue_timeout=0.01)
+
+    async def main():
+        await scheduler.acquire("m", "a")
+        with pytest.raises(LLMOverloadedError) as exc:
+            await scheduler.acquire("m", "b")
+        assert exc.value.status_code == 503
+        assert scheduler.stats()["m"]["queued"] == 0
+
+    asyncio.run(main())
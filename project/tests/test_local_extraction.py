@@ -0,0 +1,69 @@
+"""
+Tests para la extracción local de palabras clave y entidades (mode=fast|hybrid)
+"""
+from fastapi.testclient import TestClient
+
+from app.services import ai_client
+from app.services.local_extraction import entities_label_prompt, find_entities, keywords_rerank_prompt, rank_keywords
+
+_TEXT = (
+    "El Banco de España publicó el 12 de marzo de 2024 un informe sobre el contrato de suministro eléctrico. "
+    "El Dr. Juan Pérez, director de Iberdrola S.A., explicó en Madrid que el contrato de suministro incluye "
+    "penalizaciones. La CNMC revisará el contrato de suministro y las tarifas eléctricas antes de junio de 2024. "
+    "María López, de la Universidad de Sevilla, considera que las tarifas eléctricas subirán.\n"
+) * 5
+
+
+def test_keywords_and_entities_without_llm():
+    keywords = [k["keyword"] for k in rank_keywords(_TEXT, limit=8)]
+    assert keywords[0] == "Banco de España"
+    assert "contrato de suministro" in keywords
+    # los unigramas contenidos en una frase ya elegida no se repiten
+    assert "contrato" not in keywords and "Banco" not in keywords
+    assert not any(k.split()[0].lower() in ("el", "la", "de") for k in keywords)
+
+    types = {e["name"]: e["type"] for e in find_entities(_TEXT)}
+    assert types["12 de marzo de 2024"] == "Fecha"
+    assert types["Juan Pérez"] == "Persona" and types["María López"] == "Persona"
+    assert types["Banco de España"] == "Organización" and types["Iberdrola S.A."] == "Organización"
+    assert types["CNMC"] == "Organización" and types["Universidad de Sevilla"] == "Organización"
+    assert types["Madrid"] == "Lugar"
+
+
+def test_fast_mode_skips_llm_and_hybrid_makes_one_call(monkeypatch):
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        calls.append(prompt)
+        return "- contrato de suministro"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    from app.main import app
+
+    client = TestClient(app)
+    text = _TEXT * 20
+    fast = client.post("/api/extract-keywords", data={"text": text, "mode": "fast"})
+    assert fast.status_code == 200 and calls == []
+    assert fast.json()["keywords"][0]["keyword"] == "Banco de España"
+
+    entities = client.post("/api/extract-entities", data={"text": text, "mode": "fast"}).json()
+    assert "### Persona" in entities["result"] and calls == []
+
+    hybrid = client.post("/api/extract-keywords", data={"text": text, "mode": "hybrid"})
+    assert hybrid.status_code == 200 and len(calls) == 1
+    assert "Banco de España" in calls[0]
+
+    assert client.post("/api/extract-keywords", data={"text": text, "mode": "yake"}).status_code == 400
+
+
+def test_hybrid_prompts_keep_instructions_in_system_message():
+    """Los prompts del modo hybrid comparten el mensaje de sistema entre textos"""
+    other = "La Agencia Tributaria revisó en Bilbao el convenio de transporte del Ayuntamiento.\n" * 5
+    for build in (
+        lambda text: keywords_rerank_prompt(text, rank_keywords(text, limit=5)),
+        lambda text: entities_label_prompt(find_entities(text, include_unlabeled=True)),
+    ):
+        first, second = build(_TEXT), build(other)
+        assert isinstance(first, ai_client.ChatPrompt)
+        assert first.system == second.system
+        assert first.user != second.user and first.user in first
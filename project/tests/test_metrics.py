@@ -0,0 +1,59 @@
+"""
+Tests para las métricas del pipeline y su exportación a Prometheus
+"""
+from app.services.metrics import LLM_TOKENS, MetricsRegistry, record_ollama_response, span
+from app.services.request_context import begin_request, current_context, end_request
+
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    calls = registry.counter("demo_calls_total", "Llamadas", ["result"])
+    latency = registry.histogram("demo_seconds", "Latencia", ["stage"], buckets=(0.1, 1))
+    registry.gauge("demo_inflight", "En curso", ["model"], lambda: {("m",): 3})
+    calls.inc(result="ok")
+    calls.inc(2, result="ok")
+    latency.observe(0.05, stage="map")
+    latency.observe(0.5, stage="map")
+    latency.observe(5, stage="map")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_calls_total counter" in lines
+    assert 'demo_calls_total{result="ok"} 3' in lines
+    assert 'demo_seconds_bucket{stage="map",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="map",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="map",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="map"} 3' in lines
+    assert 'demo_inflight{model="m"} 3' in lines
+
+
+def test_span_adds_request_timings():
+    token = begin_request("timings", include_timings=True)
+    try:
+        with span("chunk"):
+            pass
+        with span("chunk"):
+            pass
+        report = current_context().timings_report()
+    finally:
+        end_request(token)
+    assert set(report) == {"chunk"}
+    assert report["chunk"] >= 0
+    token = begin_request("sin-timings")
+    try:
+        assert current_context().timings_report() is None
+    finally:
+        end_request(token)
+
+
+def test_ollama_response_counters():
+    before = LLM_TOKENS.value(model="test-model", kind="completion")
+    token = begin_request("tokens")
+    try:
+        record_ollama_response("test-model", {
+            "eval_count": 40, "eval_duration": 2 * 10**9, "prompt_eval_count": 100, "load_duration": 0,
+        })
+        stats = current_context().stats
+    finally:
+        end_request(token)
+    assert LLM_TOKENS.value(model="test-model", kind="completion") - before == 40
+    assert (stats.prompt_tokens, stats.completion_tokens) == (100, 40)
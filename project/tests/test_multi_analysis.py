@@ -0,0 +1,100 @@
+"""
+Tests para el análisis combinado en una sola pasada (/api/analyze)
+"""
+import asyncio
+import json
+
+from app.services import ai_client, multi_analysis
+from app.services.request_context import begin_request, current_context, end_request
+
+
+def test_parse_multi_response_recovers_json_and_falls_back_to_summary():
+    wrapped = 'Aquí va:\n{"summary": "Resumen", "keywords": ["a", "b"], "entities": [{"name": "Acme"}]}\nFin'
+    parsed = multi_analysis.parse_multi_response(wrapped, ["summary", "keywords", "entities"])
+    assert parsed == {
+        "summary": "Resumen",
+        "keywords": ["a", "b"],
+        "entities": [{"name": "Acme", "type": "Otro"}],
+    }
+
+    parsed = multi_analysis.parse_multi_response("texto libre", ["summary", "topics"])
+    assert parsed == {"summary": "texto libre", "topics": []}
+
+
+def test_merges_are_deduplicated_and_ordered():
+    keywords = multi_analysis.merge_keywords([["Riesgo", "plazo"], ["contrato", "riesgo"], ["Plazo"]])
+    assert keywords == ["Riesgo", "plazo", "contrato"]
+
+    entities = multi_analysis.merge_entities([
+        [{"name": "Acme", "type": "Organización"}, {"name": "Lima", "type": "Lugar"}],
+        [{"name": "ACME", "type": "Organización"}],
+    ])
+    assert entities == {"Organización": ["Acme"], "Lugar": ["Lima"]}
+
+    topics = multi_analysis.merge_topics([
+        [{"topic": "Ventas", "points": ["suben"]}],
+        [{"topic": "Costes", "points": []}, {"topic": "ventas", "points": ["suben", "en Lima"]}],
+    ])
+    assert topics == [{"topic": "Ventas", "points": ["suben", "en Lima"]}, {"topic": "Costes", "points": []}]
+
+
+def test_run_multi_analysis_uses_one_call_per_chunk(monkeypatch):
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024, response_format=None):
+        calls.append(response_format)
+        if response_format == "json":
+            return json.dumps({
+                "summary": "parcial",
+                "keywords": ["clave"],
+                "entities": [{"name": "Acme", "type": "Organización"}],
+                "topics": [{"topic": "Tema", "points": ["punto"]}],
+            })
+        return "resumen final"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    monkeypatch.setattr(multi_analysis, "chunk_text", lambda text: ["uno", "dos", "tres"])
+
+    async def run():
+        token = begin_request("analyze")
+        try:
+            result = await multi_analysis.run_multi_analysis("texto", list(multi_analysis.ANALYSES))
+            return result, current_context().stats
+        finally:
+            end_request(token)
+
+    result, stats = asyncio.run(run())
+    # 3 llamadas JSON (una por chunk, todos los análisis) + 1 síntesis del resumen
+    assert calls == ["json", "json", "json", None]
+    assert stats.map_calls == 3 and stats.reduce_calls == 1
+    assert result["data"]["summary"] == "resumen final"
+    assert result["data"]["keywords"] == ["clave"]
+    assert result["data"]["entities"] == {"Organización": ["Acme"]}
+    assert result["results"]["topics"] == "### Tema\n- punto"
+
+
+def test_analyze_endpoint_accepts_text_upload_and_doc_id(monkeypatch):
+    """/api/analyze responde con texto, con un archivo (y su doc_id) y con ese doc_id"""
+    from fastapi.testclient import TestClient
+
+    async def fake_call(prompt, max_tokens=1024, response_format=None):
+        if response_format == "json":
+            return json.dumps({"summary": "parcial", "keywords": ["clave"]})
+        return "resumen final"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    from app.main import app
+
+    client = TestClient(app)
+    data = {"analyses": ["summary", "keywords"]}
+    response = client.post("/api/analyze", data={**data, "text": "Texto breve del contrato."})
+    assert response.status_code == 200
+    assert response.json()["data"]["keywords"] == ["clave"]
+
+    uploaded = client.post("/api/analyze", data=data,
+                           files={"file": ("doc.txt", "Texto del archivo subido.".encode("utf-8"), "text/plain")})
+    assert uploaded.status_code == 200
+    doc_id = uploaded.json()["doc_id"]
+    again = client.post("/api/analyze", data={**data, "doc_id": doc_id})
+    assert again.status_code == 200
+    assert again.json()["results"]["summary"] == uploaded.json()["results"]["summary"]
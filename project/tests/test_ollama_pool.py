@@ -0,0 +1,133 @@
+"""
+Tests para el pool de hosts de Ollama (servidores stub con httpx.MockTransport)
+"""
+import asyncio
+import json
+
+import httpx
+import ollama
+import pytest
+
+from app.services.ollama_pool import BackendPool
+
+
+def _stub_factory(behaviour):
+    """
+    `behaviour[host]` es una corrutina (request) -> httpx.Response que hace de servidor Ollama.
+    """
+    def factory(host: str) -> ollama.AsyncClient:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            return await behaviour[host](request)
+        return ollama.AsyncClient(host=host, transport=httpx.MockTransport(handler))
+    return factory
+
+
+def _reply(text: str, delay: float = 0.0):
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay)
+        if request.url.path == "/api/tags":
+            return httpx.Response(200, json={"models": []})
+        return httpx.Response(200, json={
+            "model": "m", "created_at": "2024-01-01T00:00:00Z", "done": True,
+            "message": {"role": "assistant", "content": text},
+        })
+    return handler
+
+
+async def _down(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def _chat(pool: BackendPool):
+    return pool.chat(model="m", messages=[{"role": "user", "content": "hola"}])
+
+
+def test_routes_to_least_loaded_host():
+    hosts = ["http://a", "http://b"]
+    pool = BackendPool(hosts, _stub_factory({"http://a": _reply("a", 0.05), "http://b": _reply("b", 0.05)}))
+
+    async def run():
+        return await asyncio.gather(*(_chat(pool) for _ in range(4)))
+
+    replies = [r["message"]["content"] for r in asyncio.run(run())]
+    assert sorted(replies) == ["a", "a", "b", "b"]
+    assert [b.calls for b in pool.backends] == [2, 2]
+
+
+def test_failover_and_host_removed_after_failures():
+    hosts = ["http://down", "http://up"]
+    pool = BackendPool(hosts, _stub_factory({"http://down": _down, "http://up": _reply("ok")}), fail_threshold=1)
+
+    async def run():
+        return [await _chat(pool) for _ in range(4)]
+
+    assert all(r["message"]["content"] == "ok" for r in asyncio.run(run()))
+    down = pool.backends[0]
+    assert not down.healthy
+    # tras sacarlo de rotación ya no recibe llamadas
+    assert down.calls == 1
+    assert pool.failovers == 1
+
+
+def test_client_errors_are_not_retried_on_other_hosts():
+    async def bad_request(request):
+        return httpx.Response(400, json={"error": "bad"})
+
+    pool = BackendPool(["http://a", "http://b"], _stub_factory({"http://a": bad_request, "http://b": bad_request}))
+    with pytest.raises(ollama.ResponseError):
+        asyncio.run(_chat(pool))
+    assert sum(b.calls for b in pool.backends) == 1
+    assert all(b.healthy for b in pool.backends)
+
+
+def test_health_check_restores_host():
+    state = {"up": False}
+
+    async def flaky(request):
+        if not state["up"]:
+            return await _down(request)
+        return await _reply("ok")(request)
+
+    pool = BackendPool(["http://a"], _stub_factory({"http://a": flaky}), fail_threshold=1)
+
+    async def run():
+        await pool.check_health()
+        assert not pool.backends[0].healthy
+        state["up"] = True
+        await pool.check_health()
+
+    asyncio.run(run())
+    assert pool.backends[0].healthy
+
+
+def test_slow_health_check_counts_towards_fail_threshold():
+    """Un host cargado cuyo /api/tags tarda más que health_timeout no sale de rotación a la primera"""
+    pool = BackendPool(["http://a"], _stub_factory({"http://a": _reply("ok", delay=0.2)}),
+                       fail_threshold=2, health_timeout=0.05)
+    backend = pool.backends[0]
+
+    asyncio.run(pool.check_health())
+    assert backend.healthy and backend.failures == 1
+    assert backend.last_error.startswith("health check failed")
+    asyncio.run(pool.check_health())
+    assert not backend.healthy
+
+
+def test_slow_call_is_hedged_on_second_host():
+    pool = BackendPool(
+        ["http://slow", "http://fast"],
+        _stub_factory({"http://slow": _reply("slow", 1.0), "http://fast": _reply("fast", 0.0)}),
+        hedge_percentile=0.9,
+        hedge_min_samples=1,
+    )
+    pool._latencies.extend([0.01] * 10)
+    pool.backends[1].inflight = 5  # el host rápido parece ocupado: la primera llamada va al lento
+
+    async def run():
+        reply = await _chat(pool)
+        pool.backends[1].inflight = 0
+        return reply
+
+    assert asyncio.run(run())["message"]["content"] == "fast"
+    assert pool.hedges == 1
+    assert pool.hedge_wins == 1
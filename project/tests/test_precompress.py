@@ -0,0 +1,42 @@
+"""
+Tests para la pre-compresión extractiva
+"""
+import random
+
+from app.services.chunker import estimate_tokens
+from app.services.precompress import compress_text, split_pages, strip_repeated_lines
+
+
+def _page(number: int, rng: random.Random) -> str:
+    words = "contrato cliente plazo riesgo pago entrega garantia norma precio acuerdo".split()
+    body = "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(8, 20))) + "." for _ in range(6)
+    )
+    return f"ACME Corp - Informe confidencial\n{body}\nPágina {number} de 10\n"
+
+
+def test_repeated_headers_and_footers_are_removed():
+    rng = random.Random(0)
+    pages = [_page(i + 1, rng) for i in range(10)]
+    text = "".join(pages)
+    offsets = [sum(len(p) for p in pages[:i]) for i in range(len(pages))]
+
+    assert split_pages(text, offsets) == pages
+    cleaned, removed = strip_repeated_lines(pages)
+    assert removed == 20
+    assert not any("ACME" in p or "Página" in p for p in cleaned)
+
+    compressed, report = compress_text(text, offsets, keep_fraction=1.0)
+    assert report["header_lines_removed"] == 20
+    assert "Página" not in compressed and "confidencial" not in compressed
+
+
+def test_keep_fraction_reduces_input_tokens():
+    rng = random.Random(1)
+    text = "".join(_page(i + 1, rng) for i in range(10))
+    compressed, report = compress_text(text, keep_fraction=0.4)
+
+    assert report["sentences"] >= 60
+    assert abs(report["kept_sentences"] - 0.4 * report["sentences"]) <= 5
+    assert report["compressed_tokens"] == estimate_tokens(compressed)
+    assert report["ratio"] > 1.8
@@ -0,0 +1,89 @@
+"""
+Tests para el índice de recuperación de /api/question
+"""
+import json
+
+from app.services.retrieval import DocumentIndex, IndexCache, normalize_terms
+
+
+PASSAGES = [
+    "El contrato de arrendamiento tiene una duración de dos años.",
+    "La garantía del equipo cubre defectos de fabricación durante 12 meses.",
+    "El pago mensual se realiza por transferencia bancaria antes del día cinco.",
+    "La rescisión anticipada del contrato implica una penalización de tres meses.",
+]
+
+
+def test_normalize_terms_strips_accents_and_case():
+    assert normalize_terms("Rescisión ANTICIPADA, función") == ["rescision", "anticipada", "funcion"]
+
+
+def test_bm25_ranks_matching_passage_first():
+    index = DocumentIndex(PASSAGES, dense=False)
+    assert index.search("¿Cuánto cubre la garantía?", top_k=1)[0][0] == 1
+    assert index.search("penalizacion por rescision", top_k=1)[0][0] == 3
+
+
+def test_hybrid_search_and_context_budget():
+    index = DocumentIndex(PASSAGES, dense_dim=256)
+    results = index.search("pago por transferencia", top_k=2)
+    assert results[0][0] == 2
+    assert results[0][1] >= results[1][1]
+    # el contexto respeta el presupuesto y vuelve en el orden del documento
+    context = index.context_for("contrato", max_tokens=40, top_k=4)
+    assert [i for i, _ in context] == sorted(i for i, _ in context)
+    assert len(context) < 4
+
+
+def test_index_cache_reuses_index_by_document_hash():
+    cache = IndexCache(max_items=1)
+    text = "\n\n".join(PASSAGES)
+    doc_hash, first = cache.get_or_build(text)
+    _, second = cache.get_or_build(text)
+    assert first is second
+    cache.get_or_build("otro documento")
+    assert cache.get(doc_hash) is None
+
+
+def test_index_artifact_round_trip_keeps_search_results():
+    index = DocumentIndex(PASSAGES)
+    restored = DocumentIndex.from_artifact(json.loads(json.dumps(index.to_artifact())))
+    query = "penalización por rescisión del contrato"
+    assert [i for i, _ in restored.search(query)] == [i for i, _ in index.search(query)]
+
+
+def test_index_is_built_at_upload_and_reused_by_question(tmp_path, monkeypatch):
+    """El índice se guarda con el documento al subirlo; /api/question no lo reconstruye"""
+    from fastapi.testclient import TestClient
+
+    from app.api import analysis, documents
+    from app.services import ai_client, retrieval
+    from app.services.document_store import DocumentStore
+
+    builds = []
+    real_build = retrieval.build_index
+
+    def counting_build(text):
+        builds.append(len(text))
+        return real_build(text)
+
+    async def fake_call(prompt, max_tokens=1024):
+        return "respuesta"
+
+    monkeypatch.setattr(documents, "document_store", DocumentStore(directory=str(tmp_path)))
+    monkeypatch.setattr(documents, "build_index", counting_build)
+    monkeypatch.setattr(retrieval, "build_index", counting_build)
+    monkeypatch.setattr(analysis, "index_cache", IndexCache())
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    from app.main import app
+
+    client = TestClient(app)
+    text = "\n\n".join(f"Cláusula {i}. " + "obligaciones del arrendatario " * 60 for i in range(80))
+    uploaded = client.post("/api/documents", data={"text": text})
+    assert retrieval.INDEX_ARTIFACT in uploaded.json()["artifacts"]
+    assert builds == [len(text)]
+
+    response = client.post("/api/question", data={"doc_id": uploaded.json()["doc_id"], "question": "¿Cláusula 7?"})
+    assert response.status_code == 200
+    assert response.json()["sources"]
+    assert builds == [len(text)]
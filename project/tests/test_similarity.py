@@ -0,0 +1,53 @@
+"""
+Tests para la etapa local de similitud de /api/compare-texts
+"""
+from fastapi.testclient import TestClient
+
+from app.services import ai_client
+from app.services.similarity import compare_documents, explanation_prompt
+
+_BASE = "El contrato de suministro establece pagos trimestrales, garantías de entrega y penalizaciones por retraso. " * 20
+_OTHER = "La receta lleva harina, azúcar, huevos y mantequilla; se hornea a fuego medio durante cuarenta minutos. " * 20
+
+
+def test_matrix_duplicates_and_clusters():
+    texts = [_BASE, _BASE + " Anexo firmado.", _OTHER, _OTHER.replace("azúcar", "miel")]
+    report = compare_documents(texts, top_pairs=2)
+
+    matrix = report["similarity"]
+    assert len(matrix) == 4 and all(len(row) == 4 for row in matrix)
+    assert matrix[0][0] == 1.0 and matrix[0][1] > 0.9 and matrix[0][2] < 0.2
+    assert {(d["a"], d["b"]) for d in report["near_duplicates"]} >= {(0, 1)}
+    assert sorted(c["members"] for c in report["clusters"]) == [[0, 1], [2, 3]]
+    assert {(p["a"], p["b"]) for p in report["most_similar"]} == {(0, 1), (2, 3)}
+    assert report["most_divergent"][0]["score"] < 0.2
+
+
+def test_many_texts_cost_one_llm_call(monkeypatch):
+    calls = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        calls.append(prompt)
+        return "explicación"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    from app.main import app
+
+    texts = [(_BASE if i % 2 else _OTHER) + f" Documento {i}." * 2000 for i in range(12)]
+    response = TestClient(app).post("/api/compare-texts", data={"texts": texts})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(calls) == 1
+    assert body["result"] == "explicación"
+    assert len(body["similarity"]["similarity"]) == 12
+
+
+def test_explanation_prompt_keeps_instructions_in_system_message():
+    """Las instrucciones del prompt de compare no dependen de los textos comparados"""
+    texts = [_BASE, _BASE + " Anexo firmado.", _OTHER]
+    larger_texts = texts + [_OTHER.replace("azúcar", "miel")]
+    prompt = explanation_prompt(texts, compare_documents(texts, top_pairs=1), 300)
+    larger = explanation_prompt(larger_texts, compare_documents(larger_texts, top_pairs=2), 300)
+    assert isinstance(prompt, ai_client.ChatPrompt)
+    assert prompt.system == larger.system
+    assert "Textos comparados: 3" in prompt.user
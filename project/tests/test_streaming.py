@@ -0,0 +1,77 @@
+"""
+Tests para el modo streaming del pipeline map/reduce
+"""
+import asyncio
+
+from app.services import ai_client, streaming
+
+
+def test_stream_map_reduce_emits_progress_then_tokens(monkeypatch):
+    async def fake_call(prompt, max_tokens=1024):
+        return f"parcial {prompt}"
+
+    async def fake_stream(prompt, max_tokens=1024):
+        for token in ["res", "umen"]:
+            yield token
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    monkeypatch.setattr(streaming, "stream_ollama_api", fake_stream)
+
+    async def collect():
+        plan = ai_client.MapReducePlan(["a", "b", "c"], lambda partials: " | ".join(partials))
+        return [e async for e in streaming.stream_map_reduce(plan, done_fields=lambda r: {"length": len(r)})]
+
+    events = asyncio.run(collect())
+    kinds = [e["event"] for e in events]
+    assert kinds == ["start", "progress", "progress", "progress", "token", "token", "done"]
+    assert sorted(e["index"] for e in events if e["event"] == "progress") == [0, 1, 2]
+    assert events[-1]["result"] == "resumen"
+    assert events[-1]["length"] == 7
+    assert events[-1]["stats"]["map_calls"] >= 3
+
+
+def test_stream_map_reduce_reports_errors_as_events(monkeypatch):
+    async def failing_call(prompt, max_tokens=1024):
+        raise RuntimeError("Ollama API error: down")
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", failing_call)
+
+    async def collect():
+        return [e async for e in streaming.stream_map_reduce(ai_client.MapReducePlan(["a"], None))]
+
+    events = asyncio.run(collect())
+    assert events[-1]["event"] == "error"
+    assert "down" in events[-1]["detail"]
+
+
+def test_streamed_compressed_summary_reports_original_length(monkeypatch):
+    """Con compress y stream, el evento done cuenta el texto original como SummarizeResponse"""
+    import json
+    import random
+
+    from fastapi.testclient import TestClient
+
+    async def fake_call(prompt, max_tokens=1024):
+        return "parcial"
+
+    async def fake_stream(prompt, max_tokens=1024):
+        yield "resumen"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    monkeypatch.setattr(streaming, "stream_ollama_api", fake_stream)
+    from app.main import app
+
+    rng = random.Random(0)
+    words = "contrato cliente plazo riesgo pago entrega garantia norma precio acuerdo".split()
+    text = " ".join(" ".join(rng.choice(words) for _ in range(rng.randint(8, 20))) + "." for _ in range(200))
+    client = TestClient(app)
+    doc_id = client.post("/api/documents", data={"text": text}).json()["doc_id"]
+    response = client.post(
+        "/api/summarize",
+        data={"doc_id": doc_id, "stream": "true", "compress": "true", "keep_fraction": "0.3"},
+    )
+    assert response.status_code == 200
+    done = [json.loads(line) for line in response.text.splitlines() if line][-1]
+    assert done["event"] == "done"
+    assert done["compression"]["kept_sentences"] < done["compression"]["sentences"]
+    assert done["length_original"] == len(text)
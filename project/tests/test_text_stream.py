@@ -0,0 +1,49 @@
+"""
+Tests para la lectura por bloques y el map stage sobre chunks generados bajo demanda
+"""
+import asyncio
+import io
+
+from app.services import ai_client
+from app.services.chunker import chunk_by_tokens, iter_chunks_by_tokens
+from app.services.text_stream import iter_blocks, iter_decoded, iter_sources
+
+
+def test_iter_decoded_handles_characters_split_between_blocks():
+    """Un carácter multibyte partido entre dos lecturas se decodifica entero"""
+    data = "Camión añejo — café ".encode("utf-8") * 50
+    blocks = list(iter_decoded(io.BytesIO(data), block_bytes=7))
+    assert "".join(blocks) == data.decode("utf-8")
+
+
+def test_streamed_chunks_match_whole_text_chunking():
+    """Trocear por bloques da los mismos chunks (y el mismo texto) que trocear el texto entero"""
+    paragraphs = [f"Párrafo {i}. " + "registro de actividad del servidor " * (5 + i % 17) for i in range(400)]
+    texts = ["\n\n".join(paragraphs[:250]), "\n\n".join(paragraphs[250:])]
+    joined = "\n\n".join(texts)
+    sources = [iter_blocks(t, 1000) for t in texts]
+    streamed = list(iter_chunks_by_tokens(iter_sources(sources), 300))
+    whole = chunk_by_tokens(joined, 300)
+    assert streamed == whole
+    assert len(streamed) > 10
+
+
+def test_map_prompt_stream_pulls_prompts_only_when_a_worker_is_free(monkeypatch):
+    """Nunca hay más prompts leídos sin terminar que max_concurrency"""
+    state = {"pulled": 0, "done": 0, "peak": 0}
+
+    def prompts():
+        for i in range(20):
+            state["pulled"] += 1
+            state["peak"] = max(state["peak"], state["pulled"] - state["done"])
+            yield str(i)
+
+    async def fake_call(prompt, max_tokens=1024):
+        await asyncio.sleep(0.005)
+        state["done"] += 1
+        return f"r{prompt}"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    result = asyncio.run(ai_client.map_prompt_stream(prompts(), max_concurrency=3))
+    assert result == [f"r{i}" for i in range(20)]
+    assert state["peak"] <= 3
@@ -0,0 +1,44 @@
+"""
+Tests para el reparto de tokens de salida entre las llamadas del map/reduce
+"""
+import asyncio
+
+from app.services import ai_client
+from app.services.token_budget import plan_budget, shares
+
+
+def test_plan_budget_scales_with_summary_type_and_chunk_share():
+    """Un tldr reparte menos tokens que un resumen general y los chunks grandes reciben más"""
+    general = plan_budget("general", 1024, 4000)
+    tldr = plan_budget("tldr", 1024, 4000)
+    assert tldr.total < general.total <= 4000
+    limits = general.for_shares(shares([3000, 1000]))
+    assert limits[0] > limits[1]
+    # nunca por debajo del mínimo ni por encima de max_tokens
+    assert tldr.for_share(0.001) == tldr.floor
+    assert general.for_share(1.0) == 1024
+
+
+def test_summary_uses_budgeted_num_predict_for_map_and_reduce(monkeypatch):
+    """Los chunks y las fusiones usan su parte del presupuesto; la síntesis, max_tokens"""
+    seen = []
+
+    async def fake_call(prompt, max_tokens=1024):
+        seen.append((prompt.user[:9], max_tokens))
+        return "parcial"
+
+    monkeypatch.setattr(ai_client, "call_ollama_api", fake_call)
+    text = "\n\n".join(f"Sección {i}. " + "palabra " * 2500 for i in range(12))
+
+    async def run():
+        plan = ai_client.plan_summary(text, "tldr")
+        return plan, await ai_client.run_map_reduce(plan, max_tokens=512, max_concurrency=4)
+
+    plan, _ = asyncio.run(run())
+    budget = ai_client.plan_token_budget(plan, 512)
+    map_limits = [tokens for user, tokens in seen if not user.startswith("Resúmenes")]
+    assert map_limits == ai_client.map_token_limits(plan, 512)
+    assert all(tokens < 512 for tokens in map_limits)
+    synthesis = [tokens for user, tokens in seen if user.startswith("Resúmenes")]
+    assert synthesis[-1] == 512
+    assert all(budget.floor <= tokens <= 512 for tokens in synthesis)
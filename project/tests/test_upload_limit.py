@@ -0,0 +1,54 @@
+"""
+Tests para el límite de tamaño de las subidas
+"""
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.utils.upload_limit import UploadSizeLimitMiddleware
+
+
+def _client(max_bytes: int, path_limits=None) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=max_bytes, path_limits=path_limits)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/batch")
+    async def batch(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def test_upload_under_limit_is_accepted():
+    response = _client(4096).post("/upload", files={"file": ("a.pdf", b"x" * 1000)})
+    assert response.status_code == 200
+    assert response.json() == {"size": 1000}
+
+
+def test_upload_over_limit_is_rejected_by_content_length():
+    response = _client(4096).post("/upload", files={"file": ("a.pdf", b"x" * 10000)})
+    assert response.status_code == 413
+
+
+def test_upload_over_limit_is_rejected_while_streaming():
+    """Sin Content-Length (chunked) se corta al superar el límite"""
+    def body():
+        yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.pdf\"\r\n\r\n"
+        for _ in range(10):
+            yield b"x" * 1000
+        yield b"\r\n--b--\r\n"
+
+    response = _client(4096).post(
+        "/upload", content=body(), headers={"Content-Type": "multipart/form-data; boundary=b"}
+    )
+    assert response.status_code == 413
+
+
+def test_path_limit_overrides_the_default():
+    """Las rutas de lotes admiten un cuerpo mayor que el resto"""
+    client = _client(4096, path_limits={"/batch": 65536})
+    assert client.post("/batch", files={"file": ("a.pdf", b"x" * 10000)}).status_code == 200
+    assert client.post("/upload", files={"file": ("a.pdf", b"x" * 10000)}).status_code == 413
@@ -0,0 +1,46 @@
+"""
+Tests para el warm-up y el keep-warm del modelo
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import ollama
+
+from app.services.ollama_pool import BackendPool
+from app.services.warmup import ModelWarmer
+
+
+def test_warm_up_records_cold_start_and_pings_only_idle_hosts():
+    requests = []
+
+    def factory(host: str) -> ollama.AsyncClient:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            requests.append((host, request.url.path, body))
+            return httpx.Response(200, json={
+                "model": "m", "created_at": "2024-01-01T00:00:00Z", "done": True, "response": "",
+                "load_duration": 2_500_000_000,
+            })
+        return ollama.AsyncClient(host=host, transport=httpx.MockTransport(handler))
+
+    pool = BackendPool(["http://a", "http://b"], factory, health_interval=0)
+    warmer = ModelWarmer(pool, model="m", keep_alive=-1, enabled=True, interval=60)
+
+    async def run():
+        await warmer.warm_all()
+        first = len(requests)
+        # "a" acaba de atender una llamada; "b" lleva más de `interval` sin actividad
+        pool.backends[1].last_used = time.time() - 120
+        await warmer.ping_idle()
+        return first
+
+    first = asyncio.run(run())
+    assert first == 2
+    assert {path for _, path, _ in requests} == {"/api/generate"}
+    assert all(body["keep_alive"] == -1 and body["model"] == "m" for _, _, body in requests)
+    assert [host for host, _, _ in requests[first:]] == ["http://b"]
+    stats = warmer.stats()["hosts"]
+    assert stats["http://a"]["cold_start_seconds"] == 2.5 and stats["http://a"]["warm"]
+    assert stats["http://b"]["pings"] == 2